@@ -124,6 +124,48 @@ class SummaryQuerySet:
     def __len__(self):
         return sum([q.count() for q in self.querysets])
 
+    def get_keyset_page(self, ordering, page_size, cursor=None):
+        """
+        Return page of objects that follow cursor and cursor of the next page or None if it is the last page.
+
+        Objects are ordered by key (<ordering field value>, <model label>, <pk>), so that key is unique.
+        Only page_size + 1 objects are fetched from each queryset, so deep pages cost the same as first one.
+        Ordering field should be non-nullable field of all models, for example, "created" or "pk".
+
+        :param ordering: field name, prefixed with "-" for descending order
+        :param cursor: key of the last object of previous page
+        """
+        reverse = ordering.startswith('-')
+        field = ordering.lstrip('-')
+
+        items = []
+        for queryset in self.querysets:
+            label = queryset.model._meta.label_lower
+            if reverse:
+                queryset = queryset.order_by('-' + field, '-pk')
+            else:
+                queryset = queryset.order_by(field, 'pk')
+            if cursor is not None:
+                queryset = queryset.filter(self._get_keyset_filter(field, reverse, label, cursor))
+            for obj in queryset[:page_size + 1]:
+                items.append(((getattr(obj, field), label, obj.pk), obj))
+
+        items.sort(key=lambda item: item[0], reverse=reverse)
+        page = items[:page_size]
+        next_cursor = page[-1][0] if len(items) > page_size else None
+        return [obj for key, obj in page], next_cursor
+
+    def _get_keyset_filter(self, field, reverse, label, cursor):
+        value, cursor_label, cursor_pk = cursor
+        lookup = 'lt' if reverse else 'gt'
+        if label == cursor_label:
+            return (models.Q(**{'%s__%s' % (field, lookup): value}) |
+                    models.Q(**{field: value, 'pk__%s' % lookup: cursor_pk}))
+        # Objects with the same value of ordering field are ordered by model label.
+        if (label > cursor_label) != reverse:
+            lookup += 'e'
+        return models.Q(**{'%s__%s' % (field, lookup): value})
+
     def _get_chained_querysets(self):
         if self._order_by:
             return self._merge([qs.iterator() for qs in self.querysets], compared_attr=self._order_by)
@@ -1,6 +1,10 @@
+from base64 import b64decode, b64encode
 from collections import OrderedDict
+import binascii
+import json
 
-from rest_framework import pagination
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import exceptions, pagination
 from rest_framework.response import Response
 from rest_framework.utils.urls import remove_query_param, replace_query_param
 
@@ -50,3 +54,52 @@ class UnlimitedLinkHeaderPagination(LinkHeaderPagination):
     Should be used only as a temporary workaround!
     """
     page_size = None
+
+
+class SummaryPagination(LinkHeaderPagination):
+    """
+    Paginator for summary querysets that supports keyset pagination in addition to page number pagination.
+
+    If cursor query parameter is present, page is fetched using keyset pagination,
+    so that deep pages cost the same as first one. Empty cursor denotes first page.
+    Link to the next page is returned in Link header. Total count is not calculated in this mode.
+    Ordering is defined by view attribute "cursor_ordering", by default it is "pk".
+    """
+    cursor_query_param = 'cursor'
+    default_cursor_ordering = 'pk'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            self.cursor_mode = False
+            return super(SummaryPagination, self).paginate_queryset(queryset, request, view)
+
+        self.cursor_mode = True
+        self.request = request
+        ordering = getattr(view, 'cursor_ordering', self.default_cursor_ordering)
+        cursor = self.decode_cursor(request.query_params[self.cursor_query_param])
+        page, self.next_cursor = queryset.get_keyset_page(ordering, self.get_page_size(request), cursor)
+        return page
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super(SummaryPagination, self).get_paginated_response(data)
+
+        headers = {}
+        if self.next_cursor is not None:
+            url = self.request.build_absolute_uri()
+            next_link = replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_cursor))
+            headers['Link'] = '<%s>; rel="next"' % next_link
+        return Response(data, headers=headers)
+
+    def encode_cursor(self, cursor):
+        # Values like datetime are serialized without loss of precision, so that ORM is able to parse them back.
+        return b64encode(json.dumps(cursor, default=str).encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            value, label, pk = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, binascii.Error):
+            raise exceptions.NotFound(_('Invalid cursor.'))
+        return value, label, pk
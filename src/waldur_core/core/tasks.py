@@ -1,8 +1,13 @@
+import base64
 import logging
 from uuid import uuid4
 
+from celery import shared_task
+from celery.exceptions import Retry
 from celery.task import Task as CeleryTask
 from celery.worker.request import Request
+from django.conf import settings
+from django.core.cache import cache
 from django.db import IntegrityError, models as django_models
 from django.db.models import ObjectDoesNotExist
 from django_fsm import TransitionNotAllowed
@@ -275,36 +280,76 @@ class BackgroundTask(CeleryTask):
            should log themselves explicitly and make sure that they will not
            spam error messages.
 
-        Implement "is_equal" method to define what tasks are equal and should
-        be executed simultaneously.
+        Uncompleted task holds lease in cache, so that equal task is not scheduled
+        until lease is released on task completion or expires.
+        Override "get_lease_key" method to define what tasks are equal and should
+        not be executed simultaneously. Long running task should call "heartbeat"
+        method periodically so that its lease does not expire.
     """
     is_background = True
 
-    def is_equal(self, other_task, *args, **kwargs):
-        """ Return True if task do the same operation as other_task.
+    def get_lease_key(self, *args, **kwargs):
+        """ Return key of task lease, by default it depends on task name and input parameters. """
+        parts = [self.name] + [str(arg) for arg in args] + ['%s=%s' % item for item in sorted(kwargs.items())]
+        return 'waldur_core.background_task.' + ':'.join(parts)
 
-            Note! Other task is represented as serialized celery task - dictionary.
+    def get_lease_timeout(self):
+        return settings.WALDUR_CORE['BACKGROUND_TASK_LEASE_TIMEOUT'].total_seconds()
+
+    def acquire_lease(self, task_id, *args, **kwargs):
+        """ Return True if lease is acquired, it is atomic operation.
+            Lease that is already held by the same task is kept, so that it survives task retry.
         """
-        raise NotImplementedError('BackgroundTask should implement "is_equal" method to avoid queue overload.')
+        key = self.get_lease_key(*args, **kwargs)
+        return cache.add(key, task_id, self.get_lease_timeout()) or cache.get(key) == task_id
+
+    def release_lease(self, task_id, *args, **kwargs):
+        key = self.get_lease_key(*args, **kwargs)
+        if cache.get(key) == task_id:
+            cache.delete(key)
+
+    def heartbeat(self):
+        """ Extend lease of currently executed task. """
+        args, kwargs = self.request.args or (), self.request.kwargs or {}
+        cache.set(self.get_lease_key(*args, **kwargs), self.request.id, self.get_lease_timeout())
 
     def is_previous_task_processing(self, *args, **kwargs):
         """ Return True if exist task that is equal to current and is uncompleted """
-        app = self._get_app()
-        inspect = app.control.inspect()
-        active = inspect.active() or {}
-        scheduled = inspect.scheduled() or {}
-        reserved = inspect.reserved() or {}
-        uncompleted = sum(list(active.values()) + list(scheduled.values()) + list(reserved.values()), [])
-        return any(self.is_equal(task, *args, **kwargs) for task in uncompleted)
+        return cache.get(self.get_lease_key(*args, **kwargs)) is not None
 
     def apply_async(self, args=None, kwargs=None, **options):
         """ Do not run background task if previous task is uncompleted """
-        if self.is_previous_task_processing(*args, **kwargs):
+        args, kwargs = args or (), kwargs or {}
+        task_id = options.setdefault('task_id', str(uuid4()))
+        if not self.acquire_lease(task_id, *args, **kwargs):
             message = 'Background task %s was not scheduled, because its predecessor is not completed yet.' % self.name
             logger.info(message)
             # It is expected by Celery that apply_async return AsyncResult, otherwise celerybeat dies
-            return self.AsyncResult(options.get('task_id') or str(uuid4()))
-        return super(BackgroundTask, self).apply_async(args=args, kwargs=kwargs, **options)
+            return self.AsyncResult(task_id)
+        try:
+            return super(BackgroundTask, self).apply_async(args=args, kwargs=kwargs, **options)
+        except Exception:
+            self.release_lease(task_id, *args, **kwargs)
+            raise
+
+    def __call__(self, *args, **kwargs):
+        task_id = self.request.id
+        if not task_id:
+            # Task is called directly without Celery.
+            return super(BackgroundTask, self).__call__(*args, **kwargs)
+
+        # Task could wait in queue for a long time, so lease is extended on start.
+        self.heartbeat()
+        try:
+            result = super(BackgroundTask, self).__call__(*args, **kwargs)
+        except Retry:
+            # Lease is passed over to the retried task.
+            raise
+        except Exception:
+            self.release_lease(task_id, *args, **kwargs)
+            raise
+        self.release_lease(task_id, *args, **kwargs)
+        return result
 
 
 def log_celery_task(request):
@@ -399,3 +444,31 @@ class ExtensionTaskMixin(CeleryTask):
             logger.info(message)
             return self.AsyncResult(options.get('task_id') or str(uuid4()))
         return super(ExtensionTaskMixin, self).apply_async(args=args, kwargs=kwargs, **options)
+
+
+@shared_task(name='waldur_core.core.send_mail_batch', bind=True,
+             max_retries=settings.WALDUR_CORE['EMAIL_MAX_RETRIES'],
+             rate_limit=settings.WALDUR_CORE['EMAIL_RATE_LIMIT'])
+def send_mail_batch(self, subject, text_message, html_message, recipient_list,
+                    filename=None, attachment=None, content_type='text/plain'):
+    """
+    Send rendered message to batch of recipients reusing single SMTP connection.
+    Attachment is passed as base64 encoded string.
+    Failed recipients are retried with exponential backoff. If they could not be reached
+    after all retries, message is stored in failed mail store.
+    """
+    decoded_attachment = attachment and base64.b64decode(attachment)
+    errors = utils.send_mail_batch(subject, text_message, html_message, recipient_list,
+                                   filename, decoded_attachment, content_type)
+    if not errors:
+        return
+
+    failed_recipients = list(errors.keys())
+    if self.request.retries < self.max_retries:
+        raise self.retry(
+            args=(subject, text_message, html_message, failed_recipients, filename, attachment, content_type),
+            countdown=settings.WALDUR_CORE['EMAIL_RETRY_DELAY'].total_seconds() * 2 ** self.request.retries,
+        )
+
+    logger.error('Unable to send email "%s" to %s recipients.', subject, len(failed_recipients))
+    utils.store_failed_mail(subject, failed_recipients, '; '.join(set(errors.values())))
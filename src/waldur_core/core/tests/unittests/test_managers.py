@@ -0,0 +1,41 @@
+from django.test import TestCase
+
+from waldur_core.core.managers import SummaryQuerySet
+from waldur_core.structure.tests import factories, models as test_models
+
+
+class SummaryQuerySetKeysetPageTest(TestCase):
+    def setUp(self):
+        self.instances = factories.TestNewInstanceFactory.create_batch(3)
+        self.volumes = factories.TestVolumeFactory.create_batch(2)
+
+    def get_all_pages(self, ordering, page_size):
+        pages = []
+        cursor = None
+        while True:
+            queryset = SummaryQuerySet([test_models.TestNewInstance, test_models.TestVolume])
+            page, cursor = queryset.get_keyset_page(ordering, page_size, cursor)
+            pages.append(page)
+            if cursor is None:
+                return pages
+
+    def test_all_objects_are_returned_once(self):
+        pages = self.get_all_pages('pk', page_size=2)
+        objects = [obj for page in pages for obj in page]
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(set(objects), set(self.instances + self.volumes))
+        self.assertEqual(len(objects), 5)
+
+    def test_objects_are_ordered_by_key(self):
+        pages = self.get_all_pages('-created', page_size=2)
+        objects = [obj for page in pages for obj in page]
+
+        keys = [(obj.created, obj._meta.label_lower, obj.pk) for obj in objects]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_last_page_does_not_have_cursor(self):
+        queryset = SummaryQuerySet([test_models.TestNewInstance, test_models.TestVolume])
+        page, cursor = queryset.get_keyset_page('pk', page_size=5)
+        self.assertEqual(len(page), 5)
+        self.assertIsNone(cursor)
@@ -0,0 +1,46 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from waldur_core.core import tasks
+
+
+class DummyBackgroundTask(tasks.BackgroundTask):
+    name = 'waldur_core.core.tests.DummyBackgroundTask'
+
+    def run(self, *args, **kwargs):
+        pass
+
+
+@mock.patch('celery.app.task.Task.apply_async')
+class BackgroundTaskLeaseTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.task = DummyBackgroundTask()
+
+    def test_equal_task_is_not_scheduled_while_previous_task_is_uncompleted(self, apply_async_mock):
+        self.task.apply_async(args=('instance:1',))
+        self.task.apply_async(args=('instance:1',))
+        self.assertEqual(apply_async_mock.call_count, 1)
+
+    def test_task_with_other_arguments_is_scheduled(self, apply_async_mock):
+        self.task.apply_async(args=('instance:1',))
+        self.task.apply_async(args=('instance:2',))
+        self.assertEqual(apply_async_mock.call_count, 2)
+
+    def test_lease_is_released_when_task_is_completed(self, apply_async_mock):
+        self.task.apply_async(args=('instance:1',), task_id='first')
+        self.assertTrue(self.task.is_previous_task_processing('instance:1'))
+
+        self.task.apply(args=('instance:1',), task_id='first')
+        self.assertFalse(self.task.is_previous_task_processing('instance:1'))
+
+        self.task.apply_async(args=('instance:1',))
+        self.assertEqual(apply_async_mock.call_count, 2)
+
+    def test_lease_is_released_if_task_is_not_sent(self, apply_async_mock):
+        apply_async_mock.side_effect = ConnectionError()
+        with self.assertRaises(ConnectionError):
+            self.task.apply_async(args=('instance:1',))
+        self.assertFalse(self.task.is_previous_task_processing('instance:1'))
@@ -1,6 +1,13 @@
+import smtplib
 import unittest
+from unittest import mock
 
-from waldur_core.core import utils
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase
+
+from waldur_core.core import tasks, utils
+from waldur_core.core.tests.helpers import override_waldur_core_settings
 
 
 class TestFormatTimeAndValueToSegmentList(unittest.TestCase):
@@ -35,3 +42,65 @@ class TestFormatTimeAndValueToSegmentList(unittest.TestCase):
         expected_second_segment_value = sum([value for _, value in second_segment_time_value_list])
         self.assertEqual(first_segment['value'], expected_first_segment_value)
         self.assertEqual(second_segment['value'], expected_second_segment_value)
+
+
+class BroadcastMailTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.context = {'sender': 'Alice', 'link': 'https://example.com/'}
+
+    def test_each_recipient_receives_separate_message(self):
+        recipients = ['alice@example.com', 'bob@example.com']
+        utils.broadcast_mail('users', 'invitation_rejected', self.context, recipients)
+        self.assertEqual([message.to for message in mail.outbox], [[recipient] for recipient in recipients])
+        self.assertEqual(utils.get_mail_metrics()['sent'], 2)
+
+    @override_waldur_core_settings(EMAIL_CHUNK_SIZE=2)
+    @mock.patch('waldur_core.core.tasks.send_mail_batch.delay')
+    def test_large_recipient_list_is_sent_by_chunks(self, delay_mock):
+        recipients = ['user%s@example.com' % i for i in range(3)]
+        utils.broadcast_mail('users', 'invitation_rejected', self.context, recipients)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual([call[0][3] for call in delay_mock.call_args_list], [recipients[:2], recipients[2:]])
+
+    @mock.patch('waldur_core.core.tasks.send_mail_batch.delay')
+    def test_failed_recipients_are_retried_in_background(self, delay_mock):
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send', side_effect=smtplib.SMTPException()):
+            utils.broadcast_mail('users', 'invitation_rejected', self.context, ['alice@example.com'])
+        self.assertEqual(delay_mock.call_args[0][3], ['alice@example.com'])
+
+    def test_message_is_stored_if_it_could_not_be_sent_after_all_retries(self):
+        errors = {'alice@example.com': 'Connection refused'}
+        with mock.patch('waldur_core.core.utils.send_mail_batch', return_value=errors):
+            tasks.send_mail_batch.apply(
+                args=('Subject', 'Text', 'HTML', ['alice@example.com']),
+                retries=tasks.send_mail_batch.max_retries,
+            )
+        failed_mail = utils.get_failed_mail()
+        self.assertEqual(failed_mail[0]['recipients'], ['alice@example.com'])
+
+
+class MailMetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_metrics_of_batches_are_summed_up(self):
+        utils.update_mail_metrics(sent=2, failed=1, duration=0.5)
+        utils.update_mail_metrics(sent=3, duration=1.25)
+
+        self.assertEqual(utils.get_mail_metrics(), dict(sent=5, failed=1, batches=2, duration=1.75))
+
+    @mock.patch('waldur_core.core.utils.FAILED_MAIL_LIMIT', 2)
+    def test_only_latest_failed_messages_are_kept(self):
+        for subject in ('first', 'second', 'third'):
+            utils.store_failed_mail(subject, ['alice@example.com'], 'Connection refused')
+
+        self.assertEqual([message['subject'] for message in utils.get_failed_mail()], ['second', 'third'])
+
+    @mock.patch('waldur_core.core.utils.get_redis_client', return_value=None)
+    @mock.patch('waldur_core.core.utils.FAILED_MAIL_LIMIT', 2)
+    def test_failed_messages_are_kept_if_cache_is_not_backed_by_redis(self, client_mock):
+        for subject in ('first', 'second', 'third'):
+            utils.store_failed_mail(subject, ['alice@example.com'], 'Connection refused')
+
+        self.assertEqual([message['subject'] for message in utils.get_failed_mail()], ['second', 'third'])
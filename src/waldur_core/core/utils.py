@@ -1,12 +1,16 @@
+import base64
 import calendar
 from collections import OrderedDict
 import datetime
 import functools
 import importlib
+import json
 from itertools import chain
+import logging
 from operator import itemgetter
 import os
 import re
+import smtplib
 import time
 import unicodedata
 import uuid
@@ -15,7 +19,8 @@ import warnings
 from django.apps import apps
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.mail import EmailMultiAlternatives
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.core.serializers.json import DjangoJSONEncoder
@@ -23,7 +28,7 @@ from django.db.models import F
 from django.db.models.sql.query import get_order_dir
 from django.http import QueryDict
 from django.template import Context
-from django.template.loader import get_template, render_to_string
+from django.template.loader import get_template
 from django.urls import resolve
 from django.utils import timezone
 from django.utils.crypto import get_random_string
@@ -33,6 +38,8 @@ import requests
 from requests.packages.urllib3 import exceptions
 from rest_framework.settings import api_settings
 
+logger = logging.getLogger(__name__)
+
 
 def flatten(*xs):
     return tuple(chain.from_iterable(xs))
@@ -224,13 +231,19 @@ def silent_call(name, *args, **options):
     call_command(name, stdout=open(os.devnull, 'w'), *args, **options)
 
 
+@functools.lru_cache(maxsize=None)
+def get_cached_template(template_name):
+    """ Compile template only once per process, because the same mail is rendered many times. """
+    return get_template(template_name)
+
+
 def format_text(template_name, context):
-    template = get_template(template_name).template
+    template = get_cached_template(template_name).template
     return template.render(Context(context, autoescape=False)).strip()
 
 
-def send_mail_with_attachment(subject, body, to, from_email=None, html_message=None,
-                              filename=None, attachment=None, content_type='text/plain'):
+def create_mail_message(subject, body, to, from_email=None, html_message=None,
+                        filename=None, attachment=None, content_type='text/plain'):
     from_email = from_email or settings.DEFAULT_FROM_EMAIL
     email = EmailMultiAlternatives(
         subject=subject,
@@ -244,9 +257,119 @@ def send_mail_with_attachment(subject, body, to, from_email=None, html_message=N
 
     if filename:
         email.attach(filename, attachment, content_type)
+    return email
+
+
+def send_mail_with_attachment(subject, body, to, from_email=None, html_message=None,
+                              filename=None, attachment=None, content_type='text/plain'):
+    email = create_mail_message(subject, body, to, from_email, html_message, filename, attachment, content_type)
     return email.send()
 
 
+MAIL_METRICS_KEY = 'waldur_core.core.mail_metrics.%s'
+MAIL_METRICS = ('sent', 'failed', 'batches', 'duration')
+FAILED_MAIL_KEY = 'waldur_core.core.failed_mail'
+FAILED_MAIL_LIMIT = 1000
+
+
+def increment_cache_counter(key, delta):
+    # Counter is created atomically if it does not exist yet, so concurrent increments are not lost.
+    cache.add(key, 0, None)
+    cache.incr(key, delta)
+
+
+def update_mail_metrics(sent=0, failed=0, duration=0):
+    # Batches are sent by several workers at once, so each metric is incremented separately.
+    # Duration is stored in milliseconds because Redis increments only integer values.
+    increment_cache_counter(MAIL_METRICS_KEY % 'sent', sent)
+    increment_cache_counter(MAIL_METRICS_KEY % 'failed', failed)
+    increment_cache_counter(MAIL_METRICS_KEY % 'batches', 1)
+    increment_cache_counter(MAIL_METRICS_KEY % 'duration', int(duration * 1000))
+
+
+def get_mail_metrics():
+    """ Return number of sent and failed messages, number of batches and total time spent on sending. """
+    values = cache.get_many([MAIL_METRICS_KEY % name for name in MAIL_METRICS])
+    metrics = {name: values.get(MAIL_METRICS_KEY % name, 0) for name in MAIL_METRICS}
+    metrics['duration'] /= 1000
+    return metrics
+
+
+def get_redis_client():
+    """ Return Redis client of default cache or None if cache is not backed by Redis. """
+    try:
+        return cache.get_master_client()
+    except AttributeError:
+        return None
+
+
+def store_failed_mail(subject, recipients, error):
+    """ Keep messages which could not be delivered after all retries so that they could be inspected later. """
+    message = json.dumps(dict(
+        subject=subject,
+        recipients=recipients,
+        error=error,
+        date=timezone.now().isoformat(),
+    ))
+    client = get_redis_client()
+    if client is None:
+        # Cache which is not backed by Redis is not shared between workers, so plain update is used.
+        failed_mail = cache.get(FAILED_MAIL_KEY) or []
+        failed_mail.append(message)
+        cache.set(FAILED_MAIL_KEY, failed_mail[-FAILED_MAIL_LIMIT:], None)
+        return
+    # Message is appended and list is truncated in single transaction, so concurrent tasks do not lose messages.
+    pipeline = client.pipeline(transaction=True)
+    pipeline.rpush(FAILED_MAIL_KEY, message)
+    pipeline.ltrim(FAILED_MAIL_KEY, -FAILED_MAIL_LIMIT, -1)
+    pipeline.execute()
+
+
+def get_failed_mail():
+    client = get_redis_client()
+    if client is None:
+        values = cache.get(FAILED_MAIL_KEY) or []
+    else:
+        values = client.lrange(FAILED_MAIL_KEY, 0, -1)
+    return [json.loads(value) for value in values]
+
+
+def send_mail_batch(subject, text_message, html_message, recipient_list,
+                    filename=None, attachment=None, content_type='text/plain'):
+    """
+    Send separate message to each recipient using single SMTP connection.
+    Return dictionary which maps failed recipients to error messages.
+    """
+    errors = {}
+    start = time.time()
+    connection = get_connection()
+    try:
+        connection.open()
+    except (smtplib.SMTPException, OSError) as e:
+        logger.warning('Unable to open connection to mail server: %s', e)
+        errors = {recipient: str(e) for recipient in recipient_list}
+    else:
+        try:
+            for recipient in recipient_list:
+                email = create_mail_message(
+                    subject, text_message, to=[recipient], html_message=html_message,
+                    filename=filename, attachment=attachment, content_type=content_type)
+                email.connection = connection
+                try:
+                    email.send()
+                except (smtplib.SMTPException, OSError) as e:
+                    logger.warning('Unable to send email to %s: %s', recipient, e)
+                    errors[recipient] = str(e)
+        finally:
+            connection.close()
+    update_mail_metrics(
+        sent=len(recipient_list) - len(errors),
+        failed=len(errors),
+        duration=time.time() - start,
+    )
+    return errors
+
+
 def broadcast_mail(app, event_type, context, recipient_list,
                    filename=None, attachment=None, content_type='text/plain'):
     """
@@ -264,6 +387,10 @@ def broadcast_mail(app, event_type, context, recipient_list,
     Contrary to this, we're using explicit loop in order to ensure that
     recipients would NOT see the other recipients.
 
+    Messages are rendered once and sent in batches, each batch reuses single SMTP connection.
+    If there are more recipients than EMAIL_CHUNK_SIZE, batches are sent by background tasks.
+    Recipients whose messages could not be sent are retried by background task too.
+
     :param app: prefix for template filename.
     :param event_type: postfix for template filename.
     :param context: dictionary passed to the template for rendering.
@@ -272,6 +399,8 @@ def broadcast_mail(app, event_type, context, recipient_list,
     :param attachment: content of attachment
     :param content_type: the content type of attachment
     """
+    from waldur_core.core import tasks
+
     subject_template_name = '%s/%s_subject.txt' % (app, event_type)
     subject = format_text(subject_template_name, context)
 
@@ -279,11 +408,27 @@ def broadcast_mail(app, event_type, context, recipient_list,
     text_message = format_text(text_template_name, context)
 
     html_template_name = '%s/%s_message.html' % (app, event_type)
-    html_message = render_to_string(html_template_name, context)
-
-    for recipient in recipient_list:
-        send_mail_with_attachment(subject, text_message, to=[recipient], html_message=html_message,
-                                  filename=filename, attachment=attachment, content_type=content_type)
+    html_message = get_cached_template(html_template_name).render(context)
+
+    recipient_list = list(recipient_list)
+    chunk_size = settings.WALDUR_CORE['EMAIL_CHUNK_SIZE']
+    if isinstance(attachment, str):
+        attachment = attachment.encode()
+
+    def send_later(recipients):
+        encoded_attachment = attachment and base64.b64encode(attachment).decode()
+        tasks.send_mail_batch.delay(subject, text_message, html_message, recipients,
+                                    filename, encoded_attachment, content_type)
+
+    if len(recipient_list) <= chunk_size:
+        errors = send_mail_batch(subject, text_message, html_message, recipient_list,
+                                 filename, attachment, content_type)
+        if errors:
+            send_later(list(errors.keys()))
+        return
+
+    for recipients in chunks(recipient_list, chunk_size):
+        send_later(recipients)
 
 
 def get_ordering(request):
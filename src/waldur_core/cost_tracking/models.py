@@ -6,7 +6,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models, transaction
-from django.db.models import Q
+from django.db.models import F, Q
 from django.utils import timezone
 from django.utils.lru_cache import lru_cache
 from django.utils.translation import ugettext_lazy as _
@@ -91,14 +91,35 @@ class PriceEstimate(LoggableMixin, core_models.UuidMixin, core_models.Descendant
 
     def create_ancestors(self):
         """ Create price estimates for scope ancestors if they do not exist """
-        if not isinstance(self.scope, core_models.DescendantMixin):
-            return
-        scope_parents = self.scope.get_parents()
-        for scope_parent in scope_parents:
-            parent, created = PriceEstimate.objects.get_or_create(scope=scope_parent, month=self.month, year=self.year)
-            self.parents.add(parent)
-            if created:
-                parent.create_ancestors()
+        estimates = [self]
+        while estimates:
+            created_estimates = []
+            for estimate in estimates:
+                if not isinstance(estimate.scope, core_models.DescendantMixin):
+                    continue
+                parents = []
+                for scope_parent in estimate.scope.get_parents():
+                    parent, created = PriceEstimate.objects.get_or_create(
+                        scope=scope_parent, month=estimate.month, year=estimate.year)
+                    parents.append(parent)
+                    if created:
+                        created_estimates.append(parent)
+                estimate.parents.add(*parents)
+            # Only new estimates do not have their own ancestors yet.
+            estimates = created_estimates
+
+    def get_ancestor_ids(self):
+        """ Get IDs of all unique ancestors estimates, querying database once per tree level. """
+        through = PriceEstimate.parents.through
+        ancestor_ids = set()
+        level_ids = {self.id}
+        while level_ids:
+            parent_ids = set(through.objects
+                             .filter(from_priceestimate_id__in=level_ids)
+                             .values_list('to_priceestimate_id', flat=True))
+            level_ids = parent_ids - ancestor_ids
+            ancestor_ids |= level_ids
+        return ancestor_ids
 
     def init_details(self):
         """ Initialize price estimate details based on its scope """
@@ -127,9 +148,16 @@ class PriceEstimate(LoggableMixin, core_models.UuidMixin, core_models.Descendant
                 self.update_ancestors_total(diff, raise_exception=raise_exception)
 
     def update_ancestors_total(self, diff, raise_exception=False):
-        for ancestor in self.get_ancestors():
-            ancestor.total += diff
-            ancestor.save(update_fields=['total'])
+        """ Shift total of all ancestors by diff using single UPDATE query.
+
+            Rows are changed atomically on database level, so concurrent updates
+            of different resources do not overwrite each other and do not need
+            to lock ancestors rows for the whole transaction.
+        """
+        if not diff:
+            return
+        ancestor_ids = self.get_ancestor_ids()
+        PriceEstimate.objects.filter(id__in=ancestor_ids).update(total=F('total') + diff)
 
     def update_consumed(self):
         """ Re-calculate price of resource until now. Does not update ancestors. """
@@ -163,6 +191,11 @@ class PriceEstimate(LoggableMixin, core_models.UuidMixin, core_models.Descendant
         """
         price_list_items = PriceListItem.get_for_resource(self.scope)
         consumables_prices = {(item.item_type, item.key): item.minute_rate for item in price_list_items}
+        return self.calculate_price(consumed, consumables_prices)
+
+    @staticmethod
+    def calculate_price(consumed, consumables_prices):
+        """ Multiply usage of each consumable by its minute rate. """
         total = 0
         for consumable_item, usage in consumed.items():
             try:
@@ -461,3 +494,21 @@ class PriceListItem(core_models.UuidMixin, AbstractPriceListItem):
             default_price_list_item__in=default_items, service=service).select_related('default_price_list_item'))
         rewrited_defaults = set([i.default_price_list_item for i in items])
         return items | (default_items - rewrited_defaults)
+
+    @staticmethod
+    def get_consumables_prices(resource_model):
+        """ Get consumables minute rates for all resources of given model using two queries.
+
+            Return default rates and rates that are redefined for services as dict
+            that maps service ID to rates.
+        """
+        resource_content_type = ContentType.objects.get_for_model(resource_model)
+        default_items = DefaultPriceListItem.objects.filter(resource_content_type=resource_content_type)
+        default_prices = {(item.item_type, item.key): item.minute_rate for item in default_items}
+        services_prices = {}
+        items = (PriceListItem.objects
+                 .filter(default_price_list_item__resource_content_type=resource_content_type)
+                 .select_related('default_price_list_item'))
+        for item in items:
+            services_prices.setdefault(item.object_id, {})[(item.item_type, item.key)] = item.minute_rate
+        return default_prices, services_prices
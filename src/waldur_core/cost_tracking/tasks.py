@@ -1,8 +1,14 @@
 from celery import shared_task
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
 
 from waldur_core.cost_tracking import CostTrackingRegister, models
 from waldur_core.structure import models as structure_models
 
+LAST_RECALCULATION_KEY = 'waldur_core.cost_tracking.last_recalculation'
+
 
 @shared_task(name='waldur_core.cost_tracking.recalculate_estimate')
 def recalculate_estimate(recalculate_total=False):
@@ -12,21 +18,40 @@ def recalculate_estimate(recalculate_total=False):
         request, so we store cached price each hour.
         If recalculate_total is True - task also recalculates total estimate
         for current month.
+
+        Consumed price is recalculated only for resources that consume something
+        or whose consumption details have changed since previous run.
     """
     # Celery does not import server.urls and does not discover cost tracking modules.
     # So they should be discovered implicitly.
     CostTrackingRegister.autodiscover()
+    now = timezone.now()
+    last_recalculation = None if recalculate_total else cache.get(LAST_RECALCULATION_KEY)
     # Step 1. Recalculate resources estimates.
     for resource_model in CostTrackingRegister.registered_resources:
-        for resource in resource_model.objects.all():
+        for resource in _get_objects_without_current_estimate(resource_model):
             _update_resource_consumed(resource, recalculate_total=recalculate_total)
+        _update_resources_consumed(resource_model, last_recalculation, recalculate_total=recalculate_total)
     # Step 2. Move from down to top and recalculate consumed estimate for each
     #         object based on its children.
     ancestors_models = [m for m in models.PriceEstimate.get_estimated_models()
                         if not issubclass(m, structure_models.ResourceMixin)]
     for model in ancestors_models:
-        for ancestor in model.objects.all():
-            _update_ancestor_consumed(ancestor)
+        for ancestor in _get_objects_without_current_estimate(model):
+            models.PriceEstimate.objects.get_or_create_current(scope=ancestor)
+    _update_ancestors_consumed(now)
+    cache.set(LAST_RECALCULATION_KEY, now, None)
+
+
+def _get_current_estimates(model):
+    content_type = ContentType.objects.get_for_model(model)
+    return models.PriceEstimate.objects.filter_current().filter(content_type=content_type)
+
+
+def _get_objects_without_current_estimate(model):
+    """ Estimates are missing for new objects and for all objects in the beginning of the month. """
+    estimated_ids = _get_current_estimates(model).values_list('object_id', flat=True)
+    return model.objects.exclude(id__in=estimated_ids)
 
 
 def _update_resource_consumed(resource, recalculate_total):
@@ -40,9 +65,84 @@ def _update_resource_consumed(resource, recalculate_total):
     price_estimate.update_consumed()
 
 
-def _update_ancestor_consumed(ancestor):
-    price_estimate, _ = models.PriceEstimate.objects.get_or_create_current(scope=ancestor)
-    resource_descendants = [descendant for descendant in price_estimate.get_descendants()
-                            if isinstance(descendant.scope, structure_models.ResourceMixin)]
-    price_estimate.consumed = sum([descendant.consumed for descendant in resource_descendants])
-    price_estimate.save(update_fields=['consumed'])
+def _is_consumption_changed(details, last_recalculation):
+    if last_recalculation is None or details.modified >= last_recalculation:
+        return True
+    return any(usage for usage in details.configuration.values())
+
+
+def _update_resources_consumed(resource_model, last_recalculation, recalculate_total):
+    """ Recalculate consumed price for resources of given model using cached price list. """
+    service_ids = dict(resource_model.objects.values_list('id', 'service_project_link__service_id'))
+    default_prices, services_prices = models.PriceListItem.get_consumables_prices(resource_model)
+
+    details_list = (models.ConsumptionDetails.objects
+                    .filter(price_estimate__in=_get_current_estimates(resource_model))
+                    .select_related('price_estimate'))
+
+    changed_estimates = []
+    for details in details_list:
+        price_estimate = details.price_estimate
+        if price_estimate.object_id not in service_ids:
+            # Resource has been deleted, its consumption is frozen.
+            continue
+        if recalculate_total:
+            price_estimate.update_total()
+        if not _is_consumption_changed(details, last_recalculation):
+            continue
+        service_id = service_ids[price_estimate.object_id]
+        prices = dict(default_prices)
+        prices.update(services_prices.get(service_id, {}))
+        consumed = models.PriceEstimate.calculate_price(details.consumed_until_now, prices)
+        if consumed != price_estimate.consumed:
+            price_estimate.consumed = consumed
+            changed_estimates.append(price_estimate)
+
+    models.PriceEstimate.objects.bulk_update(changed_estimates, ['consumed'])
+
+
+def _get_ancestors_consumed(date):
+    """ Sum consumed price of unique resource descendants for each ancestor estimate using single query. """
+    through = models.PriceEstimate.parents.through
+    child_column = through._meta.get_field('from_priceestimate').column
+    parent_column = through._meta.get_field('to_priceestimate').column
+    resource_content_types = ContentType.objects.get_for_models(*structure_models.ResourceMixin.get_all_models())
+    query = """
+        WITH RECURSIVE closure(ancestor_id, descendant_id) AS (
+            SELECT edge.{parent}, edge.{child}
+            FROM {edges} edge JOIN {estimates} estimate ON estimate.id = edge.{parent}
+            WHERE estimate.year = %s AND estimate.month = %s
+          UNION
+            SELECT closure.ancestor_id, edge.{child}
+            FROM closure JOIN {edges} edge ON edge.{parent} = closure.descendant_id
+        )
+        SELECT closure.ancestor_id, SUM(descendant.consumed)
+        FROM closure JOIN {estimates} descendant ON descendant.id = closure.descendant_id
+        WHERE descendant.content_type_id IN %s
+        GROUP BY closure.ancestor_id
+    """.format(
+        edges=through._meta.db_table,
+        estimates=models.PriceEstimate._meta.db_table,
+        parent=parent_column,
+        child=child_column,
+    )
+    content_type_ids = tuple(content_type.id for content_type in resource_content_types.values())
+    with connection.cursor() as cursor:
+        cursor.execute(query, [date.year, date.month, content_type_ids])
+        return dict(cursor.fetchall())
+
+
+def _update_ancestors_consumed(date):
+    ancestors_consumed = _get_ancestors_consumed(date)
+    resource_content_types = ContentType.objects.get_for_models(*structure_models.ResourceMixin.get_all_models())
+    ancestors = (models.PriceEstimate.objects
+                 .filter(year=date.year, month=date.month)
+                 .exclude(content_type__in=resource_content_types.values())
+                 .only('id', 'consumed'))
+    changed_estimates = []
+    for price_estimate in ancestors:
+        consumed = ancestors_consumed.get(price_estimate.id, 0)
+        if consumed != price_estimate.consumed:
+            price_estimate.consumed = consumed
+            changed_estimates.append(price_estimate)
+    models.PriceEstimate.objects.bulk_update(changed_estimates, ['consumed'])
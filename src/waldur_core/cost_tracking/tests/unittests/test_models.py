@@ -108,3 +108,28 @@ class DefaultPriceListItemTest(TransactionTestCase):
         actual = models.DefaultPriceListItem.get_consumable_items_pretty_names(
             price_list_item.resource_content_type, [consumable_item])
         self.assertDictEqual(actual, expected)
+
+
+class PriceEstimateAncestorsTest(TransactionTestCase):
+
+    def setUp(self):
+        self.resource = structure_factories.TestNewInstanceFactory()
+        self.estimate = factories.PriceEstimateFactory(scope=self.resource)
+        self.estimate.create_ancestors()
+        link = self.resource.service_project_link
+        self.scopes = [link, link.project, link.customer, link.service, link.service.settings]
+
+    def get_ancestors(self):
+        return [models.PriceEstimate.objects.get(scope=scope, year=self.estimate.year, month=self.estimate.month)
+                for scope in self.scopes]
+
+    def test_ancestors_are_created_for_all_scope_ancestors(self):
+        self.assertEqual(self.estimate.get_ancestor_ids(), {ancestor.id for ancestor in self.get_ancestors()})
+
+    def test_ancestors_total_is_shifted_by_diff(self):
+        totals = {ancestor.id: ancestor.total for ancestor in self.get_ancestors()}
+
+        self.estimate.update_ancestors_total(diff=10)
+
+        for ancestor in self.get_ancestors():
+            self.assertEqual(ancestor.total, totals[ancestor.id] + 10)
@@ -1,6 +1,8 @@
 import datetime
+from unittest import mock
 
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.test import TransactionTestCase
 from freezegun import freeze_time
 
@@ -13,6 +15,7 @@ from waldur_core.structure.tests.models import TestNewInstance
 class RecalculateEstimateTest(TransactionTestCase):
 
     def setUp(self):
+        cache.clear()
         resource_content_type = ContentType.objects.get_for_model(TestNewInstance)
         self.price_list_item = models.DefaultPriceListItem.objects.create(
             item_type='storage', key='1 MB', resource_content_type=resource_content_type, value=2)
@@ -76,3 +79,44 @@ class RecalculateEstimateTest(TransactionTestCase):
             message = 'Price estimate "consumed" is calculated wrongly for "%s". Real value: %s, expected: %s.' % (
                 price_estimate.scope, price_estimate.consumed, expected_consumed)
             self.assertAlmostEqual(price_estimate.consumed, expected_consumed, msg=message)
+
+
+class IncrementalRecalculateEstimateTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        resource_content_type = ContentType.objects.get_for_model(TestNewInstance)
+        self.price_list_item = models.DefaultPriceListItem.objects.create(
+            item_type='storage', key='1 MB', resource_content_type=resource_content_type, value=2)
+        CostTrackingRegister.register_strategy(factories.TestNewInstanceCostTrackingStrategy)
+        self.start_time = datetime.datetime(2016, 8, 8, 11, 0)
+        with freeze_time(self.start_time):
+            self.resource = structure_factories.TestNewInstanceFactory(disk=20 * 1024)
+
+    def test_resource_without_consumption_is_not_recalculated(self):
+        with freeze_time(self.start_time):
+            self.resource.disk = 0
+            self.resource.save()
+
+        for hour in (15, 16):
+            with freeze_time(datetime.datetime(2016, 8, 8, hour, 0)):
+                tasks.recalculate_estimate()
+
+        with freeze_time(datetime.datetime(2016, 8, 8, 17, 0)):
+            with mock.patch.object(models.PriceEstimate, 'calculate_price') as calculate_price:
+                tasks.recalculate_estimate()
+            self.assertFalse(calculate_price.called)
+
+    def test_service_price_list_item_overrides_default_one(self):
+        service = self.resource.service_project_link.service
+        price_list_item = factories.PriceListItemFactory(
+            service=service, default_price_list_item=self.price_list_item, value=4)
+
+        calculation_time = datetime.datetime(2016, 8, 8, 15, 0)
+        with freeze_time(calculation_time):
+            tasks.recalculate_estimate()
+            price_estimate = models.PriceEstimate.objects.get_current(scope=self.resource)
+
+        working_minutes = (calculation_time - self.start_time).total_seconds() / 60
+        expected = working_minutes * price_list_item.minute_rate * self.resource.disk
+        self.assertAlmostEqual(price_estimate.consumed, expected)
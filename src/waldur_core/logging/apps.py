@@ -7,10 +7,41 @@ class EventsConfig(AppConfig):
     verbose_name = 'Logging'
 
     def ready(self):
+        from waldur_core.core.models import User
         from waldur_core.logging import handlers, models
+        from waldur_core.structure import signals as structure_signals
 
         signals.post_save.connect(
             handlers.process_hook,
             sender=models.Event,
             dispatch_uid='waldur_core.logging.handlers.process_hook',
         )
+
+        for model in models.BaseHook.get_all_models() + [models.SystemNotification]:
+            signals.post_save.connect(
+                handlers.invalidate_hooks_index,
+                sender=model,
+                dispatch_uid='waldur_core.logging.handlers.invalidate_hooks_index_on_%s_save' % model.__name__,
+            )
+
+            signals.post_delete.connect(
+                handlers.invalidate_hooks_index,
+                sender=model,
+                dispatch_uid='waldur_core.logging.handlers.invalidate_hooks_index_on_%s_delete' % model.__name__,
+            )
+
+        structure_signals.structure_role_granted.connect(
+            handlers.invalidate_user_permitted_scopes,
+            dispatch_uid='waldur_core.logging.handlers.invalidate_user_permitted_scopes_on_role_granted',
+        )
+
+        structure_signals.structure_role_revoked.connect(
+            handlers.invalidate_user_permitted_scopes,
+            dispatch_uid='waldur_core.logging.handlers.invalidate_user_permitted_scopes_on_role_revoked',
+        )
+
+        signals.post_save.connect(
+            handlers.invalidate_permitted_scopes_on_user_save,
+            sender=User,
+            dispatch_uid='waldur_core.logging.handlers.invalidate_permitted_scopes_on_user_save',
+        )
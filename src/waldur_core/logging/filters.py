@@ -3,7 +3,7 @@ import django_filters
 from django_filters.widgets import BooleanWidget
 from rest_framework import filters
 
-from waldur_core.core import serializers as core_serializers, filters as core_filters
+from waldur_core.core import fields as core_fields, serializers as core_serializers, filters as core_filters
 from waldur_core.logging import models, utils
 from waldur_core.logging.loggers import expand_event_groups
 
@@ -80,11 +80,19 @@ class EventFilterBackend(filters.BaseFilterBackend):
                 return queryset.none()
 
             content_type = ContentType.objects.get_for_model(scope._meta.model)
-            events = models.Feed.objects.filter(
+            feeds = models.Feed.objects.filter(
                 content_type=content_type,
                 object_id=scope.id,
-            ).values_list('event_id', flat=True)
-            queryset = queryset.filter(id__in=events)
+            )
+            # Time range is applied to feed too so that composite index of scope and creation time is used.
+            timestamp_field = core_fields.TimestampField()
+            if request.query_params.get('created_from'):
+                created_from = timestamp_field.to_internal_value(request.query_params['created_from'])
+                feeds = feeds.filter(created__gte=created_from)
+            if request.query_params.get('created_to'):
+                created_to = timestamp_field.to_internal_value(request.query_params['created_to'])
+                feeds = feeds.filter(created__lt=created_to)
+            queryset = queryset.filter(id__in=feeds.values_list('event_id', flat=True))
 
         elif not request.user.is_staff and not request.user.is_support:
             # If user is not staff nor support, he is allowed to see
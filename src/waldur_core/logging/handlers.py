@@ -1,7 +1,19 @@
 from django.db import transaction
 
-from waldur_core.logging import tasks
+from waldur_core.logging import routing, tasks
 
 
 def process_hook(sender, instance, created=False, **kwargs):
     transaction.on_commit(lambda: tasks.process_event.delay(instance.pk))
+
+
+def invalidate_hooks_index(sender, instance, **kwargs):
+    routing.invalidate_hooks_index()
+
+
+def invalidate_user_permitted_scopes(sender, user, **kwargs):
+    routing.invalidate_user_scopes(user)
+
+
+def invalidate_permitted_scopes_on_user_save(sender, instance, **kwargs):
+    routing.invalidate_user_scopes(instance)
@@ -10,8 +10,9 @@ import uuid
 
 from django.apps import apps
 from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
 
-from waldur_core.logging import models
+from waldur_core.logging import sinks
 from waldur_core.logging.log import EventLoggerAdapter
 from waldur_core.logging.middleware import get_event_context
 
@@ -203,15 +204,14 @@ class EventLogger(BaseLogger):
         log = getattr(self.logger, level)
         log(msg, extra={'event_type': event_type, 'event_context': context})
 
-        event = models.Event.objects.create(
+        scopes = self.get_scopes(event_context) if event_context else []
+        sinks.get_event_sink().emit(dict(
             event_type=event_type,
             message=msg,
             context=context,
-        )
-        if event_context:
-            for scope in self.get_scopes(event_context) or []:
-                if scope and scope.id:
-                    models.Feed.objects.create(scope=scope, event=event)
+            created=timezone.now(),
+            scopes=sinks.get_scope_keys(scopes),
+        ))
 
 
 class LoggableMixin:
@@ -49,4 +49,7 @@ class CaptureEventContextMiddleware(MiddlewareMixin):
 
     def process_response(self, request, response):
         reset_event_context()
+        # Store events buffered during request processing.
+        from waldur_core.logging.sinks import flush_thread_events
+        flush_thread_events()
         return response
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logging', '0007_drop_alerts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feed',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunSQL(
+            'UPDATE logging_feed SET created = logging_event.created '
+            'FROM logging_event WHERE logging_feed.event_id = logging_event.id',
+            reverse_sql=migrations.RunSQL.noop,
+            elidable=True,
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['created'], name='logging_event_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['event_type', 'created'], name='logging_event_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feed',
+            index=models.Index(fields=['content_type', 'object_id', 'created'], name='logging_feed_scope_created_idx'),
+        ),
+    ]
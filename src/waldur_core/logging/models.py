@@ -300,6 +300,10 @@ class Event(UuidMixin):
 
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['created'], name='logging_event_created_idx'),
+            models.Index(fields=['event_type', 'created'], name='logging_event_type_created_idx'),
+        ]
 
 
 class FeedManager(GenericKeyMixin, models.Manager):
@@ -311,4 +315,11 @@ class Feed(models.Model):
     content_type = models.ForeignKey(on_delete=models.CASCADE, to=ct_models.ContentType, db_index=True)
     object_id = models.PositiveIntegerField(db_index=True)
     scope = ct_fields.GenericForeignKey('content_type', 'object_id')
+    # Copy of event creation time, it allows to filter feed of scope by time range without join.
+    created = models.DateTimeField(default=timezone.now)
     objects = FeedManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_type', 'object_id', 'created'], name='logging_feed_scope_created_idx'),
+        ]
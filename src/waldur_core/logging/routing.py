@@ -0,0 +1,113 @@
+""" Routing of events to hooks without checking every active hook against every event feed.
+
+    Hooks index maps event type to list of active hooks subscribed to it either directly
+    or via event group.
+    Permitted scopes index stores IDs of objects of given content type visible to user.
+    Both indexes are stored in cache. Hooks index is invalidated on hook or system notification change.
+    Permitted scopes of user are invalidated on role grant or revoke and on user update.
+    Objects created after permitted scopes have been indexed trigger index rebuild.
+"""
+
+from collections import defaultdict
+import uuid
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+
+from waldur_core.logging import models
+
+HOOKS_INDEX_KEY = 'waldur_core.logging.hooks_index'
+USER_VERSION_KEY = 'waldur_core.logging.permitted_scopes_version.%s'
+PERMITTED_SCOPES_KEY = 'waldur_core.logging.permitted_scopes.%s.%s.%s'
+HOOKS_INDEX_TIMEOUT = 24 * 60 * 60
+# Permissions could be changed without role change, for example, when project is moved to another customer.
+PERMITTED_SCOPES_TIMEOUT = 10 * 60
+
+
+def build_hooks_index():
+    index = defaultdict(list)
+    for hook in models.BaseHook.get_active_hooks():
+        content_type = ContentType.objects.get_for_model(hook)
+        for event_type in hook.all_event_types:
+            index[event_type].append((content_type.id, hook.id))
+    return dict(index)
+
+
+def get_hooks_index():
+    index = cache.get(HOOKS_INDEX_KEY)
+    if index is None:
+        index = build_hooks_index()
+        cache.set(HOOKS_INDEX_KEY, index, HOOKS_INDEX_TIMEOUT)
+    return index
+
+
+def invalidate_hooks_index():
+    cache.delete(HOOKS_INDEX_KEY)
+
+
+def get_event_hooks(event_type):
+    """ Get active hooks subscribed to event type using one query per hook model. """
+    hook_ids = defaultdict(list)
+    for content_type_id, hook_id in get_hooks_index().get(event_type, []):
+        hook_ids[content_type_id].append(hook_id)
+
+    hooks = []
+    for content_type_id, ids in hook_ids.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        hooks.extend(model.objects.filter(id__in=ids, is_active=True).select_related('user'))
+    return hooks
+
+
+def get_user_version(user):
+    key = USER_VERSION_KEY % user.id
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(key, version, PERMITTED_SCOPES_TIMEOUT)
+    return version
+
+
+def invalidate_user_scopes(user):
+    cache.set(USER_VERSION_KEY % user.id, uuid.uuid4().hex, PERMITTED_SCOPES_TIMEOUT)
+
+
+def build_permitted_scopes(user, model):
+    queryset = model.get_permitted_objects(user)
+    last_id = model.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    if queryset.query.is_empty():
+        return {'all': False, 'ids': set(), 'last_id': last_id}
+    # Unfiltered queryset means that user is allowed to see all objects, for example, staff.
+    if not queryset.query.where:
+        return {'all': True, 'ids': set(), 'last_id': last_id}
+    return {'all': False, 'ids': set(queryset.values_list('id', flat=True)), 'last_id': last_id}
+
+
+def get_permitted_scopes(user, content_type_ids):
+    """ Get permitted scopes of user for each content type using one cache request. """
+    version = get_user_version(user)
+    keys = {content_type_id: PERMITTED_SCOPES_KEY % (user.id, version, content_type_id)
+            for content_type_id in content_type_ids}
+    cached = cache.get_many(keys.values())
+    return {content_type_id: cached.get(key) for content_type_id, key in keys.items()}, keys
+
+
+def is_event_permitted(feeds, user):
+    """ Check if user is allowed to see at least one of event scopes. """
+    if not feeds:
+        return False
+
+    content_type_ids = set(feed.content_type_id for feed in feeds)
+    scopes, keys = get_permitted_scopes(user, content_type_ids)
+
+    for feed in feeds:
+        permitted = scopes[feed.content_type_id]
+        # Scope has been created after index has been built, so it should be rebuilt.
+        if permitted is None or feed.object_id > permitted['last_id']:
+            model = ContentType.objects.get_for_id(feed.content_type_id).model_class()
+            permitted = build_permitted_scopes(user, model)
+            scopes[feed.content_type_id] = permitted
+            cache.set(keys[feed.content_type_id], permitted, PERMITTED_SCOPES_TIMEOUT)
+        if permitted['all'] or feed.object_id in permitted['ids']:
+            return True
+
+    return False
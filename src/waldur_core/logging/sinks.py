@@ -0,0 +1,198 @@
+""" Event sinks define how and when events emitted by event loggers are stored in DB.
+
+    Sink is configured by WALDUR_CORE['EVENTS_SINK'] setting:
+     - sync - event and its feeds are stored right away, hooks are processed one task per event;
+     - memory - events are buffered in memory of current thread;
+     - redis - events are buffered in Redis list of default cache server.
+
+    Events emitted inside transaction are buffered only when it is committed,
+    so events of rolled back changes are dropped.
+    Buffered events are flushed using bulk_create for Event and Feed models when
+    WALDUR_CORE['EVENTS_BATCH_SIZE'] or WALDUR_CORE['EVENTS_FLUSH_INTERVAL'] threshold is reached.
+    Memory buffer is also flushed at the end of request or Celery task.
+    Redis buffer is also flushed periodically by flush_events Celery task. Batch is removed
+    from Redis list only after it has been stored in DB, so it is retried if DB write fails.
+    Hooks of flushed events are processed in batches by process_events Celery task.
+"""
+
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import dateparse, timezone
+
+from waldur_core.logging import models
+
+logger = logging.getLogger(__name__)
+
+_locals = threading.local()
+
+REDIS_BUFFER_KEY = 'waldur_core.logging.events_buffer'
+REDIS_FLUSH_LOCK_KEY = 'waldur_core.logging.events_buffer_flush'
+# Lock is released by flush, timeout is needed only if process is terminated while batch is stored.
+REDIS_FLUSH_LOCK_TIMEOUT = 5 * 60
+
+
+def get_scope_keys(scopes):
+    return [(ContentType.objects.get_for_model(scope).id, scope.id)
+            for scope in scopes or [] if scope and scope.id]
+
+
+def write_events(payloads):
+    """ Store events with their feeds using one INSERT per model and schedule hooks processing. """
+    if not payloads:
+        return []
+
+    with transaction.atomic():
+        events = [models.Event(
+            event_type=payload['event_type'],
+            message=payload['message'],
+            context=payload['context'],
+            created=payload['created'],
+        ) for payload in payloads]
+        models.Event.objects.bulk_create(events)
+
+        feeds = [models.Feed(event=event, content_type_id=content_type_id, object_id=object_id,
+                             created=event.created)
+                 for event, payload in zip(events, payloads)
+                 for content_type_id, object_id in payload['scopes']]
+        models.Feed.objects.bulk_create(feeds)
+
+    from waldur_core.logging import tasks
+
+    event_ids = [event.id for event in events]
+    transaction.on_commit(lambda: tasks.process_events.delay(event_ids))
+    return events
+
+
+class BaseEventSink:
+    def emit(self, payload):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def get_batch_size(self):
+        return settings.WALDUR_CORE['EVENTS_BATCH_SIZE']
+
+
+class SyncEventSink(BaseEventSink):
+    """ Event is created right away so that post_save signal triggers hooks processing. """
+
+    def emit(self, payload):
+        event = models.Event.objects.create(
+            event_type=payload['event_type'],
+            message=payload['message'],
+            context=payload['context'],
+        )
+        models.Feed.objects.bulk_create([
+            models.Feed(event=event, content_type_id=content_type_id, object_id=object_id, created=event.created)
+            for content_type_id, object_id in payload['scopes']
+        ])
+
+
+class MemoryEventSink(BaseEventSink):
+    """ Events are buffered in local thread, so they are lost if process is terminated before flush. """
+
+    def get_buffer(self):
+        if not hasattr(_locals, 'events'):
+            _locals.events = []
+        return _locals.events
+
+    def emit(self, payload):
+        # Callback is called right away if there is no active transaction.
+        transaction.on_commit(lambda: self.append(payload))
+
+    def append(self, payload):
+        events = self.get_buffer()
+        events.append(payload)
+
+        interval = settings.WALDUR_CORE['EVENTS_FLUSH_INTERVAL']
+        if len(events) >= self.get_batch_size() or timezone.now() - events[0]['created'] >= interval:
+            self.flush()
+
+    def flush(self):
+        events = self.get_buffer()
+        if not events:
+            return
+        _locals.events = []
+        write_events(events)
+
+
+class RedisEventSink(BaseEventSink):
+    """ Events are stored in Redis list so that they are shared between processes and survive restart. """
+
+    def get_client(self):
+        try:
+            return cache.get_master_client()
+        except AttributeError:
+            raise ImproperlyConfigured('Redis event sink requires Redis cache backend.')
+
+    def serialize(self, payload):
+        return json.dumps(payload, cls=DjangoJSONEncoder)
+
+    def deserialize(self, value):
+        payload = json.loads(value)
+        payload['created'] = dateparse.parse_datetime(payload['created'])
+        return payload
+
+    def emit(self, payload):
+        transaction.on_commit(lambda: self.append(payload))
+
+    def append(self, payload):
+        size = self.get_client().rpush(REDIS_BUFFER_KEY, self.serialize(payload))
+        if size >= self.get_batch_size():
+            from waldur_core.logging import tasks
+            tasks.flush_events.delay()
+
+    def flush(self):
+        while True:
+            # Only one process stores batch at a time, otherwise the same events could be read twice.
+            if not cache.add(REDIS_FLUSH_LOCK_KEY, True, REDIS_FLUSH_LOCK_TIMEOUT):
+                return
+            try:
+                stored = self.flush_batch()
+            finally:
+                cache.delete(REDIS_FLUSH_LOCK_KEY)
+            if stored < self.get_batch_size():
+                return
+
+    def flush_batch(self):
+        """ Store the oldest batch of events and remove it from Redis list. Return number of stored events. """
+        client = self.get_client()
+        values = client.lrange(REDIS_BUFFER_KEY, 0, self.get_batch_size() - 1)
+        if not values:
+            return 0
+        write_events([self.deserialize(value) for value in values])
+        # New events are appended to the tail of the list, so head contains exactly the stored batch.
+        client.ltrim(REDIS_BUFFER_KEY, len(values), -1)
+        return len(values)
+
+
+SINKS = {
+    'sync': SyncEventSink,
+    'memory': MemoryEventSink,
+    'redis': RedisEventSink,
+}
+
+
+def get_event_sink():
+    name = settings.WALDUR_CORE.get('EVENTS_SINK', 'sync')
+    try:
+        return SINKS[name]()
+    except KeyError:
+        raise ImproperlyConfigured('Unknown event sink %s. Choices are: %s' % (name, ', '.join(SINKS)))
+
+
+def flush_thread_events():
+    """ Store events buffered in memory of current thread, it is called at the end of request or Celery task. """
+    try:
+        MemoryEventSink().flush()
+    except Exception:
+        logger.exception('Unable to flush events buffered in memory.')
@@ -6,51 +6,100 @@ import traceback
 from celery import shared_task
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
 
 from waldur_core.core.utils import deserialize_instance
-from waldur_core.logging.models import BaseHook, SystemNotification, Report, Feed, Event
-from waldur_core.logging.utils import create_report_archive
+from waldur_core.logging import routing, sinks
+from waldur_core.logging.models import SystemNotification, Report, Feed, Event
+from waldur_core.logging.utils import archive_events, create_report_archive
 from waldur_core.structure import models as structure_models
 
 logger = logging.getLogger(__name__)
 
+EVENTS_CLEANUP_CHUNK_SIZE = 1000
+
 
 @shared_task(name='waldur_core.logging.process_event')
 def process_event(event_id):
     event = Event.objects.get(id=event_id)
-    for hook in BaseHook.get_active_hooks():
-        if check_event(event, hook):
+    _process_event(event)
+
+
+@shared_task(name='waldur_core.logging.process_events')
+def process_events(event_ids):
+    """ Process hooks for batch of events flushed by event sink. """
+    for event in Event.objects.filter(id__in=event_ids):
+        try:
+            _process_event(event)
+        except Exception:
+            logger.exception('Unable to process hooks for event with ID %s.', event.id)
+
+
+@shared_task(name='waldur_core.logging.flush_events')
+def flush_events():
+    sinks.get_event_sink().flush()
+
+
+def _process_event(event):
+    feeds = list(Feed.objects.filter(event=event))
+
+    # Only hooks subscribed to event type are fetched from DB.
+    for hook in routing.get_event_hooks(event.event_type):
+        if check_event(event, hook, feeds):
             hook.process(event)
 
-    process_system_notification(event)
+    process_system_notification(event, feeds)
 
 
-def process_system_notification(event):
+def process_system_notification(event, feeds=None):
+    if feeds is None:
+        feeds = list(Feed.objects.filter(event=event))
+
     project_ct = ContentType.objects.get_for_model(structure_models.Project)
-    project_feed = Feed.objects.filter(event=event, content_type=project_ct).first()
+    project_feed = next((feed for feed in feeds if feed.content_type_id == project_ct.id), None)
     project = project_feed and project_feed.scope
 
     customer_ct = ContentType.objects.get_for_model(structure_models.Customer)
-    customer_feed = Feed.objects.filter(event=event, content_type=customer_ct).first()
+    customer_feed = next((feed for feed in feeds if feed.content_type_id == customer_ct.id), None)
     customer = customer_feed and customer_feed.scope
 
     for hook in SystemNotification.get_hooks(event.event_type, project=project, customer=customer):
-        if check_event(event, hook):
+        if check_event(event, hook, feeds):
             hook.process(event)
 
 
-def check_event(event, hook):
+def check_event(event, hook, feeds=None):
     # Check that event matches with hook
     if event.event_type not in hook.all_event_types:
         return False
 
     # Check permissions
-    for feed in Feed.objects.filter(event=event):
-        qs = feed.content_type.model_class().get_permitted_objects(hook.user)
-        if qs.filter(id=feed.object_id).exists():
-            return True
-
-    return False
+    if feeds is None:
+        feeds = list(Feed.objects.filter(event=event))
+    return routing.is_event_permitted(feeds, hook.user)
+
+
+@shared_task(name='waldur_core.logging.cleanup_events')
+def cleanup_events():
+    """ Archive and delete events older than retention period in chunks. """
+    retention_period = settings.WALDUR_CORE['EVENTS_RETENTION_PERIOD']
+    if not retention_period:
+        return
+
+    cutoff = timezone.now() - retention_period
+    directory = settings.WALDUR_CORE['EVENTS_ARCHIVE_DIRECTORY']
+    expired_events = Event.objects.filter(created__lt=cutoff).order_by('created')
+
+    while True:
+        event_ids = list(expired_events.values_list('id', flat=True)[:EVENTS_CLEANUP_CHUNK_SIZE])
+        if not event_ids:
+            return
+        if directory:
+            archive_events(Event.objects.filter(id__in=event_ids).order_by('created'), directory)
+        with transaction.atomic():
+            Feed.objects.filter(event_id__in=event_ids).delete()
+            Event.objects.filter(id__in=event_ids).delete()
 
 
 @shared_task(name='waldur_core.logging.create_report')
@@ -0,0 +1,52 @@
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from waldur_core.core.tests.helpers import override_waldur_core_settings
+from waldur_core.logging import models, tasks
+from waldur_core.logging.tests.factories import EventFactory
+from waldur_core.structure.tests import factories as structure_factories
+
+
+class EventsCleanupTest(TransactionTestCase):
+    def setUp(self):
+        self.customer = structure_factories.CustomerFactory()
+        self.old_event = EventFactory(event_type='customer_update_succeeded')
+        self.old_event.created = timezone.now() - datetime.timedelta(days=100)
+        self.old_event.save()
+        models.Feed.objects.create(scope=self.customer, event=self.old_event, created=self.old_event.created)
+        self.new_event = EventFactory(event_type='customer_update_succeeded')
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_events_are_not_deleted_if_retention_period_is_not_set(self):
+        tasks.cleanup_events()
+        self.assertTrue(models.Event.objects.filter(id=self.old_event.id).exists())
+
+    @override_waldur_core_settings(EVENTS_RETENTION_PERIOD=datetime.timedelta(days=30))
+    def test_expired_events_are_deleted(self):
+        tasks.cleanup_events()
+        self.assertFalse(models.Event.objects.filter(id=self.old_event.id).exists())
+        self.assertFalse(models.Feed.objects.filter(event_id=self.old_event.id).exists())
+        self.assertTrue(models.Event.objects.filter(id=self.new_event.id).exists())
+
+    def test_expired_events_are_archived(self):
+        with override_waldur_core_settings(EVENTS_RETENTION_PERIOD=datetime.timedelta(days=30),
+                                           EVENTS_ARCHIVE_DIRECTORY=self.directory):
+            tasks.cleanup_events()
+
+        filename = 'events-%s.jsonl.gz' % self.old_event.created.strftime('%Y-%m')
+        with gzip.open(os.path.join(self.directory, filename), 'rt') as archive:
+            records = [json.loads(line) for line in archive]
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['uuid'], self.old_event.uuid.hex)
+        self.assertEqual(records[0]['scopes'], [['structure.customer', self.customer.id]])
@@ -0,0 +1,66 @@
+from django.test import TransactionTestCase
+
+from waldur_core.logging import models, routing
+from waldur_core.logging.tests.factories import EventFactory
+from waldur_core.structure import models as structure_models
+from waldur_core.structure.tests import factories as structure_factories
+
+
+class HooksIndexTest(TransactionTestCase):
+    def setUp(self):
+        self.user = structure_factories.UserFactory()
+        self.hook = models.EmailHook.objects.create(
+            user=self.user, email=self.user.email, event_types=['customer_update_succeeded'])
+
+    def test_only_subscribed_hooks_are_returned(self):
+        self.assertEqual(routing.get_event_hooks('customer_update_succeeded'), [self.hook])
+        self.assertEqual(routing.get_event_hooks('customer_deletion_succeeded'), [])
+
+    def test_index_is_invalidated_when_hook_is_updated(self):
+        routing.get_event_hooks('customer_update_succeeded')
+        self.hook.event_types = ['customer_deletion_succeeded']
+        self.hook.save()
+
+        self.assertEqual(routing.get_event_hooks('customer_update_succeeded'), [])
+        self.assertEqual(routing.get_event_hooks('customer_deletion_succeeded'), [self.hook])
+
+    def test_inactive_hook_is_skipped(self):
+        routing.get_event_hooks('customer_update_succeeded')
+        self.hook.is_active = False
+        self.hook.save()
+
+        self.assertEqual(routing.get_event_hooks('customer_update_succeeded'), [])
+
+
+class PermittedScopesTest(TransactionTestCase):
+    def setUp(self):
+        self.user = structure_factories.UserFactory()
+        self.customer = structure_factories.CustomerFactory()
+        self.event = EventFactory(event_type='customer_update_succeeded')
+        self.feeds = [models.Feed.objects.create(scope=self.customer, event=self.event)]
+
+    def test_event_is_not_permitted_for_user_without_role(self):
+        self.assertFalse(routing.is_event_permitted(self.feeds, self.user))
+
+    def test_index_is_invalidated_when_role_is_granted(self):
+        routing.is_event_permitted(self.feeds, self.user)
+        self.customer.add_user(self.user, structure_models.CustomerRole.OWNER)
+        self.assertTrue(routing.is_event_permitted(self.feeds, self.user))
+
+    def test_index_is_invalidated_when_role_is_revoked(self):
+        self.customer.add_user(self.user, structure_models.CustomerRole.OWNER)
+        routing.is_event_permitted(self.feeds, self.user)
+        self.customer.remove_user(self.user)
+        self.assertFalse(routing.is_event_permitted(self.feeds, self.user))
+
+    def test_scope_created_after_indexing_is_checked(self):
+        self.customer.add_user(self.user, structure_models.CustomerRole.OWNER)
+        routing.is_event_permitted(self.feeds, self.user)
+
+        project = structure_factories.ProjectFactory(customer=self.customer)
+        feeds = [models.Feed.objects.create(scope=project, event=self.event)]
+        self.assertTrue(routing.is_event_permitted(feeds, self.user))
+
+    def test_staff_is_allowed_to_see_all_events(self):
+        staff = structure_factories.UserFactory(is_staff=True)
+        self.assertTrue(routing.is_event_permitted(self.feeds, staff))
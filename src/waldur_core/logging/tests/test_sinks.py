@@ -0,0 +1,143 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from waldur_core.core.tests.helpers import override_waldur_core_settings
+from waldur_core.logging import models, sinks
+from waldur_core.logging.loggers import event_logger
+from waldur_core.structure.tests import factories as structure_factories
+
+
+def log_event(customer):
+    event_logger.customer.info(
+        'Customer {customer_name} has been updated.',
+        event_type='customer_update_succeeded',
+        event_context={'customer': customer})
+
+
+class SyncEventSinkTest(TransactionTestCase):
+
+    def test_event_and_feed_are_created_right_away(self):
+        customer = structure_factories.CustomerFactory()
+        log_event(customer)
+
+        event = models.Event.objects.get(event_type='customer_update_succeeded')
+        self.assertTrue(models.Feed.objects.filter(event=event, object_id=customer.id).exists())
+
+
+@override_waldur_core_settings(EVENTS_SINK='memory', EVENTS_BATCH_SIZE=3)
+@mock.patch('waldur_core.logging.tasks.process_events')
+class MemoryEventSinkTest(TransactionTestCase):
+
+    def setUp(self):
+        self.customer = structure_factories.CustomerFactory()
+        # skip customer creation event
+        sinks.MemoryEventSink().get_buffer().clear()
+
+    def tearDown(self):
+        sinks.MemoryEventSink().get_buffer().clear()
+
+    def test_events_are_buffered_until_flush(self, process_events_mock):
+        log_event(self.customer)
+        log_event(self.customer)
+        self.assertFalse(models.Event.objects.filter(event_type='customer_update_succeeded').exists())
+
+        sinks.flush_thread_events()
+
+        events = models.Event.objects.filter(event_type='customer_update_succeeded')
+        self.assertEqual(events.count(), 2)
+        self.assertEqual(models.Feed.objects.filter(event__in=events, object_id=self.customer.id).count(), 2)
+
+    def test_events_are_flushed_when_batch_size_is_reached(self, process_events_mock):
+        for _ in range(3):
+            log_event(self.customer)
+
+        self.assertEqual(models.Event.objects.filter(event_type='customer_update_succeeded').count(), 3)
+
+    def test_hooks_are_processed_in_batch(self, process_events_mock):
+        log_event(self.customer)
+        log_event(self.customer)
+        sinks.flush_thread_events()
+
+        event_ids = list(models.Event.objects.filter(
+            event_type='customer_update_succeeded').values_list('id', flat=True))
+        process_events_mock.delay.assert_called_once()
+        self.assertEqual(sorted(process_events_mock.delay.call_args[0][0]), sorted(event_ids))
+
+    def test_events_of_rolled_back_transaction_are_dropped(self, process_events_mock):
+        try:
+            with transaction.atomic():
+                log_event(self.customer)
+                raise ValueError
+        except ValueError:
+            pass
+
+        self.assertEqual(sinks.MemoryEventSink().get_buffer(), [])
+
+    def test_events_of_committed_transaction_are_buffered(self, process_events_mock):
+        with transaction.atomic():
+            log_event(self.customer)
+            self.assertEqual(sinks.MemoryEventSink().get_buffer(), [])
+
+        self.assertEqual(len(sinks.MemoryEventSink().get_buffer()), 1)
+
+
+@override_waldur_core_settings(EVENTS_SINK='redis', EVENTS_BATCH_SIZE=2)
+@mock.patch('waldur_core.logging.tasks.process_events')
+class RedisEventSinkTest(TransactionTestCase):
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.rpush.return_value = 1
+        mock.patch.object(sinks.RedisEventSink, 'get_client', return_value=self.client).start()
+        self.customer = structure_factories.CustomerFactory()
+        self.client.reset_mock()
+        cache.delete(sinks.REDIS_FLUSH_LOCK_KEY)
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def get_values(self, count):
+        sink = sinks.RedisEventSink()
+        return [sink.serialize(dict(event_type='customer_update_succeeded',
+                                    message='Customer has been updated.',
+                                    context={},
+                                    created=timezone.now(),
+                                    scopes=[])) for _ in range(count)]
+
+    def test_events_of_rolled_back_transaction_are_not_pushed(self, process_events_mock):
+        try:
+            with transaction.atomic():
+                log_event(self.customer)
+                raise ValueError
+        except ValueError:
+            pass
+
+        self.client.rpush.assert_not_called()
+
+    def test_batch_is_removed_from_buffer_after_it_is_stored(self, process_events_mock):
+        self.client.lrange.return_value = self.get_values(1)
+
+        sinks.RedisEventSink().flush()
+
+        self.assertEqual(models.Event.objects.filter(event_type='customer_update_succeeded').count(), 1)
+        self.client.ltrim.assert_called_once_with(sinks.REDIS_BUFFER_KEY, 1, -1)
+
+    def test_batch_is_kept_in_buffer_if_it_is_not_stored(self, process_events_mock):
+        self.client.lrange.return_value = self.get_values(1)
+
+        with mock.patch('waldur_core.logging.sinks.write_events', side_effect=DatabaseError):
+            self.assertRaises(DatabaseError, sinks.RedisEventSink().flush)
+
+        self.client.ltrim.assert_not_called()
+        self.assertIsNone(cache.get(sinks.REDIS_FLUSH_LOCK_KEY))
+
+    def test_batch_is_not_read_while_another_flush_is_in_progress(self, process_events_mock):
+        cache.add(sinks.REDIS_FLUSH_LOCK_KEY, True)
+
+        sinks.RedisEventSink().flush()
+
+        self.client.lrange.assert_not_called()
@@ -1,10 +1,15 @@
 from io import BytesIO
 import datetime
+import gzip
+import json
 import os
 import tarfile
 
 from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
 from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
 
 from waldur_core.core.utils import datetime_to_timestamp
 from waldur_core.logging.loggers import LoggableMixin
@@ -48,3 +53,49 @@ def create_report_archive(log_directory, interval):
             archive.add(filename)
 
     return ContentFile(stream.getvalue())
+
+
+def archive_events(events, directory):
+    """
+    Append events to gzipped JSON lines files in directory, one file per month of event creation.
+    :param events: queryset of events, for example, expired events
+    :param directory: directory for archive files, for example, /var/lib/waldur/events/
+    """
+    os.makedirs(directory, exist_ok=True)
+    archives = {}
+    try:
+        for event in events.prefetch_related('feed_set'):
+            filename = os.path.join(directory, 'events-%s.jsonl.gz' % event.created.strftime('%Y-%m'))
+            if filename not in archives:
+                archives[filename] = gzip.open(filename, 'at')
+            record = {
+                'uuid': event.uuid.hex,
+                'created': event.created,
+                'event_type': event.event_type,
+                'message': event.message,
+                'context': event.context,
+                'scopes': [
+                    ('%s.%s' % ContentType.objects.get_for_id(feed.content_type_id).natural_key(), feed.object_id)
+                    for feed in event.feed_set.all()
+                ],
+            }
+            archives[filename].write(json.dumps(record, cls=DjangoJSONEncoder) + '\n')
+    finally:
+        for archive in archives.values():
+            archive.close()
+
+
+def get_estimated_count(queryset):
+    """
+    Get number of rows estimated by PostgreSQL query planner.
+    Unlike COUNT query it does not scan table, so it is fast, but it may be inaccurate.
+    """
+    if queryset.query.is_empty():
+        return 0
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
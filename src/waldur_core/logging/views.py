@@ -1,7 +1,8 @@
+from django.conf import settings
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import response, viewsets, permissions, status, decorators, mixins
 
-from waldur_core.core import filters as core_filters, permissions as core_permissions
+from waldur_core.core import filters as core_filters, pagination as core_pagination, permissions as core_permissions
 from waldur_core.core.managers import SummaryQuerySet
 from waldur_core.logging import models, serializers, filters, utils
 from waldur_core.logging.loggers import get_event_groups
@@ -25,9 +26,18 @@ class EventViewSet(viewsets.ReadOnlyModelViewSet):
         .. code-block:: javascript
 
             {"count": 12321}
+
+        If query planner estimates that there are more events than
+        WALDUR_CORE['EVENTS_COUNT_ESTIMATE_THRESHOLD'], estimated count is returned
+        in order to avoid full scan of events table.
         """
 
         self.queryset = self.filter_queryset(self.get_queryset())
+        threshold = settings.WALDUR_CORE['EVENTS_COUNT_ESTIMATE_THRESHOLD']
+        if threshold:
+            count = utils.get_estimated_count(self.queryset)
+            if count > threshold:
+                return response.Response({'count': count}, status=status.HTTP_200_OK)
         return response.Response({'count': self.queryset.count()}, status=status.HTTP_200_OK)
 
     @decorators.action(detail=False)
@@ -186,6 +196,8 @@ class HookSummary(mixins.ListModelMixin, viewsets.GenericViewSet):
     """
     serializer_class = serializers.SummaryHookSerializer
     filter_backends = (core_filters.StaffOrUserFilter, filters.HookSummaryFilterBackend)
+    pagination_class = core_pagination.SummaryPagination
+    cursor_ordering = '-created'
 
     def get_queryset(self):
         return SummaryQuerySet(models.BaseHook.get_all_models())
@@ -64,6 +64,12 @@ class QuotasConfig(AppConfig):
             dispatch_uid='waldur_core.quotas.handle_aggregated_quotas_pre_delete',
         )
 
+        signals.post_save.connect(
+            handlers.record_quota_sample,
+            sender=Quota,
+            dispatch_uid='waldur_core.quotas.record_quota_sample',
+        )
+
     @staticmethod
     def register_counter_field_signals(model, counter_field):
         from waldur_core.quotas import handlers
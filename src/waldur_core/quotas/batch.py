@@ -0,0 +1,182 @@
+""" Batched application of quota usage deltas """
+
+from collections import defaultdict
+import contextlib
+import logging
+import threading
+
+from django.contrib.contenttypes import models as ct_models
+from django.db import transaction
+from django.db.models import F, Q, signals
+from django.utils.translation import ugettext_lazy as _
+
+from waldur_core.quotas import exceptions
+
+logger = logging.getLogger(__name__)
+_locals = threading.local()
+
+
+def get_current_batch():
+    return getattr(_locals, 'batch', None)
+
+
+@contextlib.contextmanager
+def batch_quota_changes():
+    """
+    Defer quota usage changes made with add_quota_usage until the end of the block.
+
+    Nested blocks are merged into the outermost one. It could be used as decorator
+    for views or Celery tasks in order to apply all quota deltas of request or task at once.
+    Quota validation errors are raised on block exit and no delta is applied in this case.
+
+    Example:
+        with batch_quota_changes():
+            instance.increase_backend_quotas_usage()
+            for volume in instance.volumes.all():
+                volume.increase_backend_quotas_usage()
+    """
+    batch = get_current_batch()
+    if batch is not None:
+        yield batch
+        return
+
+    batch = QuotaDeltaBatch()
+    _locals.batch = batch
+    try:
+        yield batch
+    finally:
+        del _locals.batch
+    batch.apply()
+
+
+class QuotaDeltaBatch:
+    """
+    Collects quota usage deltas and applies them once per affected quota row.
+
+    Deltas of the same quota are merged. Each quota row is updated with single conditional F() UPDATE:
+     - negative delta is skipped if it would result in negative usage;
+     - positive delta is rejected if it exceeds quota limit and validation is requested.
+    Usage aggregator quotas of scope ancestors are updated together with child quotas,
+    one UPDATE per distinct delta. post_save signal is still sent for each changed child quota,
+    so that receivers other than aggregator handler keep working.
+    Note that quota versions are not created for batched updates.
+    """
+
+    def __init__(self):
+        self.scopes = {}
+        self.deltas = defaultdict(lambda: 0)
+        self.validated = set()
+
+    def add(self, scope, quota_name, delta, validate=False):
+        content_type = ct_models.ContentType.objects.get_for_model(scope)
+        key = (content_type.id, scope.id, str(quota_name))
+        self.scopes[key[:2]] = scope
+        self.deltas[key] += delta
+        if validate:
+            self.validated.add(key)
+
+    @transaction.atomic
+    def apply(self):
+        deltas = {key: delta for key, delta in self.deltas.items() if delta}
+        self.deltas.clear()
+        if not deltas:
+            return
+
+        quotas = self._get_quotas(deltas.keys())
+        for key, delta in deltas.items():
+            # Negative delta is not applied to missing quota, the same way as in add_quota_usage.
+            if key not in quotas and delta > 0:
+                scope = self.scopes[key[:2]]
+                quota = scope.get_or_create_quota(key[2])
+                quota.scope = scope
+                quotas[key] = quota
+
+        # Sort quotas to lock rows in the same order and avoid deadlocks.
+        changed_quotas = []
+        for key, quota in sorted(quotas.items(), key=lambda item: item[1].pk):
+            delta = deltas[key]
+            if self._update_usage(quota, delta, validate=key in self.validated):
+                changed_quotas.append((key, quota, delta))
+
+        ancestor_deltas = self._get_ancestor_deltas(changed_quotas)
+        self._update_ancestors_usage(ancestor_deltas)
+
+        for key, quota, delta in changed_quotas:
+            quota.usage += delta
+            # Aggregator quotas have been already updated, handler should skip them.
+            setattr(quota, 'SKIP_AGGREGATION', True)
+            signals.post_save.send(
+                sender=quota.__class__, instance=quota, created=False,
+                update_fields=frozenset(['usage']), raw=False, using=quota._state.db)
+
+    def _get_quotas(self, keys):
+        from waldur_core.quotas.models import Quota
+
+        scopes = [self.scopes[key[:2]] for key in keys]
+        quota_names = set(key[2] for key in keys)
+        quotas = {}
+        for quota in Quota.objects.filter_for_scopes(scopes, quota_names):
+            key = (quota.content_type_id, quota.object_id, quota.name)
+            if key in keys:
+                # Populate generic foreign key cache so that signal receivers do not fetch scope again.
+                quota.scope = self.scopes[key[:2]]
+                quotas[key] = quota
+        return quotas
+
+    def _update_usage(self, quota, delta, validate=False):
+        queryset = quota.__class__.objects.filter(pk=quota.pk)
+        if delta < 0:
+            queryset = queryset.filter(usage__gte=-delta)
+        elif validate:
+            queryset = queryset.filter(Q(limit=-1) | Q(usage__lte=F('limit') - delta))
+
+        if queryset.update(usage=F('usage') + delta):
+            return True
+
+        if delta > 0:
+            quota.refresh_from_db()
+            raise exceptions.QuotaValidationError(
+                _('%(quota)s "%(name)s" quota is over limit. Required: %(usage)s, limit: %(limit)s.') % dict(
+                    quota=quota.scope, name=quota.name, usage=quota.usage + delta, limit=quota.limit))
+        return False
+
+    def _get_ancestor_deltas(self, changed_quotas):
+        scope_deltas = defaultdict(dict)
+        for key, quota, delta in changed_quotas:
+            scope_deltas[key[:2]][quota.name] = delta
+
+        ancestor_deltas = defaultdict(lambda: 0)
+        for scope_key, deltas in scope_deltas.items():
+            scope = self.scopes[scope_key]
+            for (ancestor, name), delta in scope.get_ancestor_quota_deltas(deltas).items():
+                content_type = ct_models.ContentType.objects.get_for_model(ancestor)
+                ancestor_deltas[content_type.id, ancestor.id, name] += delta
+        return ancestor_deltas
+
+    def _update_ancestors_usage(self, ancestor_deltas):
+        from waldur_core.quotas.models import Quota, QuotaSample
+
+        keys_by_delta = defaultdict(list)
+        for key, delta in ancestor_deltas.items():
+            if delta:
+                keys_by_delta[delta].append(key)
+
+        for delta, keys in keys_by_delta.items():
+            query = Q()
+            for content_type_id, object_id, name in keys:
+                query |= Q(content_type_id=content_type_id, object_id=object_id, name=name)
+            quotas = Quota.objects.filter(query)
+            updated = quotas.update(usage=F('usage') + delta)
+            if updated:
+                QuotaSample.objects.record(quotas)
+            if updated < len(keys):
+                self._log_missing_quotas(quotas, keys, delta)
+
+    def _log_missing_quotas(self, quotas, keys, delta):
+        existing_keys = set(quotas.values_list('content_type_id', 'object_id', 'name'))
+        for content_type_id, object_id, name in keys:
+            if (content_type_id, object_id, name) not in existing_keys:
+                content_type = ct_models.ContentType.objects.get_for_id(content_type_id)
+                logger.warning('Usage aggregator quota "%(name)s" of %(model)s with ID %(id)s does not exist. '
+                               'Usage delta %(delta)s is not applied.',
+                               dict(name=name, model=content_type.model, id=object_id, delta=delta))
@@ -1,8 +1,9 @@
+from collections import defaultdict
 from functools import reduce
 
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
-from django.db.models import F, Sum
+from django.db.models import Count, F, Sum
 
 from . import exceptions
 
@@ -182,6 +183,38 @@ class CounterQuotaField(QuotaField):
             filter_path_to_scope = self.path_to_scope.replace('.', '__')
             return sum([m.objects.filter(**{filter_path_to_scope: scope}).count() for m in models])
 
+    def get_current_usage_by_scope(self, models):
+        """
+        Return dictionary which maps scope ID to current usage using one grouped query per target model.
+        If usage is computed by custom function, None is returned as it could not be grouped.
+        """
+        if self._raw_get_current_usage is not None:
+            return None
+        usages = defaultdict(lambda: 0)
+        for model in models:
+            scope_path = self._get_scope_lookup(model)
+            rows = model.objects.values(scope_path).annotate(usage=self._get_usage_aggregate()).order_by()
+            for row in rows:
+                usages[row[scope_path]] += row['usage'] or 0
+        return usages
+
+    def _get_scope_lookup(self, model):
+        """
+        Convert path to scope into lookup which could be used in values() call.
+        Structure models resolve customer and project fields using their permissions paths.
+        """
+        path = self.path_to_scope.replace('.', '__')
+        base, _, rest = path.partition('__')
+        field_names = {field.name for field in model._meta.get_fields()}
+        permissions = getattr(model, 'Permissions', None)
+        if base not in field_names and hasattr(permissions, '%s_path' % base):
+            base = getattr(permissions, '%s_path' % base)
+            path = base + '__' + rest if rest else base
+        return path
+
+    def _get_usage_aggregate(self):
+        return Count('pk')
+
     @property
     def target_models(self):
         if not hasattr(self, '_target_models'):
@@ -240,6 +273,9 @@ class TotalQuotaField(CounterQuotaField):
     def get_delta(self, target_instance):
         return getattr(target_instance, self.target_field)
 
+    def _get_usage_aggregate(self):
+        return Sum(self.target_field)
+
 
 class AggregatorQuotaField(QuotaField):
     """ Aggregates sum of quota scope children with the same name.
@@ -277,12 +313,19 @@ class AggregatorQuotaField(QuotaField):
         else:
             diff = current_value - child_quota.tracker.previous(self.aggregation_field)
         if diff:
-            scope.quotas.filter(name=self.name).update(usage=F('usage') + diff)
+            self.update_usage(scope, diff)
 
     def pre_child_quota_delete(self, scope, child_quota):
         diff = getattr(child_quota, self.aggregation_field)
         if diff:
-            scope.quotas.filter(name=self.name).update(usage=F('usage') - diff)
+            self.update_usage(scope, -diff)
+
+    def update_usage(self, scope, diff):
+        from waldur_core.quotas.models import QuotaSample
+
+        quotas = scope.quotas.filter(name=self.name)
+        if quotas.update(usage=F('usage') + diff):
+            QuotaSample.objects.record(quotas)
 
 
 class UsageAggregatorQuotaField(AggregatorQuotaField):
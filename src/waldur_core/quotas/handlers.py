@@ -14,13 +14,17 @@ def create_global_quotas(**kwargs):
 def increase_global_quota(sender, instance=None, created=False, **kwargs):
     if created and hasattr(sender, 'GLOBAL_COUNT_QUOTA_NAME'):
         name = getattr(sender, 'GLOBAL_COUNT_QUOTA_NAME')
-        models.Quota.objects.filter(name=name).update(usage=F('usage') + 1)
+        quotas = models.Quota.objects.filter(name=name)
+        if quotas.update(usage=F('usage') + 1):
+            models.QuotaSample.objects.record(quotas)
 
 
 def decrease_global_quota(sender, **kwargs):
     if hasattr(sender, 'GLOBAL_COUNT_QUOTA_NAME'):
         name = getattr(sender, 'GLOBAL_COUNT_QUOTA_NAME')
-        models.Quota.objects.filter(name=name).update(usage=F('usage') - 1)
+        quotas = models.Quota.objects.filter(name=name)
+        if quotas.update(usage=F('usage') - 1):
+            models.QuotaSample.objects.record(quotas)
 
 
 # new quotas
@@ -55,6 +59,9 @@ def handle_aggregated_quotas(sender, instance, **kwargs):
     # aggregation is not supported for global quotas.
     if quota.scope is None:
         return
+    # ancestors quotas have been already updated by quota deltas batch.
+    if getattr(quota, 'SKIP_AGGREGATION', False):
+        return
     quota_field = quota.get_field()
     # usage aggregation should not count another usage aggregator field to avoid calls duplication.
     if isinstance(quota_field, fields.UsageAggregatorQuotaField) or quota_field is None:
@@ -66,3 +73,17 @@ def handle_aggregated_quotas(sender, instance, **kwargs):
             field.post_child_quota_save(aggregator_quota.scope, child_quota=quota, created=kwargs.get('created'))
         elif signal == signals.pre_delete:
             field.pre_child_quota_delete(aggregator_quota.scope, child_quota=quota)
+
+
+def record_quota_sample(sender, instance, created=False, **kwargs):
+    """ Append quota limit and usage to quotas history if they have been changed """
+    quota = instance
+    if not created and not quota.tracker.has_changed('usage') and not quota.tracker.has_changed('limit'):
+        return
+    models.QuotaSample.objects.create(
+        content_type_id=quota.content_type_id,
+        object_id=quota.object_id,
+        name=quota.name,
+        limit=quota.limit,
+        usage=quota.usage,
+    )
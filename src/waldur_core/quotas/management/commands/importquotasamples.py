@@ -0,0 +1,47 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from reversion.models import Version
+
+from waldur_core.quotas.models import Quota, QuotaSample
+
+
+class Command(BaseCommand):
+    help = "Import quotas history from django-reversion versions into quotas samples."
+
+    def handle(self, *args, **options):
+        quotas = {
+            quota_id: (content_type_id, object_id, name)
+            for quota_id, content_type_id, object_id, name in Quota.objects.values_list(
+                'id', 'content_type_id', 'object_id', 'name')
+        }
+        # Versions created after the first sample are already present in samples.
+        first_sample = QuotaSample.objects.aggregate(created=Min('created'))['created']
+        versions = Version.objects.filter(
+            content_type=ContentType.objects.get_for_model(Quota),
+        ).select_related('revision')
+        if first_sample:
+            versions = versions.filter(revision__date_created__lt=first_sample)
+
+        samples = []
+        count = 0
+        for version in versions.iterator():
+            key = quotas.get(int(version.object_id))
+            if key is None:
+                continue
+            content_type_id, object_id, name = key
+            samples.append(QuotaSample(
+                content_type_id=content_type_id,
+                object_id=object_id,
+                name=name,
+                created=version.revision.date_created,
+                limit=version.field_dict['limit'],
+                usage=version.field_dict['usage'],
+            ))
+            if len(samples) == 1000:
+                QuotaSample.objects.bulk_create(samples)
+                count += len(samples)
+                samples = []
+        QuotaSample.objects.bulk_create(samples)
+        count += len(samples)
+        self.stdout.write('%s quotas samples have been imported.' % count)
@@ -1,5 +1,7 @@
+from collections import defaultdict
+
 from django.contrib.contenttypes import models as ct_models
-from django.db import models
+from django.db import connection, models
 from django.db.models import Q
 
 from waldur_core.core.managers import GenericKeyMixin
@@ -7,6 +9,21 @@ from waldur_core.core.managers import GenericKeyMixin
 
 class QuotaManager(GenericKeyMixin, models.Manager):
 
+    def filter_for_scopes(self, scopes, quota_names):
+        """ Filter quotas with given names of several scopes of any models using single query. """
+        scopes_ids = defaultdict(set)
+        for scope in scopes:
+            content_type = ct_models.ContentType.objects.get_for_model(scope)
+            scopes_ids[content_type.id].add(scope.id)
+
+        query = Q()
+        for content_type_id, object_ids in scopes_ids.items():
+            query |= Q(content_type_id=content_type_id, object_id__in=object_ids)
+
+        if not query:
+            return self.none()
+        return self.filter(query, name__in=[str(name) for name in quota_names])
+
     def filtered_for_user(self, user, queryset=None):
         from waldur_core.quotas import utils
 
@@ -27,3 +44,56 @@ class QuotaManager(GenericKeyMixin, models.Manager):
             query |= Q(object_id__in=user_object_ids, content_type_id=content_type_id)
 
         return queryset.filter(query)
+
+
+class QuotaSampleManager(models.Manager):
+
+    def record(self, quotas):
+        """
+        Store current limit and usage of quotas using single query.
+        It is called when quotas are updated with F expressions, because post_save signal is not sent then.
+        """
+        self.bulk_create([
+            self.model(content_type_id=content_type_id, object_id=object_id, name=name, limit=limit, usage=usage)
+            for content_type_id, object_id, name, limit, usage in quotas.values_list(
+                'content_type_id', 'object_id', 'name', 'limit', 'usage')
+        ])
+
+    def get_timeline(self, scopes, quota_names, dates):
+        """
+        Get limit and usage of quotas summed over scopes at each of given dates using single query.
+        Latest sample created before date is used for each quota.
+        If any limit is -1, total limit is -1 as well.
+        Return dictionary where key is (date index, quota name) and value is (limit, usage).
+        """
+        scopes_ids = []
+        for scope in scopes:
+            content_type = ct_models.ContentType.objects.get_for_model(scope)
+            scopes_ids.append((content_type.id, scope.id))
+        if not scopes_ids or not quota_names or not dates:
+            return {}
+
+        content_type_ids, object_ids = zip(*scopes_ids)
+        query = """
+            SELECT point.index, quota.name,
+                   CASE WHEN bool_or(sample."limit" = -1) THEN -1 ELSE SUM(sample."limit") END,
+                   SUM(sample.usage)
+            FROM unnest(%s::timestamptz[]) WITH ORDINALITY AS point(date, index)
+            CROSS JOIN unnest(%s::integer[], %s::integer[]) AS scope(content_type_id, object_id)
+            CROSS JOIN unnest(%s::varchar[]) AS quota(name)
+            CROSS JOIN LATERAL (
+                SELECT "limit", usage
+                FROM {table}
+                WHERE content_type_id = scope.content_type_id
+                  AND object_id = scope.object_id
+                  AND name = quota.name
+                  AND created <= point.date
+                ORDER BY created DESC
+                LIMIT 1
+            ) sample
+            GROUP BY point.index, quota.name
+        """.format(table=self.model._meta.db_table)
+        params = [list(dates), list(content_type_ids), list(object_ids), [str(name) for name in quota_names]]
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            return {(index - 1, name): (limit, usage) for index, name, limit, usage in cursor.fetchall()}
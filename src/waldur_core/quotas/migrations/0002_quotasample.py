@@ -0,0 +1,36 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('quotas', '0001_squashed_0004'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotaSample',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField(null=True)),
+                ('name', models.CharField(max_length=150)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('limit', models.FloatField()),
+                ('usage', models.FloatField()),
+                ('content_type', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='quotasample',
+            index=models.Index(fields=['content_type', 'object_id', 'name', 'created'], name='quotas_sample_scope_idx'),
+        ),
+        migrations.RunSQL(
+            'INSERT INTO quotas_quotasample (content_type_id, object_id, name, created, "limit", usage) '
+            'SELECT content_type_id, object_id, name, NOW(), "limit", usage FROM quotas_quota',
+            reverse_sql=migrations.RunSQL.noop,
+            elidable=True,
+        ),
+    ]
@@ -1,12 +1,14 @@
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from functools import reduce
 import inspect
 import logging
 
+from django.conf import settings
 from django.contrib.contenttypes import fields as ct_fields
 from django.contrib.contenttypes import models as ct_models
 from django.db import models, transaction
 from django.db.models import Sum, F
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from model_utils import FieldTracker
 from reversion import revisions as reversion
@@ -15,6 +17,7 @@ from waldur_core.core.models import UuidMixin, ReversionMixin, DescendantMixin
 from waldur_core.logging.loggers import LoggableMixin
 from waldur_core.logging.models import AlertThresholdMixin
 from waldur_core.quotas import exceptions, managers, fields
+from waldur_core.quotas.batch import batch_quota_changes, get_current_batch
 
 logger = logging.getLogger(__name__)
 
@@ -82,6 +85,43 @@ class Quota(UuidMixin, AlertThresholdMixin, LoggableMixin, ReversionMixin, model
     def is_over_threshold(self):
         return self.usage >= self.threshold
 
+    def save(self, **kwargs):
+        # Quota history is stored as samples, so reversion may be disabled to keep revision tables small.
+        if not settings.WALDUR_CORE['QUOTA_REVERSION_ENABLED']:
+            return super(ReversionMixin, self).save(**kwargs)
+        return super(Quota, self).save(**kwargs)
+
+
+class QuotaSample(models.Model):
+    """
+    Append-only history of quota limit and usage.
+    Sample is stored each time when quota limit or usage is changed.
+    """
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_type', 'object_id', 'name', 'created'], name='quotas_sample_scope_idx'),
+        ]
+
+    content_type = models.ForeignKey(on_delete=models.CASCADE, to=ct_models.ContentType, null=True)
+    object_id = models.PositiveIntegerField(null=True)
+    scope = ct_fields.GenericForeignKey('content_type', 'object_id')
+    name = models.CharField(max_length=150)
+    created = models.DateTimeField(default=timezone.now)
+    limit = models.FloatField()
+    usage = models.FloatField()
+
+    objects = managers.QuotaSampleManager()
+
+    def __str__(self):
+        return '%s quota sample for %s' % (self.name, self.scope)
+
+
+class QuotaViolation(namedtuple('QuotaViolation', ('scope', 'name', 'limit', 'usage', 'delta'))):
+    """ Quota of the scope that will be exceeded if delta is added to its usage. """
+
+    def __str__(self):
+        return '%s quota limit: %s, requires %s (%s)\n' % (self.name, self.limit, self.usage + self.delta, self.scope)
+
 
 class QuotaModelMixin(models.Model):
     """
@@ -109,8 +149,10 @@ class QuotaModelMixin(models.Model):
 
     Use such methods to change objects quotas:
       set_quota_limit, set_quota_usage, add_quota_usage.
+    Calls of add_quota_usage inside batch_quota_changes block are merged and applied at once.
 
-    Helper methods validate_quota_change and get_sum_of_quotas_as_dict provide common operations with objects quotas.
+    Helper methods validate_quota_change, get_quota_violations and get_sum_of_quotas_as_dict
+    provide common operations with objects quotas.
     Check methods docstrings for more details.
     """
 
@@ -149,12 +191,20 @@ class QuotaModelMixin(models.Model):
 
     @transaction.atomic
     def add_quota_usage(self, quota_name, usage_delta, validate=False):
+        batch = get_current_batch()
+        if batch is not None:
+            # Delta is applied on exit from batch_quota_changes block.
+            batch.add(self, quota_name, usage_delta, validate=validate)
+            return
         if usage_delta < 0:
             # Avoid race conditions by using F expressions.
             # See also: https://docs.djangoproject.com/en/dev/ref/models/expressions/#avoiding-race-conditions-using-f
             # Skip update if it would result in negative value.
-            return self.quotas.filter(name=quota_name, usage__gte=-usage_delta)\
+            updated = self.quotas.filter(name=quota_name, usage__gte=-usage_delta)\
                 .update(usage=F('usage') + usage_delta)
+            if updated:
+                QuotaSample.objects.record(self.quotas.filter(name=quota_name))
+            return updated
         quota = self.get_or_create_quota(quota_name)
         if validate and quota.is_exceeded(usage_delta):
             raise exceptions.QuotaValidationError(
@@ -177,11 +227,77 @@ class QuotaModelMixin(models.Model):
             return {a for a in self.get_ancestors() if isinstance(a, QuotaModelMixin)}
         return {}
 
-    def validate_quota_change(self, quota_deltas, raise_exception=False):
+    def get_ancestor_quota_deltas(self, quota_deltas):
+        """
+        Get deltas of ancestors usage aggregator quotas that correspond to object quotas deltas.
+
+        Dictionary format:
+        {
+            (ancestor, 'quota_name'): delta,
+            ...
+        }
+        """
+        result = defaultdict(lambda: 0)
+        quota_fields = {field.name: field for field in self.get_quotas_fields()}
+        ancestors = None
+        for name, delta in quota_deltas.items():
+            quota_field = quota_fields.get(str(name))
+            # usage aggregation should not count another usage aggregator field to avoid calls duplication.
+            if quota_field is None or isinstance(quota_field, fields.UsageAggregatorQuotaField):
+                continue
+            if ancestors is None:
+                ancestors = self.get_quota_ancestors()
+            for ancestor in ancestors:
+                for ancestor_field in ancestor.get_quotas_fields(field_class=fields.UsageAggregatorQuotaField):
+                    if ancestor_field.get_child_quota_name() == quota_field.name:
+                        result[ancestor, ancestor_field.name] += delta
+        return result
+
+    def get_quota_violations(self, quota_deltas, include_ancestors=True, lock=False):
+        """
+        Get quotas of object and its ancestors that will be exceeded if quota_deltas will be added.
+
+        Quotas of all scopes are fetched using single query. Ancestor quota is checked if it
+        has the same name as object quota or if it aggregates usage of object quota.
+        If lock is True, quotas are selected for update, so that check and following usage change
+        are atomic. In this case method should be called inside transaction.
+
+        quota_deltas - dictionary of quotas deltas, the same as for validate_quota_change.
+        Example of output:
+        {
+            <Project: project>: [QuotaViolation(scope=<Project: project>, name='ram', limit=1024, usage=512, delta=1024)],
+            ...
+        }
+        """
+        scope_deltas = defaultdict(dict)
+        scope_deltas[self] = {str(name): delta for name, delta in quota_deltas.items()}
+        if include_ancestors:
+            for ancestor in self.get_quota_ancestors():
+                scope_deltas[ancestor].update(scope_deltas[self])
+            for (ancestor, name), delta in self.get_ancestor_quota_deltas(quota_deltas).items():
+                scope_deltas[ancestor][name] = delta
+
+        scopes = {(ct_models.ContentType.objects.get_for_model(scope).id, scope.id): scope for scope in scope_deltas}
+        quota_names = set(name for deltas in scope_deltas.values() for name in deltas)
+        quotas = Quota.objects.filter_for_scopes(scopes.values(), quota_names).order_by('pk')
+        if lock:
+            quotas = quotas.select_for_update()
+
+        violations = defaultdict(list)
+        for quota in quotas:
+            scope = scopes[quota.content_type_id, quota.object_id]
+            delta = scope_deltas[scope].get(quota.name)
+            if delta is not None and quota.is_exceeded(delta):
+                violations[scope].append(QuotaViolation(scope, quota.name, quota.limit, quota.usage, delta))
+        return dict(violations)
+
+    def validate_quota_change(self, quota_deltas, raise_exception=False, include_ancestors=False, lock=False):
         """
         Get error messages about object and his ancestor quotas that will be exceeded if quota_delta will be added.
 
         raise_exception - if True QuotaExceededException will be raised if validation fails
+        include_ancestors - if True ancestors quotas are validated too, check get_quota_violations for details
+        lock - if True quotas are locked until the end of transaction, check get_quota_violations for details
         quota_deltas - dictionary of quotas deltas, example:
         {
             'ram': 1024,
@@ -192,12 +308,8 @@ class QuotaModelMixin(models.Model):
             ['ram quota limit: 1024, requires: 2048(instance#1)', ...]
 
         """
-        errors = []
-        for name, delta in quota_deltas.items():
-            quota = self.quotas.get(name=name)
-            if quota.is_exceeded(delta):
-                errors.append('%s quota limit: %s, requires %s (%s)\n' % (
-                    quota.name, quota.limit, quota.usage + delta, quota.scope))
+        violations = self.get_quota_violations(quota_deltas, include_ancestors=include_ancestors, lock=lock)
+        errors = [str(violation) for scope_violations in violations.values() for violation in scope_violations]
         if not raise_exception:
             return errors
         else:
@@ -347,10 +459,11 @@ class SharedQuotaMixin:
     def apply_quota_changes(self, validate=False, mult=1):
         scopes = self.get_quota_scopes()
         deltas = self.get_quota_deltas()
-        for name, delta in deltas.items():
-            for scope in scopes:
-                if scope:
-                    scope.add_quota_usage(name, delta * mult, validate=validate)
+        with batch_quota_changes():
+            for name, delta in deltas.items():
+                for scope in scopes:
+                    if scope:
+                        scope.add_quota_usage(name, delta * mult, validate=validate)
 
     def increase_backend_quotas_usage(self, validate=True):
         self.apply_quota_changes(validate=validate)
@@ -0,0 +1,84 @@
+from django.test import TransactionTestCase
+
+from waldur_core.quotas import exceptions
+from waldur_core.quotas.batch import batch_quota_changes
+
+from . import models as test_models
+
+
+class QuotaDeltaBatchTest(TransactionTestCase):
+
+    def setUp(self):
+        self.grandparent = test_models.GrandparentModel.objects.create()
+        self.parent = test_models.ParentModel.objects.create(parent=self.grandparent)
+        self.child = test_models.ChildModel.objects.create(parent=self.parent)
+        self.quota_name = test_models.ChildModel.Quotas.usage_aggregator_quota.name
+
+    def get_usage(self, scope, name):
+        return scope.quotas.get(name=name).usage
+
+    def test_deltas_are_not_applied_until_block_exit(self):
+        with batch_quota_changes():
+            self.child.add_quota_usage(self.quota_name, 5)
+            self.assertEqual(self.get_usage(self.child, self.quota_name), 0)
+
+        self.assertEqual(self.get_usage(self.child, self.quota_name), 5)
+
+    def test_deltas_of_the_same_quota_are_merged(self):
+        with batch_quota_changes():
+            self.child.add_quota_usage(self.quota_name, 5)
+            self.child.add_quota_usage(self.quota_name, 3)
+            self.child.add_quota_usage(self.quota_name, -1)
+
+        self.assertEqual(self.get_usage(self.child, self.quota_name), 7)
+
+    def test_aggregator_quotas_of_ancestors_are_updated(self):
+        with batch_quota_changes():
+            self.child.add_quota_usage(self.quota_name, 5)
+
+        self.assertEqual(self.get_usage(self.parent, 'usage_aggregator_quota'), 5)
+        self.assertEqual(self.get_usage(self.parent, 'second_usage_aggregator_quota'), 5)
+        self.assertEqual(self.get_usage(self.grandparent, 'usage_aggregator_quota'), 5)
+
+    def test_nested_blocks_are_merged(self):
+        with batch_quota_changes():
+            with batch_quota_changes():
+                self.child.add_quota_usage(self.quota_name, 5)
+            self.assertEqual(self.get_usage(self.child, self.quota_name), 0)
+
+        self.assertEqual(self.get_usage(self.child, self.quota_name), 5)
+
+    def test_negative_delta_is_skipped_if_usage_becomes_negative(self):
+        with batch_quota_changes():
+            self.child.add_quota_usage(self.quota_name, -5)
+
+        self.assertEqual(self.get_usage(self.child, self.quota_name), 0)
+        self.assertEqual(self.get_usage(self.parent, 'usage_aggregator_quota'), 0)
+
+    def test_validation_error_is_raised_and_no_delta_is_applied(self):
+        with self.assertRaises(exceptions.QuotaValidationError):
+            with batch_quota_changes():
+                self.child.add_quota_usage(self.quota_name, 5)
+                self.grandparent.add_quota_usage('quota_with_default_limit', 60, validate=True)
+                self.grandparent.add_quota_usage('quota_with_default_limit', 60, validate=True)
+
+        self.assertEqual(self.get_usage(self.child, self.quota_name), 0)
+        self.assertEqual(self.get_usage(self.grandparent, 'quota_with_default_limit'), 0)
+
+    def test_delta_within_limit_passes_validation(self):
+        with batch_quota_changes():
+            self.grandparent.add_quota_usage('quota_with_default_limit', 100, validate=True)
+
+        self.assertEqual(self.get_usage(self.grandparent, 'quota_with_default_limit'), 100)
+
+    def test_warning_is_logged_if_ancestor_quota_does_not_exist(self):
+        self.parent.quotas.filter(name='usage_aggregator_quota').delete()
+
+        with self.assertLogs('waldur_core.quotas.batch', level='WARNING') as logs:
+            with batch_quota_changes():
+                self.child.add_quota_usage(self.quota_name, 5)
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('usage_aggregator_quota', logs.output[0])
+        self.assertEqual(self.get_usage(self.parent, 'second_usage_aggregator_quota'), 5)
+        self.assertEqual(self.get_usage(self.grandparent, 'usage_aggregator_quota'), 5)
@@ -1,5 +1,7 @@
 from django.test import TestCase
+from reversion.models import Version
 
+from waldur_core.core.tests.helpers import override_waldur_core_settings
 from waldur_core.quotas import models
 from waldur_core.structure import models as structure_models
 from waldur_core.structure.tests import factories as structure_factories
@@ -23,3 +25,45 @@ class GlobalQuotasHandlersTestCase(TestCase):
 
         reread_quota = models.Quota.objects.get(pk=quota.pk)
         self.assertEqual(reread_quota.usage, quota.usage - 1)
+
+
+class QuotaSampleHandlerTest(TestCase):
+
+    def setUp(self):
+        self.customer = structure_factories.CustomerFactory()
+        self.quota = self.customer.quotas.get(name=structure_models.Customer.Quotas.nc_project_count.name)
+
+    def get_samples(self):
+        return models.QuotaSample.objects.filter(
+            content_type_id=self.quota.content_type_id, object_id=self.quota.object_id, name=self.quota.name)
+
+    def test_sample_is_stored_when_usage_is_changed(self):
+        self.customer.set_quota_usage(self.quota.name, 5)
+
+        sample = self.get_samples().latest('created')
+        self.assertEqual(sample.usage, 5)
+        self.assertEqual(sample.limit, self.quota.limit)
+
+    def test_sample_is_stored_when_usage_is_decreased(self):
+        self.customer.set_quota_usage(self.quota.name, 5)
+
+        self.customer.add_quota_usage(self.quota.name, -2)
+
+        self.assertEqual(self.get_samples().latest('id').usage, 3)
+
+    def test_sample_is_not_stored_when_quota_is_not_changed(self):
+        count = self.get_samples().count()
+
+        self.quota.save()
+
+        self.assertEqual(self.get_samples().count(), count)
+
+    @override_waldur_core_settings(QUOTA_REVERSION_ENABLED=False)
+    def test_version_is_not_created_if_reversion_is_disabled(self):
+        versions = Version.objects.get_for_object(self.quota)
+        count = versions.count()
+
+        self.customer.set_quota_limit(self.quota.name, 10)
+
+        self.assertEqual(versions.count(), count)
+        self.assertEqual(self.get_samples().latest('created').limit, 10)
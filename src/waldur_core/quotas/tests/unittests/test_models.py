@@ -1,8 +1,10 @@
 import random
 
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
 
-from ..models import GrandparentModel
+from ..models import ChildModel, GrandparentModel, ParentModel
 from ... import exceptions
 
 
@@ -79,3 +81,62 @@ class QuotaModelMixinTest(TestCase):
         sum_of_quotas = GrandparentModel.get_sum_of_quotas_as_dict(
             instances, quota_names=['regular_quota'], fields=['limit'])
         self.assertEqual({'regular_quota': -1}, sum_of_quotas)
+
+
+class QuotaViolationsTest(TestCase):
+
+    def setUp(self):
+        self.grandparent = GrandparentModel.objects.create()
+        self.parent = ParentModel.objects.create(parent=self.grandparent)
+        self.child = ChildModel.objects.create(parent=self.parent)
+
+    def test_violations_are_empty_if_quotas_are_unlimited(self):
+        violations = self.child.get_quota_violations({'usage_aggregator_quota': 10})
+        self.assertEqual(violations, {})
+
+    def test_ancestor_aggregator_quota_violation_is_returned(self):
+        self.grandparent.set_quota_limit('usage_aggregator_quota', 5)
+
+        violations = self.child.get_quota_violations({'usage_aggregator_quota': 10})
+
+        self.assertEqual(list(violations.keys()), [self.grandparent])
+        violation = violations[self.grandparent][0]
+        self.assertEqual(violation.name, 'usage_aggregator_quota')
+        self.assertEqual(violation.limit, 5)
+        self.assertEqual(violation.delta, 10)
+
+    def test_violations_of_several_scopes_are_returned(self):
+        self.child.set_quota_limit('usage_aggregator_quota', 5)
+        self.parent.set_quota_limit('second_usage_aggregator_quota', 5)
+
+        violations = self.child.get_quota_violations({'usage_aggregator_quota': 10})
+
+        self.assertEqual(set(violations.keys()), {self.child, self.parent})
+        self.assertEqual([v.name for v in violations[self.parent]], ['second_usage_aggregator_quota'])
+
+    def test_ancestors_are_skipped_if_they_are_not_included(self):
+        self.grandparent.set_quota_limit('usage_aggregator_quota', 5)
+
+        violations = self.child.get_quota_violations({'usage_aggregator_quota': 10}, include_ancestors=False)
+
+        self.assertEqual(violations, {})
+
+    def test_quotas_are_fetched_using_single_query(self):
+        # parents are already cached by model instances
+        with self.assertNumQueries(1):
+            self.child.get_quota_violations({'usage_aggregator_quota': 10, 'regular_quota': 1})
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_quotas_are_selected_for_update_if_lock_is_requested(self):
+        with CaptureQueriesContext(connection) as context:
+            self.child.get_quota_violations({'usage_aggregator_quota': 10}, lock=True)
+
+        self.assertIn('FOR UPDATE', context.captured_queries[-1]['sql'])
+
+    def test_validate_quota_change_returns_error_messages(self):
+        self.child.set_quota_limit('regular_quota', 5)
+
+        errors = self.child.validate_quota_change({'regular_quota': 10})
+
+        self.assertEqual(len(errors), 1)
+        self.assertIn('regular_quota quota limit: 5', errors[0])
@@ -71,6 +71,7 @@ MIDDLEWARE = (
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'waldur_core.logging.middleware.CaptureEventContextMiddleware',
+    'waldur_core.structure.middleware.PermissionSnapshotMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'defender.middleware.FailedLoginMiddleware',
@@ -233,6 +234,11 @@ CELERY_BEAT_SCHEDULE = {
         'schedule': timedelta(hours=24),
         'args': (),
     },
+    'reconcile-counter-quotas': {
+        'task': 'waldur_core.structure.reconcile_counter_quotas',
+        'schedule': timedelta(hours=6),
+        'args': (),
+    },
     'recalculate-price-estimates': {
         'task': 'waldur_core.cost_tracking.recalculate_estimate',
         # To avoid bugs and unexpected behavior - do not re-calculate estimates
@@ -250,6 +256,16 @@ CELERY_BEAT_SCHEDULE = {
         'schedule': timedelta(hours=1),
         'args': (),
     },
+    'flush-buffered-events': {
+        'task': 'waldur_core.logging.flush_events',
+        'schedule': timedelta(seconds=30),
+        'args': (),
+    },
+    'cleanup-expired-events': {
+        'task': 'waldur_core.logging.cleanup_events',
+        'schedule': timedelta(days=1),
+        'args': (),
+    },
 }
 
 # Logging
@@ -301,7 +317,36 @@ WALDUR_CORE = {
     'NOTIFICATION_SUBJECT': 'Notifications from Waldur',
     'LOGGING_REPORT_DIRECTORY': '/var/log/waldur',
     'LOGGING_REPORT_INTERVAL': timedelta(days=7),
+    # Event sink: sync, memory or redis. Check waldur_core.logging.sinks for details.
+    'EVENTS_SINK': 'sync',
+    'EVENTS_BATCH_SIZE': 100,
+    'EVENTS_FLUSH_INTERVAL': timedelta(seconds=30),
+    # Events older than retention period are deleted. If archive directory is set,
+    # they are stored there before deletion as gzipped JSON lines files, one file per month.
+    'EVENTS_RETENTION_PERIOD': None,
+    'EVENTS_ARCHIVE_DIRECTORY': None,
+    # If query planner estimates more events than threshold, estimate is returned by count endpoint.
+    'EVENTS_COUNT_ESTIMATE_THRESHOLD': 10000,
+    # Background task is not scheduled while lease of equal task is held. Lease expires if task is lost.
+    'BACKGROUND_TASK_LEASE_TIMEOUT': timedelta(hours=1),
+    # Maximum number of concurrent pulls of service settings of the same type.
+    'SERVICE_PULL_CONCURRENCY': 5,
+    # Pull of service settings is interrupted if it takes longer than timeout.
+    'SERVICE_PULL_TIMEOUT': timedelta(minutes=30),
+    # Pulls of service settings are randomly spread over jitter interval.
+    'SERVICE_PULL_JITTER': timedelta(minutes=5),
+    # Roles of user are cached and invalidated when they are changed. Timeout is a safety net.
+    'PERMISSIONS_CACHE_TIMEOUT': timedelta(minutes=10),
+    # Quotas history is stored as quota samples. Reversion of quotas is kept for deprecated quota history endpoint.
+    'QUOTA_REVERSION_ENABLED': True,
     'HTTP_CHUNK_SIZE': 50,
+    # Mail is sent in batches of given size, each batch reuses single SMTP connection.
+    # Larger recipient lists are sent by background tasks limited by rate.
+    'EMAIL_CHUNK_SIZE': 50,
+    'EMAIL_RATE_LIMIT': '60/m',
+    # Failed messages are retried with exponential backoff, then stored in failed mail store.
+    'EMAIL_MAX_RETRIES': 5,
+    'EMAIL_RETRY_DELAY': timedelta(minutes=1),
     'ONLY_STAFF_CAN_INVITE_USERS': False,
     'INVITATION_APPROVE_URL': 'https://example.com/#/invitation_approve/{token}/',
     'INVITATION_REJECT_URL': 'https://example.com/#/invitation_reject/{token}/',
@@ -57,3 +57,9 @@ def bind_event_context(sender=None, **kwargs):
 @signals.task_postrun.connect
 def unbind_event_context(sender=None, **kwargs):
     reset_event_context()
+
+
+@signals.task_postrun.connect
+def flush_thread_events(sender=None, **kwargs):
+    from waldur_core.logging.sinks import flush_thread_events
+    flush_thread_events()
@@ -104,6 +104,25 @@ class StructureConfig(AppConfig):
             dispatch_uid='waldur_core.structure.handlers.log_project_role_updated',
         )
 
+        for model in (CustomerPermission, ProjectPermission):
+            for signal_name, signal in (('save', signals.post_save), ('delete', signals.post_delete)):
+                signal.connect(
+                    handlers.invalidate_permission_snapshot_on_permission_change,
+                    sender=model,
+                    dispatch_uid='waldur_core.structure.handlers.'
+                                 'invalidate_permission_snapshot_on_%s_%s' % (model.__name__, signal_name),
+                )
+
+        for model in structure_models_with_roles:
+            for signal_name, signal in (('granted', structure_signals.structure_role_granted),
+                                        ('revoked', structure_signals.structure_role_revoked)):
+                signal.connect(
+                    handlers.invalidate_permission_snapshot_on_role_change,
+                    sender=model,
+                    dispatch_uid='waldur_core.structure.handlers.'
+                                 'invalidate_permission_snapshot_on_%s_role_%s' % (model.__name__, signal_name),
+                )
+
         signals.pre_delete.connect(
             handlers.revoke_roles_on_project_deletion,
             sender=Project,
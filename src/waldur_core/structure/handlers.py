@@ -8,7 +8,7 @@ from django.utils import timezone
 
 from waldur_core.core.models import StateMixin
 from waldur_core.core import utils as core_utils
-from waldur_core.structure import SupportedServices, signals
+from waldur_core.structure import SupportedServices, signals, snapshots
 from waldur_core.structure.log import event_logger
 from waldur_core.structure.models import (Customer, CustomerPermission, Project, ProjectPermission,
                                           Service, ServiceSettings, CustomerRole)
@@ -27,6 +27,20 @@ def revoke_roles_on_project_deletion(sender, instance=None, **kwargs):
     instance.remove_all_users()
 
 
+def _invalidate_permission_snapshot(user_id):
+    snapshots.invalidate_permission_snapshot(user_id)
+    # Snapshot could be loaded by concurrent request before transaction is committed.
+    transaction.on_commit(lambda: snapshots.invalidate_permission_snapshot(user_id))
+
+
+def invalidate_permission_snapshot_on_permission_change(sender, instance, **kwargs):
+    _invalidate_permission_snapshot(instance.user_id)
+
+
+def invalidate_permission_snapshot_on_role_change(sender, structure, user, **kwargs):
+    _invalidate_permission_snapshot(user.pk)
+
+
 def log_customer_save(sender, instance, created=False, **kwargs):
     if created:
         event_logger.customer.info(
@@ -1,26 +1,25 @@
+from django.core.exceptions import FieldDoesNotExist
 from django.db import models
 
 from waldur_core.core.managers import GenericKeyMixin, SummaryQuerySet
 
 
 def get_permission_subquery(permissions, user):
+    """
+    Build filter by IDs of customers and projects where user has role.
+    IDs are taken from permission snapshot, so permissions tables are not joined.
+    """
+    from waldur_core.structure.snapshots import get_permission_snapshot
+
+    snapshot = get_permission_snapshot(user)
     subquery = models.Q()
     for entity in ('customer', 'project'):
         path = getattr(permissions, '%s_path' % entity, None)
         if not path:
             continue
 
-        if path == 'self':
-            prefix = 'permissions__'
-        else:
-            prefix = path + '__permissions__'
-
-        kwargs = {
-            prefix + 'user': user,
-            prefix + 'is_active': True
-        }
-
-        subquery |= models.Q(**kwargs)
+        lookup = 'pk__in' if path == 'self' else path + '__in'
+        subquery |= models.Q(**{lookup: snapshot.get_ids(entity)})
 
     # Add extra query which basically allows to
     # additionally filter by some flag and ignore permissions
@@ -31,6 +30,22 @@ def get_permission_subquery(permissions, user):
     return subquery
 
 
+def is_multivalued_path(model, path):
+    """ Check whether lookup path spans to-many relation and therefore may yield duplicate rows. """
+    for name in path.split('__'):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Path could not be resolved for abstract model, so let's be conservative.
+            return True
+        if field.many_to_many or field.one_to_many:
+            return True
+        if not field.is_relation:
+            return False
+        model = field.related_model
+    return False
+
+
 def filter_queryset_for_user(queryset, user):
     if user is None or user.is_staff or user.is_support:
         return queryset
@@ -44,7 +59,12 @@ def filter_queryset_for_user(queryset, user):
     if not subquery:
         return queryset
 
-    return queryset.filter(subquery).distinct()
+    paths = [getattr(permissions, '%s_path' % entity, None) for entity in ('customer', 'project')]
+    paths.extend(getattr(permissions, 'extra_query', None) or {})
+    queryset = queryset.filter(subquery)
+    if any(is_multivalued_path(queryset.model, path) for path in paths if path and path != 'self'):
+        queryset = queryset.distinct()
+    return queryset
 
 
 class StructureQueryset(models.QuerySet):
@@ -0,0 +1,14 @@
+from django.utils.deprecation import MiddlewareMixin
+
+from waldur_core.structure import snapshots
+
+
+class PermissionSnapshotMiddleware(MiddlewareMixin):
+    """ Keep roles of users loaded during request processing in memory until response is returned. """
+
+    def process_request(self, request):
+        snapshots.start_request()
+
+    def process_response(self, request, response):
+        snapshots.finish_request()
+        return response
@@ -37,6 +37,7 @@ from waldur_core.media.models import ImageModelMixin
 from waldur_core.structure.managers import StructureManager, filter_queryset_for_user, \
     ServiceSettingsManager, PrivateServiceSettingsManager, SharedServiceSettingsManager
 from waldur_core.structure.signals import structure_role_granted, structure_role_revoked
+from waldur_core.structure.snapshots import get_permission_snapshot
 from waldur_core.structure.utils import sort_dependencies
 from waldur_geo_ip.utils import get_coordinates_by_ip
 from waldur_geo_ip.mixins import IPCoordinatesMixin, CoordinatesMixin
@@ -191,18 +192,13 @@ class PermissionMixin:
             - False - check whether user has role in entity at the moment.
             - None - check whether user has permanent role in entity.
             - Datetime object - check whether user will have role in entity at specific timestamp.
-        """
-        permissions = self.permissions.filter(user=user, is_active=True)
-
-        if role is not None:
-            permissions = permissions.filter(role=role)
-
-        if timestamp is None:
-            permissions = permissions.filter(expiration_time=None)
-        elif timestamp:
-            permissions = permissions.filter(Q(expiration_time=None) | Q(expiration_time__gte=timestamp))
 
-        return permissions.exists()
+        Roles are looked up in permission snapshot of user, which is cached and invalidated on role change.
+        """
+        if user is None or not user.pk:
+            return False
+        snapshot = get_permission_snapshot(user)
+        return snapshot.has_role(self._meta.model_name, self.pk, role, timestamp)
 
     @transaction.atomic()
     def add_user(self, user, role, created_by=None, expiration_time=None):
@@ -0,0 +1,90 @@
+""" Snapshot of customer and project roles of user used for permission checks """
+
+from collections import defaultdict
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+_locals = threading.local()
+
+CACHE_KEY = 'waldur_core.structure.permissions.%s'
+
+
+class PermissionSnapshot:
+    """
+    Active roles of user in customers and projects.
+    Each entity maps object ID to list of (role, expiration_time) pairs.
+    """
+
+    def __init__(self, customer=None, project=None):
+        self.roles = {
+            'customer': customer or {},
+            'project': project or {},
+        }
+
+    @classmethod
+    def load(cls, user):
+        from waldur_core.structure.models import CustomerPermission, ProjectPermission
+
+        roles = {}
+        for entity, model in (('customer', CustomerPermission), ('project', ProjectPermission)):
+            roles[entity] = defaultdict(list)
+            permissions = model.objects.filter(user=user, is_active=True)
+            for object_id, role, expiration_time in permissions.values_list(
+                    '%s_id' % entity, 'role', 'expiration_time'):
+                roles[entity][object_id].append((role, expiration_time))
+            roles[entity] = dict(roles[entity])
+        return cls(**roles)
+
+    def get_ids(self, entity):
+        return set(self.roles[entity].keys())
+
+    def has_role(self, entity, object_id, role=None, timestamp=False):
+        """ Memory counterpart of PermissionMixin.has_user query. """
+        for permission_role, expiration_time in self.roles[entity].get(object_id, []):
+            if role is not None and permission_role != role:
+                continue
+            if timestamp is None and expiration_time is not None:
+                continue
+            if timestamp and expiration_time is not None and expiration_time < timestamp:
+                continue
+            return True
+        return False
+
+
+def start_request():
+    _locals.snapshots = {}
+
+
+def finish_request():
+    if hasattr(_locals, 'snapshots'):
+        del _locals.snapshots
+
+
+def get_permission_snapshot(user):
+    """
+    Get roles of user. Snapshot is loaded from cache once per request
+    and it is fetched from database only if cache has been invalidated.
+    """
+    snapshots = getattr(_locals, 'snapshots', None)
+    if snapshots is not None and user.pk in snapshots:
+        return snapshots[user.pk]
+
+    key = CACHE_KEY % user.pk
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = PermissionSnapshot.load(user)
+        timeout = settings.WALDUR_CORE['PERMISSIONS_CACHE_TIMEOUT'].total_seconds()
+        cache.set(key, snapshot, timeout)
+
+    if snapshots is not None:
+        snapshots[user.pk] = snapshot
+    return snapshot
+
+
+def invalidate_permission_snapshot(user_id):
+    cache.delete(CACHE_KEY % user_id)
+    snapshots = getattr(_locals, 'snapshots', None)
+    if snapshots is not None:
+        snapshots.pop(user_id, None)
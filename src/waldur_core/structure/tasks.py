@@ -1,9 +1,15 @@
+from collections import defaultdict
 import functools
 import logging
+import random
+import time
 from datetime import timedelta
 
 from celery import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.db import transaction
 from django.db.utils import DatabaseError
 from django.utils import timezone
@@ -35,6 +41,41 @@ def check_expired_permissions():
             permission.revoke()
 
 
+@shared_task(name='waldur_core.structure.reconcile_counter_quotas')
+def reconcile_counter_quotas():
+    """
+    Counters of customers and projects are maintained incrementally by signal handlers.
+    Periodically fix their drift using grouped queries, only changed quotas are saved.
+    """
+    from waldur_core.quotas import fields as quotas_fields, models as quotas_models
+
+    def reconcile(model, quota_name, usages):
+        content_type = ContentType.objects.get_for_model(model)
+        for quota in quotas_models.Quota.objects.filter(content_type=content_type, name=quota_name):
+            usage = usages.get(quota.object_id, 0)
+            if quota.usage != usage:
+                logger.info('Usage of quota %s of %s %s is reconciled from %s to %s.',
+                            quota_name, model.__name__, quota.object_id, quota.usage, usage)
+                quota.usage = usage
+                quota.save(update_fields=['usage'])
+
+    for model in (models.Customer, models.Project):
+        for field in model.get_quotas_fields(field_class=quotas_fields.CounterQuotaField):
+            usages = field.get_current_usage_by_scope(field.target_models)
+            if usages is not None:
+                reconcile(model, field.name, usages)
+
+    customer_users = defaultdict(set)
+    for customer_id, user_id in models.CustomerPermission.objects.filter(
+            is_active=True).values_list('customer_id', 'user_id'):
+        customer_users[customer_id].add(user_id)
+    for customer_id, user_id in models.ProjectPermission.objects.filter(
+            is_active=True).values_list('project__customer_id', 'user_id'):
+        customer_users[customer_id].add(user_id)
+    reconcile(models.Customer, 'nc_user_count',
+              {customer_id: len(users) for customer_id, users in customer_users.items()})
+
+
 def connect_shared_settings(service_settings):
     logger.debug('About to connect service settings "%s" to all available customers' % service_settings.name)
     if not service_settings.shared:
@@ -80,15 +121,18 @@ class BackgroundPullTask(core_tasks.BackgroundTask):
 
     def run(self, serialized_instance):
         instance = core_utils.deserialize_instance(serialized_instance)
+        self.pull_instance(instance)
+
+    def pull_instance(self, instance):
+        """ Pull instance and handle backend error. Return True if pull succeed. """
         try:
             self.pull(instance)
         except ServiceBackendError as e:
             self.on_pull_fail(instance, e)
+            return False
         else:
             self.on_pull_success(instance)
-
-    def is_equal(self, other_task, serialized_instance):
-        return self.name == other_task.get('name') and serialized_instance in other_task.get('args', [])
+            return True
 
     def pull(self, instance):
         """ Pull instance from backend.
@@ -131,9 +175,6 @@ class BackgroundListPullTask(core_tasks.BackgroundTask):
     model = NotImplemented
     pull_task = NotImplemented
 
-    def is_equal(self, other_task):
-        return self.name == other_task.get('name')
-
     def get_pulled_objects(self):
         States = self.model.States
         return self.model.objects.filter(state__in=[States.ERRED, States.OK]).exclude(backend_id='')
@@ -144,22 +185,116 @@ class BackgroundListPullTask(core_tasks.BackgroundTask):
             self.pull_task().apply_async(args=(serialized,), kwargs={})
 
 
+PULL_METRICS_KEY = 'waldur_core.structure.pull_metrics.%s.%s'
+PULL_METRICS_TIMEOUT = 60 * 60 * 24
+PULL_SLOT_KEY = 'waldur_core.structure.pull_slot.%s.%s'
+
+
+def get_pull_metrics(task_name, service_settings):
+    """ Return duration, result and finish time of the latest pull of service settings. """
+    return cache.get(PULL_METRICS_KEY % (task_name, service_settings.uuid.hex))
+
+
 class ServiceListPullTask(BackgroundListPullTask):
+    """ Schedules pull task for each service settings.
+
+        Pulls are spread over jitter interval, limited by timeout and prioritized,
+        so that healthy settings are not delayed by erred or failing ones.
+    """
     model = models.ServiceSettings
 
+    HIGH_PRIORITY = 0
+    NORMAL_PRIORITY = 3
+    LOW_PRIORITY = 9
+
     def get_pulled_objects(self):
         States = self.model.States
         return self.model.objects.filter(state__in=[States.ERRED, States.OK])
 
+    def get_priority(self, service_settings):
+        if service_settings.state == self.model.States.ERRED:
+            return self.LOW_PRIORITY
+        metrics = get_pull_metrics(self.pull_task.name, service_settings)
+        if metrics and not metrics['success']:
+            return self.NORMAL_PRIORITY
+        return self.HIGH_PRIORITY
 
-class ServicePropertiesPullTask(BackgroundPullTask):
+    def run(self):
+        jitter = settings.WALDUR_CORE['SERVICE_PULL_JITTER'].total_seconds()
+        timeout = settings.WALDUR_CORE['SERVICE_PULL_TIMEOUT'].total_seconds()
+        for service_settings in self.get_pulled_objects():
+            serialized = core_utils.serialize_instance(service_settings)
+            self.pull_task().apply_async(
+                args=(serialized,),
+                kwargs={},
+                countdown=random.uniform(0, jitter),
+                soft_time_limit=timeout,
+                time_limit=timeout + 60,
+                priority=self.get_priority(service_settings),
+            )
+
+
+class ServicePullTask(BackgroundPullTask):
+    """ Pull service settings from backend.
+
+        Number of concurrent pulls is bounded per service type. If all slots are busy,
+        task is retried later. Duration and result of each pull are stored as metrics.
+    """
+    slot_retry_delay = 30
+
+    def get_slot_keys(self, service_settings):
+        concurrency = settings.WALDUR_CORE['SERVICE_PULL_CONCURRENCY']
+        return [PULL_SLOT_KEY % (service_settings.type, index) for index in range(concurrency)]
+
+    def acquire_slot(self, service_settings):
+        """ Return key of acquired slot or None if all slots are busy. """
+        timeout = settings.WALDUR_CORE['SERVICE_PULL_TIMEOUT'].total_seconds() + 60
+        task_id = self.request.id or 'local'
+        for key in self.get_slot_keys(service_settings):
+            if cache.add(key, task_id, timeout):
+                return key
+
+    def release_slot(self, key):
+        cache.delete(key)
+
+    def run(self, serialized_instance):
+        service_settings = core_utils.deserialize_instance(serialized_instance)
+        slot = self.acquire_slot(service_settings)
+        if slot is None:
+            logger.debug('All pull slots for service type %s are busy, pull of %s is delayed.',
+                         service_settings.type, service_settings.name)
+            raise self.retry(countdown=random.uniform(1, self.slot_retry_delay), max_retries=None)
+
+        started = time.monotonic()
+        success = False
+        try:
+            success = self.pull_instance(service_settings)
+        except SoftTimeLimitExceeded:
+            logger.warning('Pull of service settings %s (type: %s) has timed out.',
+                           service_settings.name, service_settings.type)
+        finally:
+            self.release_slot(slot)
+            self.record_metrics(service_settings, time.monotonic() - started, success)
+
+    def record_metrics(self, service_settings, duration, success):
+        metrics = {
+            'duration': duration,
+            'success': success,
+            'finished': timezone.now(),
+        }
+        cache.set(PULL_METRICS_KEY % (self.name, service_settings.uuid.hex), metrics, PULL_METRICS_TIMEOUT)
+        logger.info('Pull task %s for service settings %s (type: %s) finished in %.2f seconds, success: %s.',
+                    self.name, service_settings.name, service_settings.type, duration, success)
+
+
+class ServicePropertiesPullTask(ServicePullTask):
 
     def pull(self, service_settings):
         backend = service_settings.get_backend()
         backend.pull_service_properties()
 
 
-class ServiceResourcesPullTask(BackgroundPullTask):
+class ServiceResourcesPullTask(ServicePullTask):
 
     @reraise_exceptions
     def pull(self, service_settings):
@@ -167,7 +302,7 @@ class ServiceResourcesPullTask(BackgroundPullTask):
         backend.pull_resources()
 
 
-class ServiceSubResourcesPullTask(BackgroundPullTask):
+class ServiceSubResourcesPullTask(ServicePullTask):
 
     def pull(self, service_settings):
         backend = service_settings.get_backend()
@@ -239,9 +374,6 @@ class SetErredStuckResources(core_tasks.BackgroundTask):
     """
     name = 'waldur_core.structure.SetErredStuckResources'
 
-    def is_equal(self, other_task):
-        return self.name == other_task.get('name')
-
     def run(self):
         cutoff = timezone.now() - timedelta(hours=3)
         states = (structure_models.NewResource.States.CREATING,
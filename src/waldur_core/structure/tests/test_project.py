@@ -462,6 +462,20 @@ class ProjectCountersListTest(test.APITransactionTestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, {'test': 100})
 
+    def test_counters_which_are_not_requested_are_not_computed(self):
+        counter = mock.Mock(return_value=100)
+        views.ProjectCountersView.register_counter('test', counter)
+        self.client.force_authenticate(self.fixture.owner)
+        response = self.client.get(self.url, {'fields': ['vms']})
+        self.assertEqual(response.data, {'vms': 1})
+        self.assertFalse(counter.called)
+
+    def test_counters_are_read_from_quotas(self):
+        self.project.set_quota_usage('nc_vm_count', 10)
+        self.client.force_authenticate(self.fixture.owner)
+        response = self.client.get(self.url, {'fields': ['vms']})
+        self.assertEqual(response.data, {'vms': 10})
+
 
 @ddt
 class ProjectCertificationUpdateTest(test.APITransactionTestCase):
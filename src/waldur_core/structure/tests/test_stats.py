@@ -5,6 +5,7 @@ from django.utils import timezone
 from rest_framework import test, status
 
 from waldur_core.core import utils as core_utils
+from waldur_core.quotas.models import QuotaSample
 from waldur_core.structure import models
 from waldur_core.structure.tests import factories
 
@@ -112,6 +113,17 @@ class StatsQuotaTimelineTest(BaseQuotaAggregationTest):
         self.assertEqual(110, response.data[0]['vcpu_limit'])
         self.assertEqual(12, response.data[0]['vcpu_usage'])
 
+    def test_latest_sample_before_range_end_is_used(self):
+        self.create_links(limit1=10, usage1=2, limit2=100, usage2=10)
+        QuotaSample.objects.update(created=timezone.now() - timedelta(hours=2))
+        link = factories.TestServiceProjectLinkFactory(project=self.project)
+        link.set_quota_usage('vcpu', 5)
+        QuotaSample.objects.filter(object_id=link.id, usage=5).update(created=timezone.now() + timedelta(hours=1))
+
+        response = self.get_response()
+
+        self.assertEqual(12, response.data[0]['vcpu_usage'])
+
     def get_response(self):
         response = self.client.get(reverse('stats_quota_timeline'), data={
             'aggregate': 'project',
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from waldur_core.structure import models, snapshots
+from waldur_core.structure.managers import filter_queryset_for_user
+from waldur_core.structure.tests import factories, fixtures
+
+
+class PermissionSnapshotTest(TestCase):
+    def setUp(self):
+        self.fixture = fixtures.ProjectFixture()
+        self.customer = self.fixture.customer
+        self.project = self.fixture.project
+        self.user = factories.UserFactory()
+
+    def test_role_is_visible_after_it_is_granted(self):
+        self.assertFalse(self.project.has_user(self.user))
+        self.project.add_user(self.user, models.ProjectRole.ADMINISTRATOR)
+        self.assertTrue(self.project.has_user(self.user, models.ProjectRole.ADMINISTRATOR))
+        self.assertFalse(self.project.has_user(self.user, models.ProjectRole.MANAGER))
+
+    def test_role_is_not_visible_after_it_is_revoked(self):
+        self.customer.add_user(self.user, models.CustomerRole.OWNER)
+        self.assertTrue(self.customer.has_user(self.user))
+        self.customer.remove_user(self.user)
+        self.assertFalse(self.customer.has_user(self.user))
+
+    def test_permanent_role_is_checked_by_expiration_time(self):
+        expiration_time = timezone.now() + timedelta(days=1)
+        self.customer.add_user(self.user, models.CustomerRole.OWNER, expiration_time=expiration_time)
+        self.assertTrue(self.customer.has_user(self.user, timestamp=expiration_time))
+        self.assertFalse(self.customer.has_user(self.user, timestamp=None))
+        self.assertFalse(self.customer.has_user(self.user, timestamp=expiration_time + timedelta(days=1)))
+
+    def test_snapshot_is_loaded_once_per_request(self):
+        snapshots.start_request()
+        try:
+            snapshots.get_permission_snapshot(self.user)
+            with self.assertNumQueries(0):
+                self.project.has_user(self.user)
+                self.customer.has_user(self.user)
+        finally:
+            snapshots.finish_request()
+
+    def test_queryset_is_filtered_by_roles_without_duplicates(self):
+        self.customer.add_user(self.user, models.CustomerRole.OWNER)
+        self.project.add_user(self.user, models.ProjectRole.ADMINISTRATOR)
+        factories.ProjectFactory(customer=self.customer)
+        factories.CustomerFactory()
+
+        customers = filter_queryset_for_user(models.Customer.objects.all(), self.user)
+        projects = filter_queryset_for_user(models.Project.objects.all(), self.user)
+
+        self.assertEqual(list(customers), [self.customer])
+        self.assertEqual(set(projects), set(self.customer.projects.all()))
@@ -1,14 +1,17 @@
 from datetime import timedelta
 from unittest import mock
 
+from celery.exceptions import Retry
 from ddt import ddt, data
+from django.core.cache import cache
 from django.test import TestCase
 from django.utils import timezone
 from freezegun import freeze_time
 
 from waldur_core.core import utils
-from waldur_core.structure import tasks
-from waldur_core.structure.tests import factories, models
+from waldur_core.core.tests.helpers import override_waldur_core_settings
+from waldur_core.structure import tasks, ServiceBackendError, models as structure_models
+from waldur_core.structure.tests import factories, fixtures, models
 
 
 @ddt
@@ -86,3 +89,84 @@ class ExceptionTest(TestCase):
             error_message,
             task.pull,
             service_settings)
+
+
+class ServicePullTaskTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.service_settings = factories.ServiceSettingsFactory()
+        self.backend = mock.Mock()
+        self.service_settings.get_backend = lambda: self.backend
+        self.task = tasks.ServicePropertiesPullTask()
+
+    def pull(self):
+        with mock.patch('waldur_core.core.utils.deserialize_instance', return_value=self.service_settings):
+            self.task.run(utils.serialize_instance(self.service_settings))
+
+    def test_metrics_are_recorded_after_successful_pull(self):
+        self.pull()
+        metrics = tasks.get_pull_metrics(self.task.name, self.service_settings)
+        self.assertTrue(metrics['success'])
+        self.assertGreaterEqual(metrics['duration'], 0)
+
+    def test_metrics_are_recorded_after_failed_pull(self):
+        self.backend.pull_service_properties.side_effect = ServiceBackendError('error')
+        self.pull()
+        metrics = tasks.get_pull_metrics(self.task.name, self.service_settings)
+        self.assertFalse(metrics['success'])
+
+    def test_slot_is_released_after_pull(self):
+        self.pull()
+        self.assertIsNotNone(self.task.acquire_slot(self.service_settings))
+
+    @override_waldur_core_settings(SERVICE_PULL_CONCURRENCY=1)
+    def test_pull_is_retried_if_all_slots_are_busy(self):
+        self.task.acquire_slot(self.service_settings)
+        with mock.patch.object(self.task, 'retry', side_effect=Retry()) as retry_mock:
+            with self.assertRaises(Retry):
+                self.pull()
+        self.assertTrue(retry_mock.called)
+        self.assertFalse(self.backend.pull_service_properties.called)
+
+
+@mock.patch('waldur_core.structure.tasks.ServicePropertiesPullTask.apply_async')
+class ServiceListPullTaskTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ok_settings = factories.ServiceSettingsFactory(state=structure_models.ServiceSettings.States.OK)
+        self.erred_settings = factories.ServiceSettingsFactory(state=structure_models.ServiceSettings.States.ERRED)
+
+    def get_options(self, apply_async_mock):
+        return {call[1]['args'][0]: call[1] for call in apply_async_mock.call_args_list}
+
+    @override_waldur_core_settings(SERVICE_PULL_TIMEOUT=timedelta(minutes=10))
+    def test_pull_is_limited_by_timeout(self, apply_async_mock):
+        tasks.ServicePropertiesListPullTask().run()
+        options = self.get_options(apply_async_mock)[utils.serialize_instance(self.ok_settings)]
+        self.assertEqual(options['soft_time_limit'], 600)
+
+    def test_erred_settings_have_lower_priority(self, apply_async_mock):
+        tasks.ServicePropertiesListPullTask().run()
+        options = self.get_options(apply_async_mock)
+        ok_priority = options[utils.serialize_instance(self.ok_settings)]['priority']
+        erred_priority = options[utils.serialize_instance(self.erred_settings)]['priority']
+        self.assertLess(ok_priority, erred_priority)
+
+
+class ReconcileCounterQuotasTest(TestCase):
+    def setUp(self):
+        self.fixture = fixtures.ServiceFixture()
+        self.project = self.fixture.project
+        self.customer = self.fixture.customer
+        self.resource = self.fixture.resource
+
+    def test_drifted_counters_are_fixed(self):
+        self.project.set_quota_usage('nc_vm_count', 10)
+        self.customer.set_quota_usage('nc_project_count', 0)
+        self.customer.set_quota_usage('nc_user_count', 0)
+
+        tasks.reconcile_counter_quotas()
+
+        self.assertEqual(self.project.quotas.get(name='nc_vm_count').usage, 1)
+        self.assertEqual(self.customer.quotas.get(name='nc_project_count').usage, 1)
+        self.assertEqual(self.customer.quotas.get(name='nc_user_count').usage, self.customer.get_users().count())
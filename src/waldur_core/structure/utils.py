@@ -1,7 +1,9 @@
 import collections
 import logging
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import signals
+from django.utils import timezone
 from django.utils.lru_cache import lru_cache
 from django.utils.topological_sort import stable_topological_sort
 from django.utils.translation import ugettext_lazy as _
@@ -75,12 +77,12 @@ def get_all_services_field_info():
                      extra_fields_default=services_fields_default_value)
 
 
-def update_pulled_fields(instance, imported_instance, fields):
+def set_pulled_fields(instance, imported_instance, fields):
     """
-    Update instance fields based on imported from backend data.
-    Save changes to DB only one or more fields were changed.
+    Update instance fields based on imported from backend data without saving them.
+    Return list of modified fields.
     """
-    modified = False
+    modified_fields = []
     for field in fields:
         pulled_value = getattr(imported_instance, field)
         current_value = getattr(instance, field)
@@ -88,19 +90,29 @@ def update_pulled_fields(instance, imported_instance, fields):
             setattr(instance, field, pulled_value)
             logger.info("%s's with PK %s %s field updated from value '%s' to value '%s'",
                         instance.__class__.__name__, instance.pk, field, current_value, pulled_value)
-            modified = True
+            modified_fields.append(field)
     error_message = getattr(imported_instance, 'error_message', '') or getattr(instance, 'error_message', '')
     if error_message and instance.error_message != error_message:
         instance.error_message = imported_instance.error_message
-        modified = True
-    if modified:
+        modified_fields.append('error_message')
+    return modified_fields
+
+
+def update_pulled_fields(instance, imported_instance, fields):
+    """
+    Update instance fields based on imported from backend data.
+    Save changes to DB only one or more fields were changed.
+    """
+    if set_pulled_fields(instance, imported_instance, fields):
         instance.save()
 
 
-def handle_resource_not_found(resource):
+def set_resource_not_found(resource):
     """
-    Set resource state to ERRED and append/create "not found" error message.
+    Set resource state to ERRED and append/create "not found" error message without saving it.
+    Return list of modified fields.
     """
+    old_values = (resource.state, resource.runtime_state, resource.error_message)
     resource.set_erred()
     resource.runtime_state = ''
     message = 'Does not exist at backend.'
@@ -109,14 +121,25 @@ def handle_resource_not_found(resource):
             resource.error_message = message
         else:
             resource.error_message += ' (%s)' % message
+    new_values = (resource.state, resource.runtime_state, resource.error_message)
+    return [field for field, old_value, new_value in zip(('state', 'runtime_state', 'error_message'),
+                                                         old_values, new_values) if old_value != new_value]
+
+
+def handle_resource_not_found(resource):
+    """
+    Set resource state to ERRED and append/create "not found" error message.
+    """
+    set_resource_not_found(resource)
     resource.save()
     logger.warning('%s %s (PK: %s) does not exist at backend.' % (
         resource.__class__.__name__, resource, resource.pk))
 
 
-def handle_resource_update_success(resource):
+def set_resource_update_success(resource):
     """
-    Recover resource if its state is ERRED and clear error message.
+    Recover resource if its state is ERRED and clear error message without saving it.
+    Return list of modified fields.
     """
     update_fields = []
     if resource.state == resource.States.ERRED:
@@ -131,12 +154,118 @@ def handle_resource_update_success(resource):
         resource.error_message = ''
         update_fields.append('error_message')
 
+    return update_fields
+
+
+def handle_resource_update_success(resource):
+    """
+    Recover resource if its state is ERRED and clear error message.
+    """
+    update_fields = set_resource_update_success(resource)
     if update_fields:
         resource.save(update_fields=update_fields)
     logger.info('%s %s (PK: %s) was successfully updated.' % (
         resource.__class__.__name__, resource, resource.pk))
 
 
+def sync_pulled_resources(resources, backend_resources, get_fields):
+    """
+    Synchronize resources with resources imported from backend matched by backend ID.
+
+    Changes are computed in memory: missing resources are marked as erred,
+    found resources get pulled fields and are recovered if needed.
+    Changed resources are saved using one bulk UPDATE per set of modified fields
+    and post_save signal is sent only for them, so that handlers of state change keep working.
+
+    :param get_fields: callable that receives resource and imported resource and returns pulled fields
+    :return: list of changed resources
+    """
+    backend_resources_map = {backend_resource.backend_id: backend_resource
+                             for backend_resource in backend_resources}
+    changed_resources = collections.defaultdict(list)
+    for resource in resources:
+        try:
+            backend_resource = backend_resources_map[resource.backend_id]
+        except KeyError:
+            update_fields = set_resource_not_found(resource)
+            logger.warning('%s %s (PK: %s) does not exist at backend.' % (
+                resource.__class__.__name__, resource, resource.pk))
+        else:
+            update_fields = set_pulled_fields(resource, backend_resource, get_fields(resource, backend_resource))
+            update_fields += set_resource_update_success(resource)
+
+        if update_fields:
+            update_fields = set(update_fields)
+            if hasattr(resource, 'modified'):
+                # Auto-updated timestamp is not set by bulk update.
+                resource.modified = timezone.now()
+                update_fields.add('modified')
+            changed_resources[frozenset(update_fields)].append(resource)
+
+    updated = []
+    with transaction.atomic():
+        for update_fields, group in changed_resources.items():
+            model = group[0].__class__
+            model.objects.bulk_update(group, update_fields)
+            updated.extend(group)
+
+    for update_fields, group in changed_resources.items():
+        for resource in group:
+            signals.post_save.send(
+                sender=resource.__class__, instance=resource, created=False,
+                update_fields=update_fields, raw=False, using=resource._state.db)
+            if hasattr(resource, 'tracker'):
+                resource.tracker.set_saved_fields()
+
+    return updated
+
+
+def sync_service_properties(model, settings, backend_properties, exclude_stale=None):
+    """
+    Synchronize service properties of settings with properties imported from backend.
+
+    Missing properties are created with bulk INSERT, changed ones are updated
+    with bulk UPDATE and stale ones are deleted with single DELETE.
+    post_save signal is sent only for created and changed properties.
+
+    :param backend_properties: dictionary, where key is backend ID and value is dictionary of property fields
+    :param exclude_stale: optional list of backend IDs that should not be deleted even if they are stale
+    """
+    current_properties = {prop.backend_id: prop for prop in model.objects.filter(settings=settings)}
+    new_properties = []
+    changed_properties = collections.defaultdict(list)
+
+    for backend_id, values in backend_properties.items():
+        prop = current_properties.get(backend_id)
+        if prop is None:
+            new_properties.append(model(settings=settings, backend_id=backend_id, **values))
+            continue
+        update_fields = [field for field, value in values.items() if getattr(prop, field) != value]
+        for field in update_fields:
+            setattr(prop, field, values[field])
+        if update_fields:
+            changed_properties[frozenset(update_fields)].append(prop)
+
+    stale_ids = set(current_properties) - set(backend_properties) - set(exclude_stale or [])
+
+    with transaction.atomic():
+        if new_properties:
+            model.objects.bulk_create(new_properties)
+        for update_fields, group in changed_properties.items():
+            model.objects.bulk_update(group, update_fields)
+        if stale_ids:
+            model.objects.filter(settings=settings, backend_id__in=stale_ids).delete()
+
+    for prop in new_properties:
+        signals.post_save.send(
+            sender=model, instance=prop, created=True, update_fields=None, raw=False, using=prop._state.db)
+    for update_fields, group in changed_properties.items():
+        for prop in group:
+            signals.post_save.send(
+                sender=model, instance=prop, created=False, update_fields=update_fields, raw=False,
+                using=prop._state.db)
+
+
 def check_customer_blocked(obj):
     from waldur_core.structure import permissions
 
@@ -20,18 +20,18 @@ from rest_framework import serializers as rf_serializers
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied, MethodNotAllowed, NotFound, APIException, ValidationError
 from rest_framework.response import Response
-from reversion.models import Version
 
 from waldur_core.core import managers as core_managers
 from waldur_core.core import mixins as core_mixins
 from waldur_core.core import models as core_models
+from waldur_core.core import pagination as core_pagination
 from waldur_core.core import serializers as core_serializers
 from waldur_core.core import signals as core_signals
 from waldur_core.core import validators as core_validators
 from waldur_core.core import views as core_views
 from waldur_core.core.utils import datetime_to_timestamp, sort_dict, is_uuid_like
 from waldur_core.logging import models as logging_models
-from waldur_core.quotas.models import QuotaModelMixin, Quota
+from waldur_core.quotas.models import QuotaModelMixin, QuotaSample
 from waldur_core.structure import (
     SupportedServices, ServiceBackendError, ServiceBackendNotImplemented,
     filters, managers, models, permissions, serializers, utils)
@@ -351,9 +351,10 @@ class ProjectViewSet(core_mixins.EagerLoadMixin, core_views.ActionsViewSet):
 
         utils.check_customer_blocked(customer)
 
-        customer.validate_quota_change({'nc_project_count': 1}, raise_exception=True)
-
-        super(ProjectViewSet, self).perform_create(serializer)
+        # Quota is locked so that concurrent requests could not exceed it.
+        with transaction.atomic():
+            customer.validate_quota_change({'nc_project_count': 1}, raise_exception=True, lock=True)
+            super(ProjectViewSet, self).perform_create(serializer)
 
     @action(detail=True, filter_backends=[filters.GenericRoleFilter])
     def users(self, request, uuid=None):
@@ -1031,6 +1032,8 @@ class ResourceSummaryViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     model = models.NewResource  # for permissions definition.
     serializer_class = serializers.SummaryResourceSerializer
     filter_backends = (filters.GenericRoleFilter, filters.ResourceSummaryFilterBackend, filters.TagsFilter)
+    pagination_class = core_pagination.SummaryPagination
+    cursor_ordering = '-created'
 
     def get_queryset(self):
         resource_models = {k: v for k, v in SupportedServices.get_resource_models().items()}
@@ -1199,6 +1202,7 @@ class ServicesViewSet(mixins.ListModelMixin,
     model = models.Service
     serializer_class = serializers.SummaryServiceSerializer
     filter_backends = (filters.GenericRoleFilter, filters.ServiceSummaryFilterBackend)
+    pagination_class = core_pagination.SummaryPagination
 
     def get_queryset(self):
         service_models = {k: v['service'] for k, v in SupportedServices.get_service_models().items()}
@@ -1245,18 +1249,41 @@ class BaseCounterView(viewsets.GenericViewSet):
             counters[name] = partial(func, self.object)
         return counters
 
+    def get_quota_counters(self):
+        """
+        Return dictionary which maps counter name to name of object quota
+        which stores its value and is maintained incrementally.
+        """
+        return {}
+
     def list(self, request, uuid=None):
-        result = {}
+        fields = set(request.query_params.getlist('fields'))
         counters = self.get_counters()
-        for field, func in counters.items():
-            result[field] = func()
-        for func in self.dynamic_counters:
-            result.update(func(self.object))
-        fields = request.query_params.getlist('fields')
+        names = set(counters.keys())
+        if fields:
+            names &= fields
+
+        quota_counters = {name: quota for name, quota in self.get_quota_counters().items() if name in names}
+        result = self._get_quota_values(quota_counters)
+        for name in names - set(result.keys()):
+            result[name] = counters[name]()
+
+        # Names of dynamic counters are not known until they are computed.
+        if not fields or fields - set(counters.keys()):
+            for func in self.dynamic_counters:
+                result.update(func(self.object))
+
         if fields:
             result = {k: v for k, v in result.items() if k in fields}
         return Response(result)
 
+    def _get_quota_values(self, quota_counters):
+        """ Read values of all quota counters using single query. Missing quotas are computed by caller. """
+        if not quota_counters:
+            return {}
+        usages = dict(self.object.quotas.filter(name__in=quota_counters.values()).values_list('name', 'usage'))
+        return {name: int(usages[quota]) for name, quota in quota_counters.items() if quota in usages}
+
     def get_fields(self):
         raise NotImplementedError()
 
@@ -1291,6 +1318,17 @@ class CustomerCountersView(BaseCounterView):
             'users': self.get_users
         }
 
+    def get_quota_counters(self):
+        counters = {'users': 'nc_user_count'}
+        user = self.request.user
+        # Other users see only some of customer projects and services.
+        if user.is_staff or user.is_support or self.object.has_user(user, models.CustomerRole.OWNER):
+            counters.update({
+                'projects': 'nc_project_count',
+                'services': 'nc_service_count',
+            })
+        return counters
+
     def get_users(self):
         return self.object.get_users().count()
 
@@ -1341,6 +1379,15 @@ class ProjectCountersView(BaseCounterView):
         }
         return fields
 
+    def get_quota_counters(self):
+        # Resources of the project are visible to everyone who can see the project.
+        return {
+            'vms': 'nc_vm_count',
+            'apps': 'nc_app_count',
+            'private_clouds': 'nc_private_cloud_count',
+            'storages': 'nc_storage_count',
+        }
+
     def get_vms(self):
         return self._total_count(models.VirtualMachine.get_all_models())
 
@@ -1681,11 +1728,13 @@ class QuotaTimelineStatsView(views.APIView):
         ranges = self.get_ranges(request)
         items = request.query_params.getlist('item') or self.get_all_spls_quotas()
 
+        # Quotas values are taken at the end of each range.
+        timeline = QuotaSample.objects.get_timeline(scopes, items, [end for end, start in ranges])
         collector = QuotaTimelineCollector()
-        for item in items:
-            for scope in scopes:
-                values = self.get_stats_for_scope(item, scope, ranges)
-                for (end, start), (limit, usage) in zip(ranges, values):
+        for index, (end, start) in enumerate(ranges):
+            for item in items:
+                if (index, item) in timeline:
+                    limit, usage = timeline[index, item]
                     collector.add_quota(start, end, item, limit, usage)
 
         stats = list(map(sort_dict, collector.to_dict()))[::-1]
@@ -1710,26 +1759,6 @@ class QuotaTimelineStatsView(views.APIView):
                       for m in models.ServiceProjectLink.get_all_models()]
         return sum([spl_model.get_quotas_names() for spl_model in spl_models], [])
 
-    def get_stats_for_scope(self, quota_name, scope, dates):
-        stats_data = []
-        try:
-            quota = scope.quotas.get(name=quota_name)
-        except Quota.DoesNotExist:
-            return stats_data
-        versions = Version.objects.get_for_object(quota).select_related('revision').filter(
-            revision__date_created__lte=dates[0][0]).iterator()
-        version = None
-        for end, start in dates:
-            try:
-                while version is None or version.revision.date_created > end:
-                    version = next(versions)
-                stats_data.append((version._object_version.object.limit,
-                                   version._object_version.object.usage))
-            except StopIteration:
-                break
-
-        return stats_data
-
     def get_ranges(self, request):
         mapped = {
             'start_time': request.query_params.get('from'),
@@ -10,7 +10,12 @@ class AnalyticsConfig(AppConfig):
         from waldur_core.quotas.models import Quota
         from waldur_core.structure.models import ResourceMixin
 
-        from . import handlers
+        from . import cost_tracking, handlers, openstack, slurm, utils
+
+        utils.register_collector(openstack.get_tenants)
+        utils.register_collector(openstack.get_instances)
+        utils.register_collector(cost_tracking.get_total_cost)
+        utils.register_collector(slurm.get_usage)
 
         signals.post_save.connect(
             handlers.update_daily_quotas,
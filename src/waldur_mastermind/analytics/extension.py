@@ -16,7 +16,13 @@ class AnalyticsExtension(WaldurExtension):
                 'database': 'DATABASE',
                 'ssl': False,
                 'verify_ssl': False,
-            }
+            },
+            # Maximum number of points sent to InfluxDB in single request
+            'BATCH_SIZE': 5000,
+            # Points which could not be exported are stored in this file
+            # and sent again on the next run. Set to None to drop them instead.
+            'SPOOL_FILE': '/var/lib/waldur/analytics_spool.jsonl',
+            'SPOOL_MAX_POINTS': 100000,
         }
 
     @staticmethod
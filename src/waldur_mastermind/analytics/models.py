@@ -1,7 +1,8 @@
-from django.db import models
+import collections
 
 from django.contrib.contenttypes import fields as ct_fields
 from django.contrib.contenttypes import models as ct_models
+from django.db import connection, models
 
 from waldur_core.core.managers import GenericKeyMixin
 
@@ -17,6 +18,78 @@ class QuotaManager(GenericKeyMixin, models.Manager):
             defaults=dict(usage=usage),
         )
 
+    def bulk_update_or_create_quotas(self, rows):
+        """
+        Store quotas usage using single upsert query.
+        Each row is tuple of content type ID, object ID, quota name, date and usage.
+        """
+        if not rows:
+            return
+        query = """
+            INSERT INTO {table} (content_type_id, object_id, name, date, usage)
+            VALUES {values}
+            ON CONFLICT (content_type_id, object_id, name, date) DO UPDATE SET usage = EXCLUDED.usage
+        """.format(
+            table=self.model._meta.db_table,
+            values=', '.join(['(%s, %s, %s, %s, %s)'] * len(rows)),
+        )
+        params = [value for row in rows for value in row]
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+
+    def snapshot_quotas(self, scope_model, date):
+        """
+        Copy current usage of all quotas of given scope model into history
+        using single INSERT ... SELECT query. Quotas of deleted scopes are skipped.
+        """
+        from waldur_core.quotas.models import Quota
+
+        query = """
+            INSERT INTO {table} (content_type_id, object_id, name, date, usage)
+            SELECT quota.content_type_id, quota.object_id, quota.name, %s, TRUNC(quota.usage)
+            FROM {quota_table} quota
+            WHERE quota.content_type_id = %s
+              AND EXISTS (SELECT 1 FROM {scope_table} scope WHERE scope.{scope_pk} = quota.object_id)
+            ON CONFLICT (content_type_id, object_id, name, date) DO UPDATE SET usage = EXCLUDED.usage
+        """.format(
+            table=self.model._meta.db_table,
+            quota_table=Quota._meta.db_table,
+            scope_table=scope_model._meta.db_table,
+            scope_pk=scope_model._meta.pk.column,
+        )
+        content_type = ct_models.ContentType.objects.get_for_model(scope_model)
+        with connection.cursor() as cursor:
+            cursor.execute(query, [date, content_type.id])
+
+    def get_usage_series(self, scope, names, start, end):
+        """
+        Get daily usage of quotas from start to end dates inclusive.
+        Days without history record inherit usage of the previous day within period,
+        series is filled by database so that only resulting values are transferred.
+        """
+        query = """
+            SELECT quota_names.name, (
+                SELECT history.usage FROM {table} history
+                WHERE history.content_type_id = %s
+                  AND history.object_id = %s
+                  AND history.name = quota_names.name
+                  AND history.date BETWEEN %s AND days.day
+                ORDER BY history.date DESC
+                LIMIT 1
+            )
+            FROM generate_series(%s::date, %s::date, '1 day') AS days(day)
+            CROSS JOIN unnest(%s::text[]) AS quota_names(name)
+            ORDER BY quota_names.name, days.day
+        """.format(table=self.model._meta.db_table)
+        content_type = ct_models.ContentType.objects.get_for_model(scope)
+        params = [content_type.id, scope.pk, start, start, end, sorted(set(names))]
+        values = collections.defaultdict(list)
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            for name, usage in cursor.fetchall():
+                values[name].append(usage or 0)
+        return values
+
 
 class DailyQuotaHistory(models.Model):
     """
@@ -1,21 +1,30 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, Q, Sum
+
+from waldur_core.quotas.models import Quota
 from waldur_openstack.openstack.models import Tenant
 from waldur_openstack.openstack_tenant.models import Instance
 
 
 def get_tenants():
-    if not Tenant.objects.exists():
-        return []
-    points = []
-    tenants = Tenant.objects.all()
-    quota_names = Tenant.get_quotas_names()
-    quotas = Tenant.get_sum_of_quotas_as_dict(tenants, quota_names=quota_names)
+    """ Sum quotas of all tenants using single grouped query. """
+    content_type = ContentType.objects.get_for_model(Tenant)
+    quotas = Quota.objects.filter(
+        content_type=content_type,
+        name__in=Tenant.get_quotas_names(),
+    ).values('name').annotate(
+        usage=Sum('usage'),
+        limit=Sum('limit'),
+        unlimited=Count('id', filter=Q(limit=-1)),
+    ).order_by('name')
 
-    for quota_name in quota_names:
+    points = []
+    for quota in quotas:
         points.append({
-            'measurement': 'openstack_%s' % quota_name,
+            'measurement': 'openstack_%s' % quota['name'],
             'fields': {
-                'limit': quotas[quota_name],
-                'usage': quotas['%s_usage' % quota_name],
+                'limit': -1 if quota['unlimited'] else quota['limit'],
+                'usage': quota['usage'],
             }
         })
     return points
@@ -39,20 +48,22 @@ def get_instances():
 
 
 def count_instances_by_state(instances):
+    """ Count instances grouped by state and runtime state in database. """
     erred = 0
     online = 0
     offline = 0
     provisioning = 0
 
-    for instance in instances.values('state', 'runtime_state'):
-        if instance['state'] == Instance.States.ERRED:
-            erred += 1
-        elif instance['state'] != Instance.States.OK:
-            provisioning += 1
-        elif instance['runtime_state'] == Instance.get_online_state():
-            online += 1
-        elif instance['runtime_state'] == Instance.get_offline_state():
-            offline += 1
+    groups = instances.order_by().values('state', 'runtime_state').annotate(count=Count('id'))
+    for group in groups:
+        if group['state'] == Instance.States.ERRED:
+            erred += group['count']
+        elif group['state'] != Instance.States.OK:
+            provisioning += group['count']
+        elif group['runtime_state'] == Instance.get_online_state():
+            online += group['count']
+        elif group['runtime_state'] == Instance.get_offline_state():
+            offline += group['count']
 
     return {
         'erred': erred,
@@ -77,6 +77,25 @@ class TestDailyQuotasEndpoint(test.APITransactionTestCase):
         }
         self.assertDictEqual(response.data, expected)
 
+    def test_missing_quotas_are_filled_with_zeros(self):
+        self.client.force_login(self.fixture.owner)
+        url = reverse('daily-quotas-list')
+        scope = structure_factories.ProjectFactory.get_url(self.project)
+        request = {
+            'start': '2018-10-02',
+            'end': '2018-10-04',
+            'scope': scope,
+            'quota_names': ['nc_volume_count', 'nc_app_count'],
+        }
+        response = self.client.get(url, request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        expected = {
+            'nc_volume_count': [11, 12, 12],
+            'nc_app_count': [0, 0, 0],
+        }
+        self.assertDictEqual(response.data, expected)
+
 
 class TestDailyQuotasImport(test.APITransactionTestCase):
     def setUp(self):
@@ -143,6 +162,32 @@ class TestDailyQuotasTask(test.APITransactionTestCase):
         ).usage
         self.assertEqual(30, actual)
 
+    def test_existing_history_is_updated(self):
+        self.project.set_quota_usage('nc_volume_count', 30)
+        models.DailyQuotaHistory.objects.filter(
+            scope=self.project,
+            name='nc_volume_count',
+        ).update(usage=10)
+        tasks.sync_daily_quotas()
+        actual = models.DailyQuotaHistory.objects.get(
+            scope=self.project,
+            name='nc_volume_count',
+            date=timezone.now().date()
+        ).usage
+        self.assertEqual(30, actual)
+
+    def test_customer_quotas_are_synced(self):
+        customer = self.fixture.customer
+        customer.set_quota_usage('nc_project_count', 3)
+        models.DailyQuotaHistory.objects.all().delete()
+        tasks.sync_daily_quotas()
+        actual = models.DailyQuotaHistory.objects.get(
+            scope=customer,
+            name='nc_project_count',
+            date=timezone.now().date()
+        ).usage
+        self.assertEqual(3, actual)
+
 
 class TestDailyQuotasSignalHandler(testcases.TestCase):
     def setUp(self):
@@ -0,0 +1,73 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from influxdb import exceptions
+
+from .. import utils
+
+
+def get_points(count):
+    return [{'measurement': 'test', 'fields': {'value': i}} for i in range(count)]
+
+
+class ExportPointsTest(TestCase):
+    def setUp(self):
+        handle, self.spool_file = tempfile.mkstemp()
+        os.close(handle)
+        os.remove(self.spool_file)
+        options = dict(settings.WALDUR_ANALYTICS, SPOOL_FILE=self.spool_file, BATCH_SIZE=2)
+        self.settings_override = override_settings(WALDUR_ANALYTICS=options)
+        self.settings_override.enable()
+        self.client = mock.Mock()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        if os.path.exists(self.spool_file):
+            os.remove(self.spool_file)
+
+    def test_points_are_written_in_batches(self):
+        written = utils.export_points(self.client, get_points(5))
+        self.assertEqual(written, 5)
+        self.assertEqual([len(call[0][0]) for call in self.client.write_points.call_args_list], [2, 2, 1])
+
+    def test_points_are_spooled_if_influxdb_is_not_available(self):
+        self.client.write_points.side_effect = [None, exceptions.InfluxDBServerError('error')]
+        written = utils.export_points(self.client, get_points(5))
+        self.assertEqual(written, 2)
+        self.assertEqual(utils.read_spool(), get_points(5)[2:])
+
+    def test_spooled_points_are_exported_on_the_next_run(self):
+        utils.write_spool(get_points(1))
+        utils.export_points(self.client, get_points(2))
+        written_points = [point for call in self.client.write_points.call_args_list for point in call[0][0]]
+        self.assertEqual(written_points, get_points(1) + get_points(2))
+        self.assertFalse(os.path.exists(self.spool_file))
+
+    def test_rejected_spooled_points_do_not_block_export(self):
+        utils.write_spool(get_points(2))
+        self.client.write_points.side_effect = [
+            exceptions.InfluxDBClientError('field type conflict', 400), None]
+
+        written = utils.export_points(self.client, get_points(1))
+
+        self.assertEqual(written, 1)
+        self.assertEqual(self.client.write_points.call_args_list[-1][0][0], get_points(1))
+        self.assertFalse(os.path.exists(self.spool_file))
+
+
+class CollectPointsTest(TestCase):
+    def test_points_are_marked_with_collection_time(self):
+        with mock.patch.object(utils, '_collectors', [lambda: get_points(1)]):
+            points = utils.collect_points()
+        self.assertIn('time', points[0])
+
+    def test_failed_collector_does_not_prevent_export(self):
+        def failed_collector():
+            raise ValueError()
+
+        with mock.patch.object(utils, '_collectors', [failed_collector, lambda: get_points(1)]):
+            points = utils.collect_points()
+        self.assertEqual(len(points), 1)
@@ -1,11 +1,16 @@
+import json
 import logging
+import os
 from datetime import timedelta
 
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
 from influxdb import InfluxDBClient, exceptions
+from requests.exceptions import RequestException
 from reversion.models import Version
 
+from waldur_core.core import utils as core_utils
 from waldur_core.structure.models import Customer, Project
 
 from . import models
@@ -13,6 +18,40 @@ from . import models
 
 logger = logging.getLogger(__name__)
 
+WRITE_ERRORS = (exceptions.InfluxDBClientError, exceptions.InfluxDBServerError, RequestException)
+
+_collectors = []
+
+
+def register_collector(collector):
+    """
+    Register callable which returns list of InfluxDB points for analytics.push_points task.
+    Collector is expected to compute measurements using aggregate queries.
+    """
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+def get_collectors():
+    return list(_collectors)
+
+
+def collect_points():
+    """
+    Get points from all registered collectors and mark them with collection time.
+    Failure of single collector does not prevent others from being exported.
+    """
+    points = []
+    for collector in get_collectors():
+        try:
+            points.extend(collector())
+        except Exception:
+            logger.exception('Unable to collect analytics points using %s.', collector.__name__)
+    timestamp = timezone.now().strftime('%Y-%m-%dT%H:%M:%SZ')
+    for point in points:
+        point.setdefault('time', timestamp)
+    return points
+
 
 def get_influxdb_client():
     if settings.WALDUR_ANALYTICS['ENABLED']:
@@ -23,39 +62,120 @@ def get_influxdb_client():
 def write_points(client, points):
     try:
         client.write_points(points)
-    except (exceptions.InfluxDBClientError, exceptions.InfluxDBServerError) as e:
+    except WRITE_ERRORS as e:
         logger.warning('Unable to write to InfluxDB %s', e)
 
 
+def read_spool():
+    path = settings.WALDUR_ANALYTICS['SPOOL_FILE']
+    if not path or not os.path.exists(path):
+        return []
+    try:
+        with open(path) as spool:
+            return [json.loads(line) for line in spool if line.strip()]
+    except (IOError, ValueError) as e:
+        logger.warning('Unable to read analytics spool file %s: %s', path, e)
+        return []
+
+
+def write_spool(points):
+    """ Store points which were not exported, keeping only the latest ones if spool is full. """
+    path = settings.WALDUR_ANALYTICS['SPOOL_FILE']
+    if not path:
+        if points:
+            logger.warning('%s analytics points are dropped because spool file is not configured.', len(points))
+        return
+    points = points[-settings.WALDUR_ANALYTICS['SPOOL_MAX_POINTS']:]
+    try:
+        if not points:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        with open(path, 'w') as spool:
+            for point in points:
+                spool.write(json.dumps(point) + '\n')
+    except IOError as e:
+        logger.warning('Unable to write analytics spool file %s: %s', path, e)
+
+
+def is_rejected(error):
+    """ InfluxDB has rejected points with client error, so writing them again would fail as well. """
+    return isinstance(error, exceptions.InfluxDBClientError) and error.code is not None and error.code < 500
+
+
+def export_points(client, points):
+    """
+    Write previously spooled and new points to InfluxDB in batches.
+    If InfluxDB is not available, remaining points are spooled until the next export.
+    Batch rejected by InfluxDB is dropped, so that it does not block export of next points.
+    Return number of written points.
+    """
+    points = read_spool() + points
+    batch_size = settings.WALDUR_ANALYTICS['BATCH_SIZE']
+    written = 0
+    processed = 0
+    for batch in core_utils.chunks(points, batch_size):
+        try:
+            client.write_points(batch)
+        except WRITE_ERRORS as e:
+            if not is_rejected(e):
+                logger.warning('Unable to write to InfluxDB, %s points are spooled: %s', len(points) - processed, e)
+                break
+            logger.error('InfluxDB has rejected %s points, they are dropped: %s', len(batch), e)
+        else:
+            written += len(batch)
+        processed += len(batch)
+    write_spool(points[processed:])
+    return written
+
+
 def import_daily_usage():
-    quotas = {}
+    """
+    Restore daily quotas usage history of projects and customers from revisions.
+    Revisions are deserialized without fetching quotas and their scopes one by one.
+    """
+    from waldur_core.quotas.models import Quota
+
+    scope_models = (Customer, Project)
+    quota_content_type = ContentType.objects.get_for_model(Quota)
+    scopes_content_types = ContentType.objects.get_for_models(*scope_models)
+    existing_scopes = {
+        (scopes_content_types[model].id, pk)
+        for model in scope_models
+        for pk in model.objects.values_list('pk', flat=True)
+    }
+    quotas = {
+        quota_id: (content_type_id, object_id, name)
+        for quota_id, content_type_id, object_id, name in Quota.objects.filter(
+            content_type__in=scopes_content_types.values(),
+        ).values_list('id', 'content_type_id', 'object_id', 'name')
+        if (content_type_id, object_id) in existing_scopes
+    }
+
     cutoff = timezone.now() - timedelta(days=90)
     versions = Version.objects.filter(
+        content_type=quota_content_type,
         revision__date_created__gte=cutoff
-    ).order_by('revision__date_created')
-    for version in versions:
-        try:
-            scope = version.object.scope
-        except AttributeError:
+    ).select_related('revision').order_by('revision__date_created')
+    usages = {}
+    for version in versions.iterator():
+        key = quotas.get(int(version.object_id))
+        if key is None:
             continue
-        if not isinstance(scope, (Customer, Project)):
-            continue
-        name = version.object.name
-        usage = version._object_version.object.usage
+        usage = version.field_dict['usage']
         date = version.revision.date_created.date()
-
-        quotas.setdefault(scope, {})
-        quotas[scope].setdefault(name, {})
-        quotas[scope][name][date] = usage
+        usages.setdefault(key, {})[date] = usage
 
     end = timezone.now().date()
-    for scope in quotas.keys():
-        for name in quotas[scope].keys():
-            records = quotas[scope][name]
-            start = min(records.keys())
-            days = (end - start).days
-            usage = 0
-            for i in range(days + 1):
-                date = start + timedelta(days=i)
-                usage = records.get(date, usage)
-                models.DailyQuotaHistory.objects.update_or_create_quota(scope, name, date, usage)
+    rows = []
+    for (content_type_id, object_id, name), records in usages.items():
+        start = min(records.keys())
+        days = (end - start).days
+        usage = 0
+        for i in range(days + 1):
+            date = start + timedelta(days=i)
+            usage = records.get(date, usage)
+            rows.append((content_type_id, object_id, name, date, int(usage)))
+
+    for chunk in core_utils.chunks(rows, 1000):
+        models.DailyQuotaHistory.objects.bulk_update_or_create_quotas(chunk)
@@ -1,6 +1,3 @@
-import collections
-from datetime import timedelta
-
 from rest_framework import viewsets
 from rest_framework.response import Response
 
@@ -26,27 +23,4 @@ class DailyQuotaHistoryViewSet(viewsets.GenericViewSet):
         start = query['start']
         end = query['end']
 
-        quotas = models.DailyQuotaHistory.objects.filter(
-            scope=scope,
-            name__in=quota_names,
-            date__gte=start,
-            date__lte=end,
-        ).only(
-            'name',
-            'date',
-            'usage',
-        )
-        charts = collections.defaultdict(dict)
-        for quota in quotas:
-            charts[quota.name][quota.date] = quota.usage
-
-        values = collections.defaultdict(list)
-        day = timedelta(days=1)
-        days = (end - start).days
-        for name in quota_names:
-            usage = 0
-            for i in range(days + 1):
-                date = start + i * day
-                usage = charts[name].get(date, usage)
-                values[name].append(usage)
-        return values
+        return models.DailyQuotaHistory.objects.get_usage_series(scope, quota_names, start, end)
@@ -58,7 +58,7 @@ class TotalCustomerCostView(views.APIView):
 
         year, month = invoice_utils.parse_period(request.query_params)
         invoices = invoices_models.Invoice.objects.filter(customer__in=customers)
-        invoices = invoices.filter(year=year, month=month)
+        invoices = invoices.filter(year=year, month=month).annotate_price()
 
         total = sum(invoice.total for invoice in invoices)
         price = sum(invoice.price for invoice in invoices)
@@ -50,6 +50,10 @@ class InvoicesExtension(WaldurExtension):
             'SEND_CUSTOMER_INVOICES': False,
             # The front-end invoice link template must include {uuid} parameter, e.g. http://example.com/invoice/{uuid}
             'INVOICE_LINK_TEMPLATE': '',
+            # Customers are processed in chunks of this size when monthly invoices are created.
+            'MONTHLY_INVOICES_CHUNK_SIZE': 100,
+            # Number of invoice items fetched from database at once when report is generated.
+            'REPORT_CHUNK_SIZE': 1000,
         }
 
     @staticmethod
@@ -1,4 +1,5 @@
 import django_filters
+from django.db.models import Q
 from waldur_core.core import filters as core_filters
 
 from . import models
@@ -8,8 +9,29 @@ class InvoiceFilter(django_filters.FilterSet):
     customer = core_filters.URLFilter(view_name='customer-detail', field_name='customer__uuid')
     customer_uuid = django_filters.UUIDFilter(field_name='customer__uuid')
     state = django_filters.MultipleChoiceFilter(choices=models.Invoice.States.CHOICES)
+    start = django_filters.CharFilter(method='filter_start')
+    end = django_filters.CharFilter(method='filter_end')
     o = django_filters.OrderingFilter(fields=(('year', 'month'),))
 
     class Meta:
         model = models.Invoice
         fields = ('year', 'month')
+
+    def parse_period(self, value):
+        try:
+            year, month = map(int, value.split('-'))
+        except ValueError:
+            return None, None
+        return year, month
+
+    def filter_start(self, queryset, name, value):
+        year, month = self.parse_period(value)
+        if year is None:
+            return queryset.none()
+        return queryset.filter(Q(year__gt=year) | Q(year=year, month__gte=month))
+
+    def filter_end(self, queryset, name, value):
+        year, month = self.parse_period(value)
+        if year is None:
+            return queryset.none()
+        return queryset.filter(Q(year__lt=year) | Q(year=year, month__lte=month))
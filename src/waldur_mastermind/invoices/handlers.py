@@ -87,7 +87,7 @@ def prevent_deletion_of_customer_with_invoice(sender, instance, user, **kwargs):
     if user.is_staff:
         return
     PENDING = models.Invoice.States.PENDING
-    for invoice in models.Invoice.objects.filter(customer=instance):
+    for invoice in models.Invoice.objects.filter(customer=instance).annotate_price():
         if invoice.state != PENDING or invoice.price > 0:
             raise ValidationError(_('Can\'t delete organization with invoice %s.') % invoice)
 
@@ -1,7 +1,119 @@
 from django.db import models as django_models
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Func, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Ceil, Coalesce, Floor, Least
+from django.utils import timezone
 
 from waldur_core.core import managers as core_managers
+from waldur_mastermind.common.mixins import UnitPriceMixin
 
+Units = UnitPriceMixin.Units
 
-class InvoiceItemManager(core_managers.GenericKeyMixin, django_models.Manager):
+
+class SecondsBetween(Func):
+    """ Number of seconds between two timestamps. """
+    template = 'CAST(EXTRACT(EPOCH FROM %(expressions)s) AS numeric)'
+    arg_joiner = ' - '
+    output_field = DecimalField()
+
+
+class DayOfMonth(Func):
+    template = "CAST(EXTRACT(DAY FROM %(expressions)s AT TIME ZONE 'UTC') AS numeric)"
+    output_field = DecimalField()
+
+
+class DaysInMonth(Func):
+    template = ("CAST(EXTRACT(DAY FROM DATE_TRUNC('month', %(expressions)s AT TIME ZONE 'UTC') "
+                "+ INTERVAL '1 month - 1 day') AS numeric)")
+    output_field = DecimalField()
+
+
+def round_up(expression):
+    """ Database counterpart of quantize_price: round up to 2 places after the decimal point. """
+    return ExpressionWrapper(Ceil(expression * 100) / 100, output_field=DecimalField())
+
+
+def get_factor_expression(now=None):
+    """
+    Database counterpart of InvoiceItem.get_factor method.
+    If current date is specified, hourly and daily items are counted until it.
+    Expression relies on start_day, end_day and month_days annotations.
+    """
+    end = Least(F('end'), Value(now, output_field=django_models.DateTimeField())) if now else F('end')
+    half_month = F('month_days') / 2
+
+    half_month_factor = Case(
+        When(Q(start_day=1, end_day=15) | Q(start_day=16, end_day=F('month_days')), then=Value(1)),
+        When(start_day=1, end_day=F('month_days'), then=Value(2)),
+        When(start_day=1, end_day__gt=15, then=round_up(1 + (F('end_day') - 15) / half_month)),
+        When(start_day__lt=16, end_day=F('month_days'), then=round_up(1 + (16 - F('start_day')) / half_month)),
+        default=round_up((F('end_day') - F('start_day') + 1) / half_month),
+        output_field=DecimalField(),
+    )
+
+    use_days = Floor(SecondsBetween(F('end'), F('start')) / (24 * 60 * 60)) + 1
+    month_factor = Case(
+        When(start_day=1, end_day=F('month_days'), then=Value(1)),
+        default=round_up(use_days / F('month_days')),
+        output_field=DecimalField(),
+    )
+
+    return Case(
+        When(unit=Units.QUANTITY, then=F('quantity')),
+        When(unit=Units.PER_HOUR, then=Ceil(SecondsBetween(end, F('start')) / (60 * 60))),
+        When(unit=Units.PER_DAY, then=Ceil(SecondsBetween(end, F('start')) / (24 * 60 * 60))),
+        When(unit=Units.PER_HALF_MONTH, then=half_month_factor),
+        default=month_factor,
+        output_field=DecimalField(),
+    )
+
+
+def get_price_annotation(current=False):
+    return 'price_current_value' if current else 'price_value'
+
+
+class InvoiceItemQuerySet(django_models.QuerySet):
+
+    def annotate_price(self, current=False):
+        """
+        Annotate items with price calculated in database.
+        It is stored as price_value or price_current_value, which are equal to price or price_current.
+        """
+        factor = get_factor_expression(timezone.now() if current else None)
+        return self.annotate(
+            start_day=DayOfMonth('start'),
+            end_day=DayOfMonth('end'),
+            month_days=DaysInMonth('start'),
+        ).annotate(**{
+            get_price_annotation(current): ExpressionWrapper(F('unit_price') * factor, output_field=DecimalField()),
+        })
+
+    def get_price(self, current=False):
+        """ Return total price of items using single query. """
+        total = Sum(get_price_annotation(current))
+        return self.annotate_price(current).aggregate(total=total)['total'] or 0
+
+
+class InvoiceItemManager(core_managers.GenericKeyMixin,
+                         django_models.Manager.from_queryset(InvoiceItemQuerySet)):
     pass
+
+
+class InvoiceQuerySet(django_models.QuerySet):
+
+    def annotate_price(self):
+        """ Annotate invoices with items_price and items_price_current calculated in database. """
+        item_model = self.model._meta.get_field('generic_items').related_model
+
+        def get_price_subquery(current):
+            items = item_model.objects.filter(invoice=OuterRef('pk')).annotate_price(current)
+            total = Sum(get_price_annotation(current))
+            items = items.order_by().values('invoice').annotate(total=total).values('total')
+            return Coalesce(Subquery(items, output_field=DecimalField()), 0)
+
+        return self.annotate(
+            items_price=get_price_subquery(current=False),
+            items_price_current=get_price_subquery(current=True),
+        )
+
+
+InvoiceManager = django_models.Manager.from_queryset(InvoiceQuerySet)
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0032_genericinvoiceitem_name'),
+    ]
+
+    operations = [
+        # Existing invoices have been processed by previous monthly rollovers, so they are marked as notified.
+        migrations.AddField(
+            model_name='invoice',
+            name='notified',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='notified',
+            field=models.BooleanField(default=False, editable=False,
+                                      help_text='Notification about invoice has been sent to organization owners.'),
+        ),
+    ]
@@ -68,7 +68,10 @@ class Invoice(core_models.UuidMixin, models.Model):
     invoice_date = models.DateField(null=True, blank=True,
                                     help_text=_('Date then invoice moved from state pending to created.'))
     _file = models.TextField(blank=True, editable=False)
+    notified = models.BooleanField(default=False, editable=False,
+                                   help_text=_('Notification about invoice has been sent to organization owners.'))
 
+    objects = managers.InvoiceManager()
     tracker = FieldTracker()
 
     def update_current_cost(self):
@@ -88,7 +91,10 @@ class Invoice(core_models.UuidMixin, models.Model):
 
     @property
     def price(self):
-        return sum((item.price for item in self.items))
+        # Price is annotated by InvoiceQuerySet.annotate_price to avoid query per invoice.
+        if hasattr(self, 'items_price'):
+            return self.items_price
+        return self.generic_items.get_price()
 
     @property
     def tax_current(self):
@@ -100,7 +106,9 @@ class Invoice(core_models.UuidMixin, models.Model):
 
     @property
     def price_current(self):
-        return sum((item.price_current for item in self.items))
+        if hasattr(self, 'items_price_current'):
+            return self.items_price_current
+        return self.generic_items.get_price(current=True)
 
     @property
     def items(self):
@@ -226,10 +234,15 @@ class InvoiceItem(common_mixins.ProductCodeMixin, common_mixins.UnitPriceMixin):
 
     @property
     def price(self):
+        # Price is annotated by InvoiceItemQuerySet.annotate_price in reports.
+        if hasattr(self, 'price_value'):
+            return self.price_value
         return self._price()
 
     @property
     def price_current(self):
+        if hasattr(self, 'price_current_value'):
+            return self.price_current_value
         return self._price(current=True)
 
     @property
@@ -1,11 +1,11 @@
 import base64
+import datetime
 from csv import DictWriter
-from io import StringIO
 import logging
 
-from celery import shared_task, chain
+from celery import shared_task, chain, group
 from django.conf import settings
-from django.db.models import Q
+from django.db.models import Q, QuerySet, signals
 from django.template.loader import render_to_string
 from django.utils import timezone
 
@@ -25,30 +25,95 @@ def create_monthly_invoices():
     - For every customer change state of the invoices for previous months from "pending" to "billed"
       and freeze their items.
     - Create new invoice for every customer in current month if not created yet.
+
+    Customers are split into chunks, each chunk is processed by independent pipeline
+    which creates invoices, renders PDF and sends notifications.
     """
     date = timezone.now()
-
-    old_invoices = models.Invoice.objects.filter(
-        Q(state=models.Invoice.States.PENDING, year__lt=date.year) |
-        Q(state=models.Invoice.States.PENDING, year=date.year, month__lt=date.month)
-    )
-    for invoice in old_invoices:
-        invoice.set_created()
+    mark_old_invoices_as_created(date)
 
     customers = structure_models.Customer.objects.all()
     if settings.WALDUR_CORE['ENABLE_ACCOUNTING_START_DATE']:
         customers = customers.filter(accounting_start_date__lt=timezone.now())
 
-    for customer in customers.iterator():
-        registrators.RegistrationManager.get_or_create_invoice(customer, core_utils.month_start(date))
+    customer_ids = list(customers.order_by('id').values_list('id', flat=True))
+    utils.init_rollover_progress(date.year, date.month, len(customer_ids))
 
     if settings.WALDUR_INVOICES['INVOICE_REPORTING']['ENABLE']:
         send_invoice_report.delay()
 
-    if settings.WALDUR_INVOICES['SEND_CUSTOMER_INVOICES']:
-        chain(create_pdf_for_new_invoices.si(), send_new_invoices_notification.si())()
-    else:
-        create_pdf_for_new_invoices.delay()
+    pipelines = []
+    for chunk in core_utils.chunks(customer_ids, settings.WALDUR_INVOICES['MONTHLY_INVOICES_CHUNK_SIZE']):
+        signatures = [
+            create_invoices_for_customers.si(chunk, date.year, date.month),
+            create_pdf_for_customers.si(chunk, date.year, date.month),
+        ]
+        if settings.WALDUR_INVOICES['SEND_CUSTOMER_INVOICES']:
+            signatures.append(send_notifications_for_customers.si(chunk, date.year, date.month))
+        pipelines.append(chain(*signatures))
+
+    group(pipelines).apply_async()
+
+
+def mark_old_invoices_as_created(date):
+    """
+    Change state of invoices for previous months using single query.
+    Signals are sent explicitly so that handlers observe state transition.
+    """
+    old_invoices = list(models.Invoice.objects.filter(
+        Q(state=models.Invoice.States.PENDING, year__lt=date.year) |
+        Q(state=models.Invoice.States.PENDING, year=date.year, month__lt=date.month)
+    ))
+    if not old_invoices:
+        return
+
+    invoice_date = date.date()
+    update_fields = frozenset(['state', 'invoice_date'])
+    models.Invoice.objects.filter(
+        pk__in=[invoice.pk for invoice in old_invoices],
+        state=models.Invoice.States.PENDING,
+    ).update(state=models.Invoice.States.CREATED, invoice_date=invoice_date)
+
+    for invoice in old_invoices:
+        invoice.state = models.Invoice.States.CREATED
+        invoice.invoice_date = invoice_date
+        signals.post_save.send(
+            sender=models.Invoice, instance=invoice, created=False, update_fields=update_fields, raw=False,
+            using=invoice._state.db)
+        invoice.tracker.set_saved_fields()
+
+
+def get_invoices_for_customers(customer_ids, year, month):
+    return models.Invoice.objects.filter(customer_id__in=customer_ids, year=year, month=month)
+
+
+@shared_task(name='invoices.create_invoices_for_customers')
+def create_invoices_for_customers(customer_ids, year, month):
+    """ Create invoices for chunk of customers. Invoices which already exist are skipped. """
+    start = core_utils.month_start(datetime.date(year=year, month=month, day=1))
+    for customer in structure_models.Customer.objects.filter(id__in=customer_ids):
+        registrators.RegistrationManager.get_or_create_invoice(customer, start)
+    utils.update_rollover_progress(year, month, 'created', len(customer_ids))
+
+
+@shared_task(name='invoices.create_pdf_for_customers')
+def create_pdf_for_customers(customer_ids, year, month):
+    """ Render PDF for invoices of chunk of customers. Already rendered invoices are skipped. """
+    for invoice in get_invoices_for_customers(customer_ids, year, month).filter(_file=''):
+        try:
+            utils.create_invoice_pdf(invoice)
+        except Exception:
+            logger.exception('Unable to render PDF for invoice %s.', invoice)
+    utils.update_rollover_progress(year, month, 'rendered', len(customer_ids))
+
+
+@shared_task(name='invoices.send_notifications_for_customers')
+def send_notifications_for_customers(customer_ids, year, month):
+    """ Send notifications for invoices of chunk of customers. Every invoice is notified only once. """
+    for invoice in get_invoices_for_customers(customer_ids, year, month).filter(notified=False):
+        send_invoice_notification(invoice.uuid.hex)
+        models.Invoice.objects.filter(pk=invoice.pk).update(notified=True)
+    utils.update_rollover_progress(year, month, 'notified', len(customer_ids))
 
 
 @shared_task(name='invoices.send_invoice_notification')
@@ -103,14 +168,14 @@ def send_invoice_report():
         'year': date.year,
     }).strip()
     filename = '3M%02d%dWaldur.txt' % (date.month, date.year)
-    invoices = models.Invoice.objects.filter(year=date.year, month=date.month)
+    invoices = models.Invoice.objects.filter(year=date.year, month=date.month).annotate_price()
 
     # Report should include only organizations that had accounting running during the invoice period.
     if settings.WALDUR_CORE['ENABLE_ACCOUNTING_START_DATE']:
         invoices = invoices.filter(customer__accounting_start_date__lte=core_utils.month_end(date))
 
     # Report should not include customers with 0 invoice sum.
-    invoices = [invoice for invoice in invoices if invoice.total > 0]
+    invoices = invoices.filter(items_price__gt=0)
     text_message = format_invoice_csv(invoices)
 
     # Please note that email body could be empty if there are no valid invoices
@@ -125,37 +190,53 @@ def send_invoice_report():
     )
 
 
-def format_invoice_csv(invoices):
-    if not isinstance(invoices, list):
+class Echo:
+    """ File-like object which returns written value instead of buffering it. """
+
+    def write(self, value):
+        return value
+
+
+def get_report_invoices(invoices):
+    """ Return queryset of invoices with precomputed prices. """
+    if isinstance(invoices, models.Invoice):
         invoices = [invoices]
+    if not isinstance(invoices, QuerySet):
+        invoices = models.Invoice.objects.filter(pk__in=[invoice.pk for invoice in invoices])
+    if 'items_price' not in invoices.query.annotations:
+        invoices = invoices.annotate_price()
+    return invoices.select_related('customer')
+
 
+def iter_invoice_csv(invoices):
+    """
+    Generate invoice report as CSV line by line.
+    Items are fetched using database cursor with precomputed price,
+    so that memory usage does not depend on the size of report.
+    """
     csv_params = settings.WALDUR_INVOICES['INVOICE_REPORTING']['CSV_PARAMS']
 
     if settings.WALDUR_INVOICES['INVOICE_REPORTING'].get('USE_SAF'):
-        fields = serializers.SAFReportSerializer.Meta.fields
-        stream = StringIO()
-        writer = DictWriter(stream, fieldnames=fields, **csv_params)
-        writer.writeheader()
+        serializer_class = serializers.SAFReportSerializer
+    else:
+        serializer_class = serializers.InvoiceItemReportSerializer
 
-        for invoice in invoices:
-            items = invoice.items
-            items = utils.filter_invoice_items(items)
-            serializer = serializers.SAFReportSerializer(items, many=True)
-            writer.writerows(serializer.data)
-        return stream.getvalue()
+    fields = serializer_class.Meta.fields
+    writer = DictWriter(Echo(), fieldnames=fields, **csv_params)
+    yield writer.writerow(dict(zip(fields, fields)))
 
-    fields = serializers.InvoiceItemReportSerializer.Meta.fields
-    stream = StringIO()
-    writer = DictWriter(stream, fieldnames=fields, **csv_params)
-    writer.writeheader()
+    invoices = {invoice.id: invoice for invoice in get_report_invoices(invoices)}
+    items = models.InvoiceItem.objects.filter(invoice_id__in=invoices.keys())
+    # Skip empty, but leave in credit and debit
+    items = items.annotate_price().exclude(price_value=0).order_by('invoice_id', 'id')
 
-    for invoice in invoices:
-        items = invoice.items
-        items = utils.filter_invoice_items(items)
-        serializer = serializers.InvoiceItemReportSerializer(items, many=True)
-        writer.writerows(serializer.data)
+    for item in items.iterator(chunk_size=settings.WALDUR_INVOICES['REPORT_CHUNK_SIZE']):
+        item.invoice = invoices[item.invoice_id]
+        yield writer.writerow(serializer_class(item).data)
 
-    return stream.getvalue()
+
+def format_invoice_csv(invoices):
+    return ''.join(iter_invoice_csv(invoices))
 
 
 @shared_task(name='invoices.update_invoices_current_cost')
@@ -163,7 +244,7 @@ def update_invoices_current_cost():
     year = utils.get_current_year()
     month = utils.get_current_month()
 
-    for invoice in models.Invoice.objects.filter(year=year, month=month):
+    for invoice in models.Invoice.objects.filter(year=year, month=month).annotate_price():
         invoice.update_current_cost()
 
 
@@ -177,18 +258,3 @@ def create_invoice_pdf(serialized_invoice):
 def create_pdf_for_all_invoices():
     for invoice in models.Invoice.objects.all():
         utils.create_invoice_pdf(invoice)
-
-
-@shared_task
-def create_pdf_for_new_invoices():
-    date = timezone.now()
-    for invoice in models.Invoice.objects.filter(year=date.year, month=date.month):
-        utils.create_invoice_pdf(invoice)
-
-
-@shared_task
-def send_new_invoices_notification():
-    date = timezone.now()
-
-    for invoice in models.Invoice.objects.filter(year=date.year, month=date.month):
-        send_invoice_notification.delay(invoice.uuid.hex)
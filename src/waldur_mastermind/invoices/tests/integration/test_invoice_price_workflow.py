@@ -2,6 +2,7 @@ from datetime import datetime
 import decimal
 
 from django.core.exceptions import ObjectDoesNotExist
+from django.test import override_settings
 from freezegun import freeze_time
 from rest_framework import test, status
 import pytz
@@ -84,7 +85,8 @@ class InvoicePriceWorkflowTest(test.APITransactionTestCase):
         end_of_the_new_month = core_utils.month_end(beginning_of_the_new_month)
         expected_price = utils.get_full_days(beginning_of_the_new_month, end_of_the_new_month) * price_per_day
         with freeze_time(task_triggering_date):
-            tasks.create_monthly_invoices()
+            with override_settings(task_always_eager=True):
+                tasks.create_monthly_invoices()
             self.assertEqual(models.Invoice.objects.count(), 2)
 
             invoice.refresh_from_db()
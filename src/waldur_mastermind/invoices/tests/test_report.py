@@ -4,6 +4,7 @@ from unittest import mock
 from django.test import TransactionTestCase
 from django.utils import timezone
 from freezegun import freeze_time
+from rest_framework import status, test
 
 from waldur_core.core.tests.helpers import override_waldur_core_settings
 from waldur_mastermind.invoices.tasks import format_invoice_csv
@@ -11,7 +12,7 @@ from waldur_mastermind.packages.tests.utils import override_plugin_settings
 from waldur_mastermind.support.tests import factories as support_factories
 
 from .. import models, tasks
-from . import fixtures, utils
+from . import factories, fixtures, utils
 
 
 @override_plugin_settings(BILLING_ENABLED=True)
@@ -212,3 +213,26 @@ class InvoiceReportTaskTest(BaseReportFormatterTest):
         message = send_mail_mock.call_args[1]['attachment']
         lines = message.splitlines()
         self.assertEqual(3, len(lines))
+
+
+class InvoiceReportViewTest(BaseReportFormatterTest):
+    def setUp(self):
+        super(InvoiceReportViewTest, self).setUp()
+        self.client = test.APIClient()
+        self.client.force_authenticate(self.fixture.staff)
+        self.url = factories.InvoiceFactory.get_list_url() + 'report/'
+
+    def get_lines(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_report_is_streamed(self):
+        lines = self.get_lines()
+        self.assertEqual(lines, format_invoice_csv(self.invoice).splitlines())
+
+    def test_report_is_filtered_by_period(self):
+        period = '%s-%s' % (self.invoice.year, self.invoice.month)
+        self.assertEqual(len(self.get_lines(start=period, end=period)), 2)
+        next_year = '%s-%s' % (self.invoice.year + 1, self.invoice.month)
+        self.assertEqual(len(self.get_lines(start=next_year)), 1)
@@ -1,5 +1,6 @@
 import decimal
 
+from ddt import ddt, data
 from django.test import TestCase
 
 from waldur_mastermind.common.utils import parse_datetime, quantize_price
@@ -37,3 +38,45 @@ class InvoiceItemTest(TestCase):
         )
         self.assertEqual(item.get_factor(), 4)
         self.assertEqual(item.price, 4 * 10)
+
+
+@ddt
+class InvoicePriceTest(TestCase):
+    def setUp(self):
+        self.invoice = factories.InvoiceFactory()
+
+    def create_item(self, unit, start, end):
+        return factories.InvoiceItemFactory(
+            invoice=self.invoice,
+            start=parse_datetime(start),
+            end=parse_datetime(end),
+            unit_price=decimal.Decimal('10.5'),
+            unit=unit,
+            quantity=3,
+        )
+
+    @data(
+        ('2016-11-1 00:00:00', '2016-11-30 23:59:59'),
+        ('2016-11-1 14:00:00', '2016-11-8 14:00:00'),
+        ('2016-11-16 00:00:00', '2016-11-30 23:59:59'),
+        ('2016-11-1 00:00:00', '2016-11-20 12:00:00'),
+        ('2016-11-10 00:00:00', '2016-11-30 23:59:59'),
+        ('2016-11-17 14:00:00', '2016-11-25 08:30:00'),
+    )
+    def test_price_calculated_in_database_is_equal_to_items_price(self, period):
+        for unit, _ in models.InvoiceItem.Units.CHOICES:
+            self.create_item(unit, *period)
+
+        expected_price = sum(item.price for item in self.invoice.items)
+        expected_price_current = sum(item.price_current for item in self.invoice.items)
+        self.assertEqual(self.invoice.price, expected_price)
+        self.assertEqual(self.invoice.price_current, expected_price_current)
+
+        invoice = models.Invoice.objects.filter(pk=self.invoice.pk).annotate_price().get()
+        self.assertEqual(invoice.price, expected_price)
+        self.assertEqual(invoice.price_current, expected_price_current)
+
+    def test_price_of_invoice_without_items_is_zero(self):
+        invoice = models.Invoice.objects.filter(pk=self.invoice.pk).annotate_price().get()
+        self.assertEqual(invoice.price, 0)
+        self.assertEqual(self.invoice.price, 0)
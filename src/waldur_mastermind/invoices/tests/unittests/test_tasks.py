@@ -2,6 +2,7 @@ from datetime import timedelta
 
 from ddt import ddt, data
 from django.core import mail
+from django.core.cache import cache
 from django.test import TestCase
 from django.test import override_settings
 from django.utils import timezone
@@ -18,6 +19,7 @@ from .. import factories, utils as test_utils
 from ... import models, tasks, utils
 
 
+@override_settings(task_always_eager=True)
 @override_plugin_settings(BILLING_ENABLED=True)
 class CreateMonthlyInvoicesForPackagesTest(TestCase):
 
@@ -61,6 +63,7 @@ class CreateMonthlyInvoicesForPackagesTest(TestCase):
                              'Invoice for previous month is not marked as CREATED')
 
 
+@override_settings(task_always_eager=True)
 @ddt
 class CheckAccountingStartDateTest(TestCase):
     @data(
@@ -108,3 +111,40 @@ class NotificationTest(TestCase):
         tasks.send_invoice_notification(self.invoice.uuid)
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(len(mail.outbox[0].attachments), 1)
+
+
+@override_settings(task_always_eager=True)
+@test_utils.override_invoices_settings(
+    INVOICE_LINK_TEMPLATE='http://example.com/invoice/{uuid}',
+    SEND_CUSTOMER_INVOICES=True,
+    MONTHLY_INVOICES_CHUNK_SIZE=2,
+)
+class MonthlyInvoicesPipelineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fixtures = [structure_fixtures.CustomerFixture() for _ in range(3)]
+        for fixture in self.fixtures:
+            fixture.owner
+
+    def test_invoices_are_created_for_all_chunks(self):
+        tasks.create_monthly_invoices()
+        for fixture in self.fixtures:
+            self.assertTrue(models.Invoice.objects.filter(customer=fixture.customer).exists())
+
+    def test_progress_is_tracked(self):
+        tasks.create_monthly_invoices()
+        now = timezone.now()
+        progress = utils.get_rollover_progress(now.year, now.month)
+        self.assertEqual(progress, {'total': 3, 'created': 3, 'rendered': 3, 'notified': 3})
+
+    def test_notification_is_sent_only_once(self):
+        tasks.create_monthly_invoices()
+        self.assertEqual(len(mail.outbox), 3)
+
+        # Notified state is stored in database, so it is not lost if cache is flushed.
+        cache.clear()
+        now = timezone.now()
+        customer_ids = [fixture.customer.id for fixture in self.fixtures]
+        tasks.send_notifications_for_customers(customer_ids, now.year, now.month)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(models.Invoice.objects.filter(notified=False).exists())
@@ -5,6 +5,7 @@ from decimal import Decimal
 
 import pdfkit
 from django.conf import settings
+from django.core.cache import cache
 from django.template.loader import render_to_string
 from django.utils import timezone
 
@@ -117,3 +118,31 @@ def get_price_per_day(price, unit):
         return price * 24
     else:
         return price
+
+
+ROLLOVER_PROGRESS_KEY = 'invoices.rollover_progress.%s.%s.%s'
+ROLLOVER_PROGRESS_STAGES = ('created', 'rendered', 'notified')
+ROLLOVER_PROGRESS_TIMEOUT = 60 * 60 * 24 * 31
+
+
+def init_rollover_progress(year, month, total):
+    values = {ROLLOVER_PROGRESS_KEY % (year, month, stage): 0 for stage in ROLLOVER_PROGRESS_STAGES}
+    values[ROLLOVER_PROGRESS_KEY % (year, month, 'total')] = total
+    cache.set_many(values, ROLLOVER_PROGRESS_TIMEOUT)
+
+
+def update_rollover_progress(year, month, stage, count):
+    try:
+        cache.incr(ROLLOVER_PROGRESS_KEY % (year, month, stage), count)
+    except ValueError:
+        # Progress has expired or has not been initialized.
+        pass
+
+
+def get_rollover_progress(year, month):
+    """
+    Return number of customers processed by each stage of monthly invoices creation.
+    """
+    stages = ('total',) + ROLLOVER_PROGRESS_STAGES
+    values = cache.get_many([ROLLOVER_PROGRESS_KEY % (year, month, stage) for stage in stages])
+    return {stage: values.get(ROLLOVER_PROGRESS_KEY % (year, month, stage)) for stage in stages}
@@ -1,5 +1,5 @@
 from celery import chain
-from django.http import Http404, HttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.utils.translation import ugettext_lazy as _
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, exceptions
@@ -14,7 +14,7 @@ from . import filters, models, serializers, tasks
 
 
 class InvoiceViewSet(core_views.ReadOnlyActionsViewSet):
-    queryset = models.Invoice.objects.order_by('-year', '-month')
+    queryset = models.Invoice.objects.order_by('-year', '-month').annotate_price()
     serializer_class = serializers.InvoiceSerializer
     lookup_field = 'uuid'
     filter_backends = (structure_filters.GenericRoleFilter, DjangoFilterBackend)
@@ -48,3 +48,14 @@ class InvoiceViewSet(core_views.ReadOnlyActionsViewSet):
         filename = invoice.get_filename()
         file_response['Content-Disposition'] = 'attachment; filename="{filename}"'.format(filename=filename)
         return file_response
+
+    @action(detail=False)
+    def report(self, request):
+        """
+        Stream CSV report for invoice items of filtered invoices.
+        Use start and end filters in format YYYY-MM to specify period.
+        """
+        invoices = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(tasks.iter_invoice_csv(invoices), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="invoices.csv"'
+        return response
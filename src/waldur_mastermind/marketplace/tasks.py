@@ -80,37 +80,39 @@ def create_pdf_for_all():
         utils.create_order_pdf(order)
 
 
-def filter_aggregate_by_scope(queryset, scope):
-    scope_path = None
+USAGE_SCOPE_PATHS = {
+    structure_models.Project: 'resource__project_id',
+    structure_models.Customer: 'resource__project__customer_id',
+}
 
-    if isinstance(scope, structure_models.Project):
-        scope_path = 'resource__project'
-
-    if isinstance(scope, structure_models.Customer):
-        scope_path = 'resource__project__customer'
-
-    if scope_path:
-        queryset = queryset.filter(**{scope_path: scope})
 
+def filter_aggregate_by_scope_model(queryset, scope_model):
+    if scope_model == structure_models.Project:
+        # Removed projects are skipped, but their resources are still accounted for customer.
+        queryset = queryset.filter(resource__project__in=structure_models.Project.objects.all())
     return queryset
 
 
-def aggregate_reported_usage(start, end, scope):
+def aggregate_reported_usage(start, end, scope_model):
+    """ Sum reported usage for all scopes of given model grouped by scope and category component. """
+    scope_path = USAGE_SCOPE_PATHS[scope_model]
     queryset = models.ComponentUsage.objects \
         .filter(date__gte=start, date__lte=end) \
         .exclude(component__parent=None)
 
-    queryset = filter_aggregate_by_scope(queryset, scope)
+    queryset = filter_aggregate_by_scope_model(queryset, scope_model)
 
-    queryset = queryset.values('component__parent_id').annotate(total=Sum('usage'))
+    queryset = queryset.values(scope_path, 'component__parent_id').annotate(total=Sum('usage')).order_by()
 
     return {
-        row['component__parent_id']: row['total']
+        (row[scope_path], row['component__parent_id']): row['total']
         for row in queryset
     }
 
 
-def aggregate_fixed_usage(start, end, scope):
+def aggregate_fixed_usage(start, end, scope_model):
+    """ Sum fixed usage for all scopes of given model grouped by scope and category component. """
+    scope_path = USAGE_SCOPE_PATHS[scope_model]
     queryset = models.ResourcePlanPeriod.objects.filter(
         # Resource has been active during billing period
         Q(start__gte=start, end__lte=end) |
@@ -119,51 +121,68 @@ def aggregate_fixed_usage(start, end, scope):
         # Resource has been launched in previous billing period and stopped in current
         Q(end__gte=start, end__lte=end)
     )
-    queryset = filter_aggregate_by_scope(queryset, scope)
 
-    queryset = queryset.values('plan__components__component__parent_id') \
-        .annotate(total=Sum('plan__components__amount'))
+    queryset = filter_aggregate_by_scope_model(queryset, scope_model)
+
+    queryset = queryset.values(scope_path, 'plan__components__component__parent_id') \
+        .annotate(total=Sum('plan__components__amount')).order_by()
 
     return {
-        row['plan__components__component__parent_id']: row['total']
+        (row[scope_path], row['plan__components__component__parent_id']): row['total']
         for row in queryset
+        # OfferingComponent.parent can be None.
+        if row['plan__components__component__parent_id'] is not None
     }
 
 
-def calculate_usage_for_scope(start, end, scope):
-    reported_usage = aggregate_reported_usage(start, end, scope)
-    fixed_usage = aggregate_fixed_usage(start, end, scope)
-    # It needs to cover a case when a key is None because OfferingComponent.parent can be None.
-    fixed_usage.pop(None, None)
-    components = set(reported_usage.keys()) | set(fixed_usage.keys())
-    content_type = ContentType.objects.get_for_model(scope)
+def calculate_usage_for_scope_model(start, end, scope_model):
+    """
+    Calculate usage of category components for all scopes of given model
+    using fixed number of queries regardless of number of scopes.
+    """
+    reported_usage = aggregate_reported_usage(start, end, scope_model)
+    fixed_usage = aggregate_fixed_usage(start, end, scope_model)
+    keys = set(reported_usage.keys()) | set(fixed_usage.keys())
+    content_type = ContentType.objects.get_for_model(scope_model)
 
-    for component_id in components:
-        models.CategoryComponentUsage.objects.update_or_create(
-            content_type=content_type,
-            object_id=scope.id,
-            component_id=component_id,
-            date=start,
-            defaults={
-                'reported_usage': reported_usage.get(component_id),
-                'fixed_usage': fixed_usage.get(component_id),
-            }
-        )
+    existing_usages = {
+        (usage.object_id, usage.component_id): usage
+        for usage in models.CategoryComponentUsage.objects.filter(content_type=content_type, date=start)
+    }
+    new_usages = []
+    changed_usages = []
+
+    for key in keys:
+        object_id, component_id = key
+        reported = reported_usage.get(key)
+        fixed = fixed_usage.get(key)
+        usage = existing_usages.get(key)
+        if usage is None:
+            new_usages.append(models.CategoryComponentUsage(
+                content_type=content_type,
+                object_id=object_id,
+                component_id=component_id,
+                date=start,
+                reported_usage=reported,
+                fixed_usage=fixed,
+            ))
+        elif usage.reported_usage != reported or usage.fixed_usage != fixed:
+            usage.reported_usage = reported
+            usage.fixed_usage = fixed
+            changed_usages.append(usage)
+
+    with transaction.atomic():
+        models.CategoryComponentUsage.objects.bulk_create(new_usages)
+        models.CategoryComponentUsage.objects.bulk_update(changed_usages, ['reported_usage', 'fixed_usage'])
 
 
 @shared_task(name='waldur_mastermind.marketplace.calculate_usage_for_current_month')
 def calculate_usage_for_current_month():
     start = invoice_utils.get_current_month_start()
     end = invoice_utils.get_current_month_end()
-    scopes = []
-
-    for customer in structure_models.Customer.objects.all():
-        scopes.append(customer)
-        for project in customer.projects.all():
-            scopes.append(project)
 
-    for scope in scopes:
-        calculate_usage_for_scope(start, end, scope)
+    for scope_model in (structure_models.Customer, structure_models.Project):
+        calculate_usage_for_scope_model(start, end, scope_model)
 
 
 @shared_task(name='waldur_mastermind.marketplace.send_notifications_about_usages')
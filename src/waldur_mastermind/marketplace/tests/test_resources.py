@@ -1,10 +1,11 @@
 from ddt import data, ddt
 from unittest import mock
-from rest_framework import status, test
+from django.contrib.contenttypes.models import ContentType
+from rest_framework import serializers as rest_serializers, status, test
 
 from waldur_core.core import utils as core_utils
 from waldur_core.structure import models as structure_models
-from waldur_core.structure.tests import fixtures
+from waldur_core.structure.tests import factories as structure_factories, fixtures
 from waldur_core.structure.tests.factories import UserFactory
 from waldur_mastermind.support.tests.base import override_support_settings
 
@@ -668,3 +669,27 @@ class ResourceUpdateLimitsTest(test.APITransactionTestCase):
         utils.process_order_item(order_item, self.fixture.staff)
         self.resource.refresh_from_db()
         self.assertEqual(self.resource.limits['vcpu'], 10)
+
+
+class MarketplaceResourceFieldsTest(test.APITransactionTestCase):
+    def setUp(self):
+        self.instances = structure_factories.TestNewInstanceFactory.create_batch(3)
+        self.resources = [factories.ResourceFactory(scope=instance) for instance in self.instances]
+        ContentType.objects.get_for_model(self.instances[0])
+
+    def test_marketplace_resources_of_listed_scopes_are_fetched_using_single_query(self):
+        serializer = rest_serializers.Serializer(self.instances, many=True)
+
+        with self.assertNumQueries(1):
+            resource_uuids = [utils.get_marketplace_resource_uuid(serializer.child, instance)
+                              for instance in self.instances]
+            offering_names = [utils.get_marketplace_offering_name(serializer.child, instance)
+                              for instance in self.instances]
+
+        self.assertEqual(resource_uuids, [resource.uuid for resource in self.resources])
+        self.assertEqual(offering_names, [resource.offering.name for resource in self.resources])
+
+    def test_none_is_returned_if_scope_does_not_have_marketplace_resource(self):
+        instance = structure_factories.TestNewInstanceFactory()
+        serializer = rest_serializers.Serializer(instance)
+        self.assertIsNone(utils.get_marketplace_resource_uuid(serializer, instance))
@@ -27,7 +27,7 @@ class CalculateUsageForCurrentMonthTest(test.APITransactionTestCase):
             plan=plan,
             start=datetime.datetime.now()
         )
-        models.ComponentUsage.objects.create(
+        self.component_usage = models.ComponentUsage.objects.create(
             resource=resource,
             component=self.offering_component,
             usage=10,
@@ -46,6 +46,16 @@ class CalculateUsageForCurrentMonthTest(test.APITransactionTestCase):
         tasks.calculate_usage_for_current_month()
         self.assertEqual(models.CategoryComponentUsage.objects.count(), 0)
 
+    def test_existing_usage_is_updated(self):
+        tasks.calculate_usage_for_current_month()
+        self.component_usage.usage = 20
+        self.component_usage.save()
+
+        tasks.calculate_usage_for_current_month()
+
+        self.assertEqual(models.CategoryComponentUsage.objects.count(), 2)
+        self.assertEqual(set(models.CategoryComponentUsage.objects.values_list('reported_usage', flat=True)), {20})
+
 
 class NotificationTest(test.APITransactionTestCase):
     def test_notify_about_resource_change(self):
@@ -1,13 +1,15 @@
 import base64
+from collections import defaultdict
 from io import BytesIO
 import os
 
-from django.core.exceptions import ObjectDoesNotExist
 import pdfkit
 from PIL import Image
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage as storage
+from django.db.models import Q, QuerySet
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
@@ -267,62 +269,91 @@ def get_resource_state(state):
     return mapping.get(state, DstStates.ERRED)
 
 
-def get_marketplace_offering_uuid(serializer, scope):
-    try:
-        return models.Resource.objects.get(scope=scope).offering.uuid
-    except ObjectDoesNotExist:
+def get_marketplace_resource(serializer, scope):
+    """
+    Get marketplace resource of scope using cache stored in serializer context.
+
+    When scope is rendered as a part of list, marketplace resources of all
+    listed scopes are fetched using single query, so that each marketplace
+    field does not issue its own query.
+    """
+    resources = serializer.context.setdefault('marketplace_resources', {})
+    key = (ContentType.objects.get_for_model(scope).id, scope.id)
+    if key not in resources:
+        scopes = serializer.root.instance
+        if not isinstance(scopes, (list, tuple, QuerySet)) or scope not in scopes:
+            scopes = [scope]
+        prefetch_marketplace_resources(scopes, resources)
+    return resources.get(key)
+
+
+def prefetch_marketplace_resources(scopes, resources):
+    object_ids = defaultdict(set)
+    for scope in scopes:
+        content_type = ContentType.objects.get_for_model(scope)
+        if (content_type.id, scope.id) not in resources:
+            object_ids[content_type.id].add(scope.id)
+
+    if not object_ids:
         return
 
+    query = Q()
+    for content_type_id, ids in object_ids.items():
+        query |= Q(content_type_id=content_type_id, object_id__in=ids)
+        for object_id in ids:
+            resources[(content_type_id, object_id)] = None
+
+    queryset = models.Resource.objects.filter(query).select_related('offering', 'offering__category', 'plan')
+    for resource in queryset:
+        resources[(resource.content_type_id, resource.object_id)] = resource
+
+
+def get_marketplace_offering_uuid(serializer, scope):
+    resource = get_marketplace_resource(serializer, scope)
+    if resource:
+        return resource.offering.uuid
+
 
 def get_marketplace_offering_name(serializer, scope):
-    try:
-        return models.Resource.objects.get(scope=scope).offering.name
-    except ObjectDoesNotExist:
-        return
+    resource = get_marketplace_resource(serializer, scope)
+    if resource:
+        return resource.offering.name
 
 
 def get_marketplace_category_uuid(serializer, scope):
-    try:
-        return models.Resource.objects.get(scope=scope).offering.category.uuid
-    except ObjectDoesNotExist:
-        return
+    resource = get_marketplace_resource(serializer, scope)
+    if resource:
+        return resource.offering.category.uuid
 
 
 def get_marketplace_category_name(serializer, scope):
-    try:
-        return models.Resource.objects.get(scope=scope).offering.category.title
-    except ObjectDoesNotExist:
-        return
+    resource = get_marketplace_resource(serializer, scope)
+    if resource:
+        return resource.offering.category.title
 
 
 def get_marketplace_resource_uuid(serializer, scope):
-    try:
-        return models.Resource.objects.get(scope=scope).uuid
-    except ObjectDoesNotExist:
-        return
+    resource = get_marketplace_resource(serializer, scope)
+    if resource:
+        return resource.uuid
 
 
 def get_marketplace_plan_uuid(serializer, scope):
-    try:
-        resource = models.Resource.objects.get(scope=scope)
-        if resource.plan:
-            return resource.plan.uuid
-    except ObjectDoesNotExist:
-        return
+    resource = get_marketplace_resource(serializer, scope)
+    if resource and resource.plan:
+        return resource.plan.uuid
 
 
 def get_marketplace_resource_state(serializer, scope):
-    try:
-        return models.Resource.objects.get(scope=scope).get_state_display()
-    except ObjectDoesNotExist:
-        return
+    resource = get_marketplace_resource(serializer, scope)
+    if resource:
+        return resource.get_state_display()
 
 
 def get_is_usage_based(serializer, scope):
-    try:
-        return models.Resource.objects.get(scope=scope).offering.is_usage_based
-    except ObjectDoesNotExist:
-        return
+    resource = get_marketplace_resource(serializer, scope)
+    if resource:
+        return resource.offering.is_usage_based
 
 
 def add_marketplace_offering(sender, fields, **kwargs):
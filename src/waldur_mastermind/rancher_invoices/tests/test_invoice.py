@@ -2,6 +2,7 @@ import copy
 import datetime
 from unittest import mock
 
+from django.test import override_settings
 from freezegun import freeze_time
 from rest_framework import test
 
@@ -109,7 +110,8 @@ class InvoiceTest(test.APITransactionTestCase):
             resource=self.resource,
             plan=self.plan,
         )
-        invoices_tasks.create_monthly_invoices()
+        with override_settings(task_always_eager=True):
+            invoices_tasks.create_monthly_invoices()
         tasks.update_nodes(self.cluster.id)
 
     @freeze_time('2019-01-01')
@@ -3,6 +3,7 @@ from decimal import Decimal
 
 from ddt import data, ddt
 from django.db.models import Q
+from django.test import override_settings
 from django.utils import timezone
 from freezegun import freeze_time
 from rest_framework import test
@@ -191,7 +192,8 @@ class UsagesTest(InvoicesBaseTest):
             self._create_usage(usage=10, recurring=True)
 
         with freeze_time('2018-02-01'):
-            create_monthly_invoices()
+            with override_settings(task_always_eager=True):
+                create_monthly_invoices()
             invoice = invoices_models.Invoice.objects.get(customer=self.fixture.customer, month=2, year=2018)
             self.assertEqual(marketplace_models.ComponentUsage.objects.count(), 2)
             self.assertEqual(invoice.price, self.fixture.plan_component_cpu.price * 10)
@@ -1,18 +1,21 @@
+from collections import defaultdict
 import logging
 import re
 
 from cinderclient import exceptions as cinder_exceptions
 from cinderclient.v2.contrib import list_extensions
 from django.db import transaction, IntegrityError
+from django.db.models import Q
 from django.utils import timezone, dateparse
 from django.utils.functional import cached_property
 from keystoneclient import exceptions as keystone_exceptions
 from neutronclient.client import exceptions as neutron_exceptions
 from novaclient import exceptions as nova_exceptions
 
+from waldur_core.quotas.batch import batch_quota_changes
 from waldur_core.structure import log_backend_action
 from waldur_core.structure.utils import (
-    update_pulled_fields, handle_resource_not_found, handle_resource_update_success)
+    update_pulled_fields, sync_pulled_resources, sync_service_properties)
 from waldur_openstack.openstack_base.backend import BaseOpenStackBackend, OpenStackBackendError
 
 from . import models
@@ -194,59 +197,39 @@ class OpenStackTenantBackend(BaseOpenStackBackend):
             service_project_link__service__settings=self.settings,
             state__in=[models.Volume.States.OK, models.Volume.States.ERRED]
         )
-        backend_volumes_map = {backend_volume.backend_id: backend_volume for backend_volume in backend_volumes}
-        for volume in volumes:
-            try:
-                backend_volume = backend_volumes_map[volume.backend_id]
-            except KeyError:
-                handle_resource_not_found(volume)
-            else:
-                update_pulled_fields(volume, backend_volume, models.Volume.get_backend_fields())
-                handle_resource_update_success(volume)
+        fields = models.Volume.get_backend_fields()
+        sync_pulled_resources(volumes, backend_volumes, lambda volume, backend_volume: fields)
 
     def pull_snapshots(self):
         backend_snapshots = self.get_snapshots()
         snapshots = models.Snapshot.objects.filter(
             service_project_link__service__settings=self.settings,
             state__in=[models.Snapshot.States.OK, models.Snapshot.States.ERRED])
-        backend_snapshots_map = {backend_snapshot.backend_id: backend_snapshot
-                                 for backend_snapshot in backend_snapshots}
-        for snapshot in snapshots:
-            try:
-                backend_snapshot = backend_snapshots_map[snapshot.backend_id]
-            except KeyError:
-                handle_resource_not_found(snapshot)
-            else:
-                update_pulled_fields(snapshot, backend_snapshot, models.Snapshot.get_backend_fields())
-                handle_resource_update_success(snapshot)
+        fields = models.Snapshot.get_backend_fields()
+        sync_pulled_resources(snapshots, backend_snapshots, lambda snapshot, backend_snapshot: fields)
 
     def pull_instances(self):
         backend_instances = self.get_instances()
-        instances = models.Instance.objects.filter(
+        instances = list(models.Instance.objects.filter(
             service_project_link__service__settings=self.settings,
             state__in=[models.Instance.States.OK, models.Instance.States.ERRED],
-        )
-        backend_instances_map = {backend_instance.backend_id: backend_instance
-                                 for backend_instance in backend_instances}
-        for instance in instances:
-            try:
-                backend_instance = backend_instances_map[instance.backend_id]
-            except KeyError:
-                handle_resource_not_found(instance)
-            else:
-                self.update_instance_fields(instance, backend_instance)
-                # XXX: can be optimized after https://goo.gl/BZKo8Y will be resolved.
-                self.pull_instance_security_groups(instance)
-                handle_resource_update_success(instance)
+        ).prefetch_related('security_groups'))
+        sync_pulled_resources(instances, backend_instances, self.get_instance_fields)
 
-    def update_instance_fields(self, instance, backend_instance):
+        backend_ids = set(backend_instance.backend_id for backend_instance in backend_instances)
+        self.pull_instances_security_groups([instance for instance in instances
+                                             if instance.backend_id in backend_ids])
+
+    def get_instance_fields(self, instance, backend_instance):
         # Preserve flavor fields in Waldur database if flavor is deleted in OpenStack
         fields = set(models.Instance.get_backend_fields())
         flavor_fields = {'flavor_name', 'flavor_disk', 'ram', 'cores', 'disk'}
         if not backend_instance.flavor_name:
             fields = fields - flavor_fields
-        fields = list(fields)
+        return list(fields)
 
+    def update_instance_fields(self, instance, backend_instance):
+        fields = self.get_instance_fields(instance, backend_instance)
         update_pulled_fields(instance, backend_instance, fields)
 
     def pull_flavors(self):
@@ -258,26 +241,21 @@ class OpenStackTenantBackend(BaseOpenStackBackend):
 
         flavor_exclude_regex = self.settings.options.get('flavor_exclude_regex', '')
         name_pattern = re.compile(flavor_exclude_regex) if flavor_exclude_regex else None
-        with transaction.atomic():
-            cur_flavors = self._get_current_properties(models.Flavor)
-            for backend_flavor in flavors:
-                if name_pattern is not None and name_pattern.match(backend_flavor.name) is not None:
-                    logger.debug('Skipping pull of %s flavor as it matches %s regex pattern.',
-                                 backend_flavor.name, flavor_exclude_regex)
-                    continue
+        backend_flavors = {}
+        for backend_flavor in flavors:
+            if name_pattern is not None and name_pattern.match(backend_flavor.name) is not None:
+                logger.debug('Skipping pull of %s flavor as it matches %s regex pattern.',
+                             backend_flavor.name, flavor_exclude_regex)
+                continue
 
-                cur_flavors.pop(backend_flavor.id, None)
-                models.Flavor.objects.update_or_create(
-                    settings=self.settings,
-                    backend_id=backend_flavor.id,
-                    defaults={
-                        'name': backend_flavor.name,
-                        'cores': backend_flavor.vcpus,
-                        'ram': backend_flavor.ram,
-                        'disk': self.gb2mb(backend_flavor.disk),
-                    })
+            backend_flavors[backend_flavor.id] = {
+                'name': backend_flavor.name,
+                'cores': backend_flavor.vcpus,
+                'ram': backend_flavor.ram,
+                'disk': self.gb2mb(backend_flavor.disk),
+            }
 
-            models.Flavor.objects.filter(backend_id__in=cur_flavors.keys(), settings=self.settings).delete()
+        sync_service_properties(models.Flavor, self.settings, backend_flavors)
 
     def pull_images(self):
         self._pull_images(models.Image)
@@ -405,6 +383,7 @@ class OpenStackTenantBackend(BaseOpenStackBackend):
         except neutron_exceptions.NeutronClientException as e:
             raise OpenStackBackendError(e)
 
+        backend_networks = {}
         for backend_network in networks:
             defaults = {
                 'name': backend_network['name'],
@@ -414,7 +393,19 @@ class OpenStackTenantBackend(BaseOpenStackBackend):
                 defaults['type'] = backend_network['provider:network_type']
             if backend_network.get('provider:segmentation_id'):
                 defaults['segmentation_id'] = backend_network['provider:segmentation_id']
-            backend_id = backend_network['id']
+            backend_networks[backend_network['id']] = defaults
+
+        # Network could be created by concurrent pull. In this case synchronization
+        # is retried once against current networks, then networks are pulled one by one.
+        for attempt in range(2):
+            try:
+                sync_service_properties(models.Network, self.settings, backend_networks)
+                return
+            except IntegrityError:
+                logger.warning('Could not synchronize networks for service settings %s '
+                               'due to concurrent update, attempt %s.', self.settings, attempt + 1)
+
+        for backend_id, defaults in backend_networks.items():
             try:
                 models.Network.objects.update_or_create(
                     settings=self.settings,
@@ -1438,6 +1429,57 @@ class OpenStackTenantBackend(BaseOpenStackBackend):
             else:
                 instance.security_groups.add(security_group)
 
+    def pull_instances_security_groups(self, instances):
+        """
+        Pull security groups of all instances using single request to Neutron.
+        Security groups of instance are security groups of its ports.
+        """
+        if not instances:
+            return
+
+        neutron = self.neutron_client
+        try:
+            ports = neutron.list_ports(tenant_id=self.tenant_id)['ports']
+        except neutron_exceptions.NeutronClientException as e:
+            raise OpenStackBackendError(e)
+
+        backend_groups = defaultdict(set)
+        for port in ports:
+            backend_groups[port['device_id']].update(port.get('security_groups', []))
+
+        security_groups = {
+            security_group.backend_id: security_group
+            for security_group in models.SecurityGroup.objects.filter(settings=self.settings)
+        }
+
+        through_model = models.Instance.security_groups.through
+        stale_links = []
+        missing_links = []
+        for instance in instances:
+            backend_ids = backend_groups[instance.backend_id]
+            current_groups = {group.backend_id: group for group in instance.security_groups.all()
+                              if group.backend_id}
+
+            for backend_id in set(current_groups) - backend_ids:
+                stale_links.append((instance.id, current_groups[backend_id].id))
+
+            for backend_id in backend_ids - set(current_groups):
+                security_group = security_groups.get(backend_id)
+                if security_group is None:
+                    logger.warning('Security group with id %s does not exist at Waldur. '
+                                   'Settings ID: %s', backend_id, self.settings.id)
+                    continue
+                missing_links.append(through_model(instance_id=instance.id, securitygroup_id=security_group.id))
+
+        with transaction.atomic():
+            if stale_links:
+                query = Q()
+                for instance_id, security_group_id in stale_links:
+                    query |= Q(instance_id=instance_id, securitygroup_id=security_group_id)
+                through_model.objects.filter(query).delete()
+            if missing_links:
+                through_model.objects.bulk_create(missing_links)
+
     @log_backend_action()
     def push_instance_security_groups(self, instance):
         nova = self.nova_client
@@ -1481,9 +1523,10 @@ class OpenStackTenantBackend(BaseOpenStackBackend):
             logger.info('OpenStack instance %s is already deleted', instance.backend_id)
         except nova_exceptions.ClientException as e:
             raise OpenStackBackendError(e)
-        instance.decrease_backend_quotas_usage()
-        for volume in instance.volumes.all():
-            volume.decrease_backend_quotas_usage()
+        with batch_quota_changes():
+            instance.decrease_backend_quotas_usage()
+            for volume in instance.volumes.all():
+                volume.decrease_backend_quotas_usage()
 
     @log_backend_action('check is instance deleted')
     def is_instance_deleted(self, instance):
@@ -16,6 +16,7 @@ from waldur_core.core import (serializers as core_serializers,
                               utils as core_utils,
                               signals as core_signals)
 from waldur_core.quotas import serializers as quotas_serializers
+from waldur_core.quotas.batch import batch_quota_changes
 from waldur_core.structure import serializers as structure_serializers, SupportedServices
 from waldur_core.structure import models as structure_models
 from waldur_core.structure.permissions import _has_admin_access
@@ -1122,8 +1123,9 @@ class InstanceSerializer(structure_serializers.VirtualMachineSerializer):
             )
             volumes.append(data_volume)
 
-        for volume in volumes:
-            volume.increase_backend_quotas_usage()
+        with batch_quota_changes():
+            for volume in volumes:
+                volume.increase_backend_quotas_usage()
 
         instance.volumes.add(*volumes)
         return instance
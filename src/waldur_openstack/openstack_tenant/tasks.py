@@ -154,9 +154,6 @@ class BaseScheduleTask(core_tasks.BackgroundTask):
     model = NotImplemented
     resource_attribute = NotImplemented
 
-    def is_equal(self, other_task):
-        return self.name == other_task.get('name')
-
     @transaction.atomic()
     def run(self):
         schedules = self.model.objects.filter(is_active=True, next_trigger_at__lt=timezone.now())
@@ -273,9 +270,6 @@ class ScheduleBackups(BaseScheduleTask):
 class BaseDeleteExpiredResourcesTask(core_tasks.BackgroundTask):
     model = NotImplemented
 
-    def is_equal(self, other_task):
-        return self.name == other_task.get('name')
-
     def _get_executor(self):
         raise NotImplementedError()
 
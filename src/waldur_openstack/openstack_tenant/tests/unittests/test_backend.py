@@ -1,12 +1,14 @@
 import uuid
 
 from ddt import data, ddt
+from django.db import IntegrityError
 from django.test import TestCase
 from cinderclient.v2.volumes import Volume
 from novaclient.v2.servers import Server
 from novaclient.v2.flavors import Flavor
 from unittest import mock
 
+from waldur_openstack.openstack_tenant import backend as backend_module
 from waldur_openstack.openstack_tenant.backend import OpenStackTenantBackend
 from waldur_openstack.openstack_tenant import models
 
@@ -344,6 +346,35 @@ class PullNetworksTest(BaseBackendTest):
         network.refresh_from_db()
         self.assertEqual(network.name, 'Private')
 
+    def test_synchronization_is_retried_after_concurrent_update(self):
+        stale_network = factories.NetworkFactory(settings=self.settings)
+        sync_service_properties = backend_module.sync_service_properties
+        attempts = []
+
+        def sync(model, settings, backend_properties):
+            attempts.append(model)
+            if len(attempts) == 1:
+                # Concurrent pull has created network after current networks have been read.
+                factories.NetworkFactory(settings=self.settings, backend_id='backend_id', name='Old name')
+                raise IntegrityError
+            sync_service_properties(model, settings, backend_properties)
+
+        with mock.patch.object(backend_module, 'sync_service_properties', side_effect=sync):
+            self.tenant_backend.pull_networks()
+
+        self.assertEqual(len(attempts), 2)
+        self.assertFalse(models.Network.objects.filter(id=stale_network.id).exists())
+        self.assertEqual(models.Network.objects.get(settings=self.settings, backend_id='backend_id').name, 'Private')
+
+    @mock.patch('waldur_openstack.openstack_tenant.backend.sync_service_properties', side_effect=IntegrityError)
+    def test_networks_are_pulled_one_by_one_if_synchronization_fails(self, sync_mock):
+        stale_network = factories.NetworkFactory(settings=self.settings)
+
+        self.tenant_backend.pull_networks()
+
+        self.assertFalse(models.Network.objects.filter(id=stale_network.id).exists())
+        self.assertEqual(models.Network.objects.get(settings=self.settings, backend_id='backend_id').name, 'Private')
+
 
 class PullSubnetsTest(BaseBackendTest):
 
@@ -1263,3 +1294,83 @@ class CreateInstanceTest(VolumesBaseTest):
         # Assert
         kwargs = self.nova_client_mock.servers.create.mock_calls[0][2]
         self.assertEqual(kwargs['availability_zone'], 'default_availability_zone')
+
+
+class PullVolumesTest(BaseBackendTest):
+    def setUp(self):
+        super(PullVolumesTest, self).setUp()
+        self.volume = factories.VolumeFactory(
+            service_project_link=self.fixture.spl,
+            state=models.Volume.States.OK,
+        )
+
+    def test_missing_volume_is_marked_as_erred(self):
+        self.cinder_client_mock.volumes.list.return_value = []
+        self.tenant_backend.pull_volumes()
+
+        self.volume.refresh_from_db()
+        self.assertEqual(self.volume.state, models.Volume.States.ERRED)
+        self.assertEqual(self.volume.error_message, 'Does not exist at backend.')
+
+    def test_erred_volume_is_updated_and_recovered(self):
+        self.volume.state = models.Volume.States.ERRED
+        self.volume.error_message = 'Does not exist at backend.'
+        self.volume.save()
+        self.cinder_client_mock.volumes.list.return_value = [self._get_valid_volume(self.volume.backend_id)]
+
+        self.tenant_backend.pull_volumes()
+
+        self.volume.refresh_from_db()
+        self.assertEqual(self.volume.state, models.Volume.States.OK)
+        self.assertEqual(self.volume.error_message, '')
+        self.assertEqual(self.volume.name, 'volume-%s' % self.volume.backend_id)
+
+
+class PullInstancesTest(BaseBackendTest):
+    def setUp(self):
+        super(PullInstancesTest, self).setUp()
+        self.instance = factories.InstanceFactory(
+            service_project_link=self.fixture.spl,
+            state=models.Instance.States.OK,
+        )
+        self.nova_client_mock.servers.list.return_value = [self._get_valid_instance(self.instance.backend_id)]
+        self.nova_client_mock.flavors.get.return_value = self._get_valid_flavor(self.instance.backend_id)
+        self.neutron_client_mock.list_ports.return_value = {'ports': []}
+
+    def test_instance_fields_are_updated(self):
+        self.tenant_backend.pull_instances()
+
+        self.instance.refresh_from_db()
+        self.assertEqual(self.instance.name, 'server-%s' % self.instance.backend_id)
+        self.assertEqual(self.instance.runtime_state, 'ACTIVE')
+
+    def test_security_groups_are_pulled_from_ports(self):
+        stale_group = factories.SecurityGroupFactory(settings=self.settings)
+        missing_group = factories.SecurityGroupFactory(settings=self.settings)
+        self.instance.security_groups.add(stale_group)
+        self.neutron_client_mock.list_ports.return_value = {'ports': [{
+            'device_id': self.instance.backend_id,
+            'security_groups': [missing_group.backend_id],
+        }]}
+
+        self.tenant_backend.pull_instances()
+
+        self.assertEqual(list(self.instance.security_groups.all()), [missing_group])
+        self.nova_client_mock.servers.list_security_group.assert_not_called()
+
+
+class PullFlavorsTest(BaseBackendTest):
+    def test_flavors_are_synchronized(self):
+        stale_flavor = factories.FlavorFactory(settings=self.settings, backend_id='stale')
+        existing_flavor = factories.FlavorFactory(settings=self.settings, backend_id='existing', cores=1)
+        self.nova_client_mock.flavors.findall.return_value = [
+            self._get_valid_flavor('existing'),
+            self._get_valid_flavor('new'),
+        ]
+
+        self.tenant_backend.pull_flavors()
+
+        existing_flavor.refresh_from_db()
+        self.assertEqual(existing_flavor.cores, 2)
+        self.assertTrue(models.Flavor.objects.filter(settings=self.settings, backend_id='new').exists())
+        self.assertFalse(models.Flavor.objects.filter(id=stale_flavor.id).exists())
@@ -26,9 +26,6 @@ class DebitCustomers(PaypalTaskMixin, core_tasks.BackgroundTask):
     """
     name = 'waldur_paypal.DebitCustomers'
 
-    def is_equal(self, other_task, *args, **kwargs):
-        return self.name == other_task.get('name')
-
     def run(self):
         date = datetime.now() - timedelta(days=1)
         start_date = date.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -55,9 +52,6 @@ class DebitCustomers(PaypalTaskMixin, core_tasks.BackgroundTask):
 class PaymentsCleanUp(PaypalTaskMixin, core_tasks.BackgroundTask):
     name = 'waldur_paypal.PaymentsCleanUp'
 
-    def is_equal(self, other_task, *args, **kwargs):
-        return self.name == other_task.get('name')
-
     def run(self):
         timespan = settings.WALDUR_PAYPAL.get('STALE_PAYMENTS_LIFETIME', timedelta(weeks=1))
         models.Payment.objects.filter(state=models.Payment.States.CREATED, created__lte=timezone.now() - timespan).delete()
@@ -66,9 +60,6 @@ class PaymentsCleanUp(PaypalTaskMixin, core_tasks.BackgroundTask):
 class SendInvoices(PaypalTaskMixin, core_tasks.BackgroundTask):
     name = 'waldur_paypal.SendInvoices'
 
-    def is_equal(self, other_task, *args, **kwargs):
-        return self.name == other_task.get('name')
-
     def run(self):
         new_invoices = models.Invoice.objects.filter(backend_id='')
 
@@ -167,25 +167,17 @@ def validate_flavor(flavor, roles, tenant_settings, cpu=None, memory=None):
 
 
 def validate_quotas(nodes, tenant_spl):
-    quota_sources = [
-        tenant_spl,
-        tenant_spl.project,
-        tenant_spl.customer,
-        tenant_spl.service,
-        tenant_spl.service.settings
-    ]
-    for quota_name in ['storage', 'vcpu', 'ram']:
-        requested = sum(get_node_quota(quota_name, node) for node in nodes)
-
-        for source in quota_sources:
-            try:
-                quota = source.quotas.get(name=quota_name)
-                if quota.limit != -1 and (quota.usage + requested > quota.limit):
-                    raise quotas_exceptions.QuotaValidationError(
-                        _('"%(name)s" quota is over limit. Required: %(usage)s, limit: %(limit)s.') % dict(
-                            name=quota_name, usage=quota.usage + requested, limit=quota.limit))
-            except ObjectDoesNotExist:
-                pass
+    # Service project link ancestors are project, customer, service and service settings.
+    quota_deltas = {
+        quota_name: sum(get_node_quota(quota_name, node) for node in nodes)
+        for quota_name in ['storage', 'vcpu', 'ram']
+    }
+    violations = tenant_spl.get_quota_violations(quota_deltas)
+    for scope_violations in violations.values():
+        for violation in scope_violations:
+            raise quotas_exceptions.QuotaValidationError(
+                _('"%(name)s" quota is over limit. Required: %(usage)s, limit: %(limit)s.') % dict(
+                    name=violation.name, usage=violation.usage + violation.delta, limit=violation.limit))
 
 
 def get_node_quota(quota_name, node):
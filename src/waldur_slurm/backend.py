@@ -75,10 +75,12 @@ class SlurmBackend(ServiceBackend):
             for profile in freeipa_models.Profile.objects.all()
         }
 
+        usernames = []
         for user in allocation.service_project_link.project.customer.get_users():
             username = freeipa_profiles.get(user)
             if username:
-                self.add_user(allocation, username.lower())
+                usernames.append(username.lower())
+        self.add_users(allocation, usernames)
 
     def delete_allocation(self, allocation):
         account = self.get_allocation_name(allocation)
@@ -101,6 +103,19 @@ class SlurmBackend(ServiceBackend):
         if not self.client.get_association(username, account):
             self.client.create_association(username, account, default_account)
 
+    def add_users(self, allocation, usernames):
+        """
+        Create missing associations between users and SLURM account.
+        Existing associations are checked in single round trip and missing ones are created in another one.
+        """
+        account = self.get_allocation_name(allocation)
+        default_account = self.settings.options.get('default_account')
+        pairs = [(username, account) for username in usernames]
+        associations = self.client.get_associations(pairs)
+        missing_pairs = [pair for pair, association in zip(pairs, associations) if not association]
+        if missing_pairs:
+            self.client.create_associations(missing_pairs, default_account)
+
     def delete_user(self, allocation, username):
         """
         Delete association between user and SLURM account if it exists.
@@ -1,9 +1,9 @@
 import abc
 import logging
-import subprocess  # nosec
 
 from django.utils.functional import cached_property
 
+from .session import get_session, SessionError, SSHSession
 from .structures import Quotas
 
 
@@ -15,6 +15,7 @@ class BatchError(Exception):
 
 
 class BaseBatchClient(metaclass=abc.ABCMeta):
+    session_class = SSHSession
 
     def __init__(self, hostname, key_path, username='root', port=22, use_sudo=False):
         self.hostname = hostname
@@ -111,30 +112,41 @@ class BaseBatchClient(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError()
 
+    def get_associations(self, pairs):
+        """
+        Get associations of several users and accounts.
+        :param pairs: list[(user name, account name)]
+        :return: list[structures.Association object or None]
+        """
+        return [self.get_association(user, account) for user, account in pairs]
+
+    def create_associations(self, pairs, default_account=None):
+        """
+        Create associations of several users and accounts.
+        :param pairs: list[(user name, account name)]
+        :param default_account: [string] default account name. Optional.
+        :return: None
+        """
+        for username, account in pairs:
+            self.create_association(username, account, default_account)
+
+    @property
+    def session(self):
+        return get_session(self.session_class, self.hostname, self.key_path,
+                           self.username, self.port, self.use_sudo)
+
     def execute_command(self, command):
-        server = '%s@%s' % (self.username, self.hostname)
-        port = str(self.port)
-        if self.use_sudo:
-            account_command = ['sudo']
-        else:
-            account_command = []
-
-        account_command.extend(command)
-        ssh_command = ['ssh', '-o', 'UserKnownHostsFile=/dev/null', '-o', 'StrictHostKeyChecking=no',
-                       server, '-p', port, '-i', self.key_path, ' '.join(account_command)]
         try:
-            logger.debug('Executing SSH command: %s', ' '.join(ssh_command))
-            return subprocess.check_output(ssh_command,  # nosec
-                                           stderr=subprocess.STDOUT,
-                                           encoding='utf-8')
-        except subprocess.CalledProcessError as e:
-            logger.exception('Failed to execute command "%s".', ssh_command)
-            stdout = e.output or ''
-            lines = stdout.splitlines()
-            if len(lines) > 0 and lines[0].startswith('Warning: Permanently added'):
-                lines = lines[1:]
-            stdout = '\n'.join(lines)
-            raise BatchError(stdout)
+            return self.session.execute(command)
+        except SessionError as e:
+            raise BatchError(str(e))
+
+    def execute_commands(self, commands):
+        """ Execute several commands in single round trip and return list of their outputs. """
+        try:
+            return self.session.execute_many(commands)
+        except SessionError as e:
+            raise BatchError(str(e))
 
 
 class BaseReportLine(metaclass=abc.ABCMeta):
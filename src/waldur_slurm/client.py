@@ -70,9 +70,17 @@ class SlurmClient(BaseBatchClient):
         return self._execute_command(['modify', 'account', account, 'set', quota])
 
     def get_association(self, user, account):
-        output = self._execute_command([
-            'show', 'association', 'where', 'user=%s' % user, 'account=%s' % account
-        ])
+        output = self._execute_command(self._get_association_command(user, account))
+        return self._parse_association_output(output)
+
+    def get_associations(self, pairs):
+        outputs = self._execute_commands([self._get_association_command(user, account) for user, account in pairs])
+        return [self._parse_association_output(output) for output in outputs]
+
+    def _get_association_command(self, user, account):
+        return ['show', 'association', 'where', 'user=%s' % user, 'account=%s' % account]
+
+    def _parse_association_output(self, output):
         lines = [line for line in output.splitlines() if '|' in line]
         if len(lines) == 0:
             return None
@@ -91,9 +99,16 @@ class SlurmClient(BaseBatchClient):
         )
 
     def create_association(self, username, account, default_account=''):
-        return self._execute_command(['add', 'user', username,
-                                      'account=%s' % account,
-                                      'DefaultAccount=%s' % default_account])
+        return self._execute_command(self._create_association_command(username, account, default_account))
+
+    def create_associations(self, pairs, default_account=''):
+        self._execute_commands([
+            self._create_association_command(username, account, default_account)
+            for username, account in pairs
+        ])
+
+    def _create_association_command(self, username, account, default_account):
+        return ['add', 'user', username, 'account=%s' % account, 'DefaultAccount=%s' % default_account]
 
     def delete_association(self, username, account):
         return self._execute_command([
@@ -117,8 +132,14 @@ class SlurmClient(BaseBatchClient):
         return [SlurmReportLine(line) for line in output.splitlines() if '|' in line]
 
     def _execute_command(self, command, command_name='sacctmgr', immediate=True):
+        return self.execute_command(self._format_command(command, command_name, immediate))
+
+    def _execute_commands(self, commands, command_name='sacctmgr', immediate=True):
+        return self.execute_commands([self._format_command(command, command_name, immediate) for command in commands])
+
+    def _format_command(self, command, command_name, immediate):
         account_command = [command_name, '--parsable2', '--noheader']
         if immediate:
             account_command.append('--immediate')
         account_command.extend(command)
-        return self.execute_command(account_command)
+        return account_command
@@ -79,11 +79,17 @@ class MoabClient(BaseBatchClient):
         )
 
     def create_association(self, username, account, default_account=None):
+        return self.execute_command(self._create_association_command(username, account))
+
+    def create_associations(self, pairs, default_account=None):
+        self.execute_commands([self._create_association_command(username, account) for username, account in pairs])
+
+    def _create_association_command(self, username, account):
         command = 'mam-modify-account --add-user %(username)s -a %(account)s' % {
             'username': username,
             'account': account
         }
-        return self.execute_command(command.split())
+        return command.split()
 
     def delete_association(self, username, account):
         command = 'mam-modify-account --del-user %(username)s -a %(account)s' % {
@@ -100,15 +106,17 @@ class MoabClient(BaseBatchClient):
         )
         month_start, month_end = format_current_month()
 
-        report_lines = []
-        for account in accounts:
-            command = template % {
+        commands = [
+            (template % {
                 'account': account,
                 'start': month_start,
                 'end': month_end,
-            }
-            lines = self.execute_command(command.split()).splitlines()
-            for line in lines:
+            }).split()
+            for account in accounts
+        ]
+        report_lines = []
+        for output in self.execute_commands(commands):
+            for line in output.splitlines():
                 if '|' in line:
                     report_lines.append(MoabReportLine(line))
 
@@ -9,6 +9,14 @@ class SlurmExtension(WaldurExtension):
             'PROJECT_PREFIX': 'waldur_project_',
             'ALLOCATION_PREFIX': 'waldur_allocation_',
             'PRIVATE_KEY_PATH': '/etc/waldur/id_rsa',
+            # SSH connection to cluster is multiplexed: it is opened once and reused by subsequent commands.
+            # Control socket path should be short, %C is replaced with hash of connection parameters.
+            'SSH_CONTROL_PATH': '/tmp/waldur-slurm-%C',
+            # Idle connection is closed after given number of seconds.
+            'SSH_CONTROL_PERSIST': 600,
+            'SSH_CONNECT_TIMEOUT': 10,
+            # Command is interrupted and connection is reopened if command takes longer than given number of seconds.
+            'SSH_COMMAND_TIMEOUT': 300,
         }
 
     @staticmethod
@@ -0,0 +1,172 @@
+import logging
+import subprocess  # nosec
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+EXIT_CODE_MARKER = '__WALDUR_EXIT_CODE__'
+
+# Exit code of ssh client if connection to remote host has failed.
+SSH_CONNECTION_ERROR = 255
+
+
+class SessionError(Exception):
+    """ Remote command has failed. Output of command is passed as exception message. """
+    pass
+
+
+class SSHSession:
+    """
+    Long-lived SSH session to batch cluster head node.
+    All commands are sent over single multiplexed connection which is kept open by ssh control master
+    between commands and between processes, so SSH handshake is performed once per cluster.
+    Control master is started by no-op command before remote command is sent, so only connection is retried.
+    Remote command is never retried, because it could have been executed already and it is not idempotent.
+    If connection is lost or command times out, control master is closed and next command reconnects.
+    """
+
+    def __init__(self, hostname, key_path, username='root', port=22, use_sudo=False):
+        self.hostname = hostname
+        self.key_path = key_path
+        self.username = username
+        self.port = port
+        self.use_sudo = use_sudo
+
+    @property
+    def server(self):
+        return '%s@%s' % (self.username, self.hostname)
+
+    def get_ssh_options(self):
+        options = settings.WALDUR_SLURM
+        return [
+            '-o', 'UserKnownHostsFile=/dev/null', '-o', 'StrictHostKeyChecking=no',
+            '-o', 'ControlMaster=auto',
+            '-o', 'ControlPath=%s' % options['SSH_CONTROL_PATH'],
+            '-o', 'ControlPersist=%s' % options['SSH_CONTROL_PERSIST'],
+            '-o', 'ConnectTimeout=%s' % options['SSH_CONNECT_TIMEOUT'],
+            '-o', 'ServerAliveInterval=%s' % options['SSH_CONNECT_TIMEOUT'],
+        ]
+
+    def get_ssh_command(self, remote_command):
+        return ['ssh'] + self.get_ssh_options() + [
+            self.server, '-p', str(self.port), '-i', self.key_path, remote_command]
+
+    def format_command(self, command):
+        if self.use_sudo:
+            command = ['sudo'] + list(command)
+        return ' '.join(command)
+
+    def execute(self, command):
+        """ Execute command and return its output. """
+        return self._run(self.format_command(command))
+
+    def execute_many(self, commands):
+        """
+        Execute several commands in single round trip and return list of their outputs.
+        Execution is stopped on the first failed command.
+        """
+        if not commands:
+            return []
+        script = ' '.join(
+            '%s 2>&1; rc=$?; echo %s$rc; [ $rc -eq 0 ] || exit 0;' % (self.format_command(command), EXIT_CODE_MARKER)
+            for command in commands
+        )
+        output = self._run(script)
+
+        outputs = []
+        lines = []
+        for line in output.splitlines():
+            if not line.startswith(EXIT_CODE_MARKER):
+                lines.append(line)
+                continue
+            command_output = '\n'.join(lines)
+            if line[len(EXIT_CODE_MARKER):] != '0':
+                logger.error('Failed to execute command "%s".', self.format_command(commands[len(outputs)]))
+                raise SessionError(command_output)
+            outputs.append(command_output)
+            lines = []
+        return outputs
+
+    def control(self, operation):
+        """ Send control command to control master, for example, check or exit. """
+        command = ['ssh'] + self.get_ssh_options() + ['-O', operation, '-p', str(self.port), self.server]
+        timeout = settings.WALDUR_SLURM['SSH_CONNECT_TIMEOUT']
+        subprocess.check_output(command, stderr=subprocess.STDOUT, encoding='utf-8', timeout=timeout)  # nosec
+
+    def is_connected(self):
+        try:
+            self.control('check')
+        except (subprocess.SubprocessError, OSError):
+            return False
+        return True
+
+    def connect(self):
+        """ Start control master if it is not running yet. No-op command is used, so it is safe to retry. """
+        if self.is_connected():
+            return
+        timeout = settings.WALDUR_SLURM['SSH_COMMAND_TIMEOUT']
+        for attempt in range(2):
+            try:
+                subprocess.check_output(self.get_ssh_command('true'),  # nosec
+                                        stderr=subprocess.STDOUT,
+                                        encoding='utf-8',
+                                        timeout=timeout)
+                return
+            except (subprocess.SubprocessError, OSError) as e:
+                logger.warning('Unable to connect to %s, attempt %s: %s', self.hostname, attempt + 1, e)
+                self.close()
+        raise SessionError('Unable to connect to %s.' % self.hostname)
+
+    def close(self):
+        """ Stop control master, next command establishes new connection. """
+        try:
+            self.control('exit')
+        except (subprocess.SubprocessError, OSError):
+            # Control master is not running.
+            pass
+
+    def _run(self, remote_command):
+        self.connect()
+        ssh_command = self.get_ssh_command(remote_command)
+        timeout = settings.WALDUR_SLURM['SSH_COMMAND_TIMEOUT']
+        try:
+            logger.debug('Executing SSH command: %s', ' '.join(ssh_command))
+            return subprocess.check_output(ssh_command,  # nosec
+                                           stderr=subprocess.STDOUT,
+                                           encoding='utf-8',
+                                           timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning('SSH command has timed out after %s seconds: %s', timeout, remote_command)
+            self.close()
+            raise SessionError('Command has timed out after %s seconds.' % timeout)
+        except subprocess.CalledProcessError as e:
+            if e.returncode == SSH_CONNECTION_ERROR:
+                logger.warning('SSH connection to %s has failed, it is closed.', self.hostname)
+                self.close()
+            logger.exception('Failed to execute command "%s".', ssh_command)
+            stdout = e.output or ''
+            lines = stdout.splitlines()
+            if len(lines) > 0 and lines[0].startswith('Warning: Permanently added'):
+                lines = lines[1:]
+            raise SessionError('\n'.join(lines))
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(session_class, hostname, key_path, username='root', port=22, use_sudo=False):
+    """ Get session to cluster which is shared by all clients within process. """
+    key = (session_class, hostname, key_path, username, port, use_sudo)
+    with _sessions_lock:
+        if key not in _sessions:
+            _sessions[key] = session_class(hostname, key_path, username, port, use_sudo)
+        return _sessions[key]
+
+
+def clear_sessions():
+    """ Forget sessions of process, control masters are closed by ssh when they become idle. """
+    with _sessions_lock:
+        _sessions.clear()
@@ -0,0 +1,55 @@
+class FakeSlurmSession:
+    """
+    In-memory SLURM cluster which emulates sacctmgr commands issued by SlurmClient.
+    It is used instead of SSH session in tests and counts round trips to the cluster.
+    """
+
+    def __init__(self, hostname, key_path, username='root', port=22, use_sudo=False):
+        self.accounts = {}
+        self.associations = set()
+        self.limits = {}
+        self.commands = []
+        self.round_trips = 0
+
+    def execute(self, command):
+        self.round_trips += 1
+        return self.handle(command)
+
+    def execute_many(self, commands):
+        self.round_trips += 1
+        return [self.handle(command) for command in commands]
+
+    def close(self):
+        pass
+
+    def handle(self, command):
+        self.commands.append(command)
+        if command[0] != 'sacctmgr':
+            return ''
+        args = [arg for arg in command[1:] if not arg.startswith('--')]
+        action, entity, rest = args[0], args[1], args[2:]
+        options = dict(arg.split('=', 1) for arg in rest if '=' in arg)
+
+        if action in ('list', 'show') and entity == 'account':
+            names = rest or sorted(self.accounts)
+            return '\n'.join('%s|%s|%s' % ((name,) + self.accounts[name]) for name in names if name in self.accounts)
+        elif action == 'add' and entity == 'account':
+            self.accounts[rest[0]] = (options['description'].strip('"'), options['organization'].strip('"'))
+        elif action == 'remove' and entity == 'account':
+            self.accounts.pop(options['name'], None)
+        elif action == 'modify' and entity == 'account':
+            self.limits[rest[0]] = options['GrpTRES']
+        elif action == 'show' and entity == 'association':
+            associations = [
+                (user, account) for user, account in sorted(self.associations)
+                if options.get('user', user) == user and options.get('account', account) == account
+            ]
+            return '\n'.join('cluster|%s|%s|||||||' % (account, user) for user, account in associations)
+        elif action == 'add' and entity == 'user':
+            self.associations.add((rest[0], options['account']))
+        elif action == 'remove' and entity == 'user':
+            self.associations = {
+                (user, account) for user, account in self.associations
+                if options.get('name', user) != user or options.get('account', account) != account
+            }
+        return ''
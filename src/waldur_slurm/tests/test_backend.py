@@ -67,12 +67,15 @@ class BackendTest(TestCase):
                    ' modify account %s set GrpTRES=cpu=%d,gres/gpu=%d,mem=%d'
         context = (self.account, self.allocation.cpu_limit, self.allocation.gpu_limit, self.allocation.ram_limit)
         command = ['ssh', '-o', 'UserKnownHostsFile=/dev/null', '-o', 'StrictHostKeyChecking=no',
+                   '-o', 'ControlMaster=auto', '-o', 'ControlPath=/tmp/waldur-slurm-%C',
+                   '-o', 'ControlPersist=600', '-o', 'ConnectTimeout=10', '-o', 'ServerAliveInterval=10',
                    'root@localhost', '-p', '22', '-i', '/etc/waldur/id_rsa', template % context]
 
         backend = self.allocation.get_backend()
         backend.set_resource_limits(self.allocation)
 
-        check_output.assert_called_once_with(command, encoding='utf-8', stderr=-2)
+        # Connection to control master is checked before command is sent.
+        check_output.assert_called_with(command, encoding='utf-8', stderr=-2, timeout=300)
 
 
 class BackendMOABTest(TestCase):
@@ -83,7 +86,7 @@ class BackendMOABTest(TestCase):
 
         self.subprocess_patcher = mock.patch('subprocess.check_output')
         self.subprocess_mock = self.subprocess_patcher.start()
-        self.subprocess_mock.return_value = """
+        self.subprocess_mock.return_value = report = """
             test_acc|4|||21|centos|0.00|1
             test_acc|4|6|12|20|centos|0.00|1
             test_acc|4|||100|centos|0.03|1
@@ -91,6 +94,8 @@ class BackendMOABTest(TestCase):
             test_acc|4|||500|centos|0.17|1
             test_acc|4|||2|centos|0.00|1
         """.replace('test_acc', 'waldur_allocation_' + self.fixture.allocation.uuid.hex)
+        mock.patch('waldur_slurm.session.SSHSession.execute_many',
+                   lambda session, commands: [report] * len(commands)).start()
 
     def tearDown(self):
         mock.patch.stopall()
@@ -0,0 +1,112 @@
+import subprocess  # nosec
+
+from django.test import TestCase
+from unittest import mock
+
+from .. import base, session
+from . import fakes, fixtures
+
+
+class SSHSessionTest(TestCase):
+    def setUp(self):
+        self.session = session.SSHSession('localhost', '/etc/waldur/id_rsa')
+        self.check_output = mock.patch('subprocess.check_output').start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def get_remote_commands(self):
+        return [call[0][0][-1] for call in self.check_output.call_args_list if '-O' not in call[0][0]]
+
+    def test_several_commands_are_executed_in_single_round_trip(self):
+        self.check_output.side_effect = [
+            '',  # control master is running
+            'first\n%s0\nsecond\nline\n%s0\n' % (session.EXIT_CODE_MARKER, session.EXIT_CODE_MARKER),
+        ]
+
+        outputs = self.session.execute_many([['sacctmgr', 'list', 'account'], ['sacct']])
+
+        self.assertEqual(outputs, ['first', 'second\nline'])
+        self.assertEqual(len(self.get_remote_commands()), 1)
+
+    def test_output_of_failed_command_is_raised(self):
+        self.check_output.side_effect = [
+            '',  # control master is running
+            'first\n%s0\nerror\n%s1\n' % (session.EXIT_CODE_MARKER, session.EXIT_CODE_MARKER),
+        ]
+
+        with self.assertRaisesMessage(session.SessionError, 'error'):
+            self.session.execute_many([['sacctmgr', 'list', 'account'], ['sacct']])
+
+    def test_connection_is_retried_before_command_is_sent(self):
+        self.check_output.side_effect = [
+            subprocess.CalledProcessError(255, 'ssh'),  # control master is not running
+            subprocess.CalledProcessError(session.SSH_CONNECTION_ERROR, 'ssh'),  # connection has failed
+            '',  # control master is closed
+            '',  # connection is established
+            'output',
+        ]
+
+        self.assertEqual(self.session.execute(['sacct']), 'output')
+        self.assertEqual(self.get_remote_commands(), ['true', 'true', 'sacct'])
+
+    def test_command_is_not_sent_if_connection_could_not_be_established(self):
+        self.check_output.side_effect = subprocess.CalledProcessError(session.SSH_CONNECTION_ERROR, 'ssh')
+
+        self.assertRaises(session.SessionError, self.session.execute, ['sacct'])
+        self.assertEqual(self.get_remote_commands(), ['true', 'true'])
+
+    def test_timed_out_mutating_command_is_not_executed_again(self):
+        self.check_output.side_effect = [
+            '',  # control master is running
+            subprocess.TimeoutExpired('ssh', 300),
+            '',  # control master is closed
+        ]
+        command = ['sacctmgr', '-i', 'add', 'user', 'alice', 'account=waldur']
+
+        self.assertRaises(session.SessionError, self.session.execute, command)
+        self.assertEqual(self.get_remote_commands(), [' '.join(command)])
+        self.assertIn('exit', self.check_output.call_args_list[-1][0][0])
+
+    def test_command_is_not_executed_again_after_connection_failure(self):
+        self.check_output.side_effect = [
+            '',  # control master is running
+            subprocess.CalledProcessError(session.SSH_CONNECTION_ERROR, 'ssh'),
+            '',  # control master is closed
+        ]
+
+        self.assertRaises(session.SessionError, self.session.execute, ['sacctmgr', '-i', 'modify', 'account'])
+        self.assertEqual(self.get_remote_commands(), ['sacctmgr -i modify account'])
+
+
+class FakeClusterTest(TestCase):
+    def setUp(self):
+        session.clear_sessions()
+        mock.patch.object(base.BaseBatchClient, 'session_class', fakes.FakeSlurmSession).start()
+        self.fixture = fixtures.SlurmFixture()
+        self.allocation = self.fixture.allocation
+        self.backend = self.allocation.get_backend()
+        self.cluster = self.backend.client.session
+
+    def tearDown(self):
+        session.clear_sessions()
+        mock.patch.stopall()
+
+    def test_associations_of_several_users_are_created_in_two_round_trips(self):
+        usernames = ['user%s' % index for index in range(10)]
+
+        self.backend.add_users(self.allocation, usernames)
+
+        account = self.backend.get_allocation_name(self.allocation)
+        self.assertEqual(self.cluster.associations, {(username, account) for username in usernames})
+        self.assertEqual(self.cluster.round_trips, 2)
+
+    def test_existing_associations_are_not_created_again(self):
+        account = self.backend.get_allocation_name(self.allocation)
+        self.cluster.associations.add(('user1', account))
+
+        self.backend.add_users(self.allocation, ['user1', 'user2'])
+
+        added = [command for command in self.cluster.commands if 'add' in command]
+        self.assertEqual(len(added), 1)
+        self.assertIn('user2', added[0])
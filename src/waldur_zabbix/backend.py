@@ -1,9 +1,10 @@
+from collections import defaultdict
 from datetime import date, timedelta
 from decimal import Decimal
 import logging
 
 from django.conf import settings as django_settings
-from django.db import connections, DatabaseError
+from django.db import DatabaseError
 from django.utils import timezone
 import pyzabbix
 from requests.exceptions import RequestException
@@ -13,6 +14,7 @@ from waldur_core.structure import ServiceBackend, ServiceBackendError, log_backe
 from waldur_core.structure.utils import update_pulled_fields
 
 from . import models, utils
+from .history import ZabbixHistoryReader
 
 
 logger = logging.getLogger(__name__)
@@ -527,16 +529,20 @@ class ZabbixBackend(ServiceBackend):
             logger.exception('No trigger for host %s and description %s', host_id, description)
             raise ZabbixBackendError(e)
 
-    def get_sla(self, service_id, start_time, end_time):
+    def get_slas(self, service_ids, intervals):
+        """
+        Get SLA values of several IT services for several intervals using single API call.
+        Return dictionary where key is IT service ID and value is list of SLA values for each interval.
+        """
         try:
             data = self.api.service.getsla(
-                filter={'serviceids': service_id},
-                intervals={'from': start_time, 'to': end_time}
+                serviceids=service_ids,
+                intervals=[{'from': start_time, 'to': end_time} for start_time, end_time in intervals]
             )
-            return data[service_id]['sla'][0]['sla']
-        except (pyzabbix.ZabbixAPIException, RequestException, IndexError, KeyError) as e:
-            message = 'Can not get Zabbix IT service SLA value for service with ID %s. Exception: %s'
-            raise ZabbixBackendError(message % (service_id, e))
+            return {service_id: [item['sla'] for item in data[service_id]['sla']] for service_id in service_ids}
+        except (pyzabbix.ZabbixAPIException, RequestException, KeyError) as e:
+            message = 'Can not get Zabbix IT services SLA values for services with IDs %s. Exception: %s'
+            raise ZabbixBackendError(message % (', '.join(service_ids), e))
 
     def get_itservice(self, service_id):
         try:
@@ -555,24 +561,42 @@ class ZabbixBackend(ServiceBackend):
         Returns minimum and maximum dates.
         """
         query = 'SELECT min(clock), max(clock) FROM service_alarms WHERE serviceid = %s'
-        cursor = self._execute_query(query, [serviceid])
-        min_timestamp, max_timestamp = cursor.fetchone()
+        min_timestamp, max_timestamp = self._read_history('execute', query, [serviceid])[0]
         return date.fromtimestamp(int(min_timestamp)), date.fromtimestamp(int(max_timestamp))
 
-    def get_trigger_events(self, trigger_id, start_time, end_time):
+    def get_triggers_events(self, trigger_ids, start_time, end_time):
+        """
+        Get events of several triggers using single API call.
+        Return dictionary where key is trigger ID and value is list of events ordered by time.
+        """
         try:
             event_data = self.api.event.get(
-                output='extend',
-                objectids=trigger_id,
+                output=['clock', 'value', 'objectid'],
+                objectids=trigger_ids,
                 time_from=start_time,
                 time_till=end_time,
                 sortfield=["clock"],
                 sortorder="ASC")
         except (pyzabbix.ZabbixAPIException, RequestException) as e:
-            message = 'Can not get events for trigger with ID %s. Exception: %s'
-            raise ZabbixBackendError(message % (trigger_id, e))
+            message = 'Can not get events for triggers with IDs %s. Exception: %s'
+            raise ZabbixBackendError(message % (', '.join(trigger_ids), e))
         else:
-            return [{'timestamp': e['clock'], 'value': e['value']} for e in event_data]
+            events = {trigger_id: [] for trigger_id in trigger_ids}
+            for e in event_data:
+                events.setdefault(e['objectid'], []).append({'timestamp': e['clock'], 'value': e['value']})
+            return events
+
+    def get_triggers_values(self, trigger_ids):
+        """
+        Get current values of several triggers using single API call.
+        Return dictionary where key is trigger ID and value is 1 if trigger is in problem state and 0 otherwise.
+        """
+        try:
+            trigger_data = self.api.trigger.get(triggerids=trigger_ids, output=['triggerid', 'value'])
+        except (pyzabbix.ZabbixAPIException, RequestException) as e:
+            message = 'Can not get values of triggers with IDs %s. Exception: %s'
+            raise ZabbixBackendError(message % (', '.join(trigger_ids), e))
+        return {trigger['triggerid']: int(trigger['value']) for trigger in trigger_data}
 
     def _get_api(self, backend_url, username, password):
         unsafe_session = QuietSession()
@@ -582,64 +606,56 @@ class ZabbixBackend(ServiceBackend):
         api.login(username, password)
         return api
 
-    def get_item_stats(self, hostid, item, points):
-        if item.value_type == models.Item.ValueTypes.FLOAT:
-            history_table = 'history'
-            trend_table = 'trends'
-        elif item.value_type == models.Item.ValueTypes.INTEGER:
-            # Integer value
-            history_table = 'history_uint'
-            trend_table = 'trends_uint'
-        else:
-            raise ZabbixBackendError('Cannot get statistics for non-numerical item %s' % item.key)
-
-        history_retention_days = item.history
-        history_delay_seconds = item.delay or self.HISTORY_DELAY_SECONDS
-        trend_delay_seconds = self.TREND_DELAY_SECONDS
-
-        trends_start_date = datetime_to_timestamp(timezone.now() - timedelta(days=history_retention_days))
-
-        points = points[::-1]
-        history_cursor = self._get_history(
-            item.key, hostid, history_table, points[-1] - history_delay_seconds, points[0])
-        trends_cursor = self._get_history(
-            item.key, hostid, trend_table, points[-1] - trend_delay_seconds, points[0])
-
-        values = []
-        if points[0] > trends_start_date:
-            next_value = history_cursor.fetchone()
-        else:
-            next_value = trends_cursor.fetchone()
+    def get_items_stats(self, hosts, items, points):
+        """
+        Get sum of hosts items values at each point.
+        Value at point is average of item values between previous and current point.
+        If interval between points is less than item update interval, the latter is used instead.
+        Values are taken from history tables while they are retained, then from trends tables.
 
-        for end, start in zip(points[:-1], points[1:]):
-            if start > trends_start_date:
-                interval = history_delay_seconds
-            else:
-                interval = trend_delay_seconds
-
-            value = None
-            while True:
-                if next_value is None:
-                    break
-                time, value = next_value
-                if item.is_byte():
-                    value = self.b2mb(value)
-
-                if time <= end:
-                    if end - time < interval or time > start:
-                        break
+        Output format:
+            {
+                <item1.key>: [<value at point 1>, <value at point 2>, ...],
+                ...
+            }
+        Value is None if there is no data for the point.
+        """
+        points = list(points)
+        items_ids = self._get_items_ids(hosts, items)
+        stats = {item.key: [None] * len(points) for item in items}
+
+        # Items with equal tables and retention settings are queried together.
+        groups = defaultdict(list)
+        for item in items:
+            groups[item.value_type, item.history, item.delay].append(item)
+
+        for (value_type, history_retention_days, delay), group in groups.items():
+            history_table, trend_table = self._get_history_tables(value_type, group[0])
+            history_delay_seconds = delay or self.HISTORY_DELAY_SECONDS
+            trends_start_date = datetime_to_timestamp(timezone.now() - timedelta(days=history_retention_days))
+
+            buckets = {history_table: [], trend_table: []}
+            for index, end in enumerate(points):
+                start = points[index - 1] if index else end
+                if start > trends_start_date:
+                    buckets[history_table].append((index, min(start, end - history_delay_seconds), end))
                 else:
-                    if start > trends_start_date:
-                        next_value = history_cursor.fetchone()
-                    else:
-                        next_value = trends_cursor.fetchone()
-
-            values.append(value)
-        return values[::-1]
-
-    def get_items_aggregated_values(self, host, items, start_timestamp, end_timestamp, method='MAX'):
+                    buckets[trend_table].append((index, min(start, end - self.TREND_DELAY_SECONDS), end))
+
+            group_items = {item.key: item for item in group}
+            group_ids = {item_id: key for key, item_id in items_ids.items() if key in group_items}
+            for table, table_buckets in buckets.items():
+                values = self._read_history(
+                    'get_bucketed_values', table, group_ids, [bucket[1:] for bucket in table_buckets])
+                for (position, key), value in values.items():
+                    if group_items[key].is_byte():
+                        value = self.b2mb(value)
+                    stats[key][table_buckets[position][0]] = value
+        return stats
+
+    def get_items_aggregated_values(self, hosts, items, start_timestamp, end_timestamp, method='MAX'):
         """
-        Get aggregate values for host items.
+        Get sum of aggregate values of hosts items.
 
         Output format:
             {
@@ -648,37 +664,21 @@ class ZabbixBackend(ServiceBackend):
                 ...
             }
         """
-        int_items = [item for item in items if item.value_type == models.Item.ValueTypes.INTEGER]
-        float_items = [item for item in items if item.value_type == models.Item.ValueTypes.FLOAT]
-
-        # Get aggregated data from DB
-        db_data = tuple()
-        default_kwargs = {
-            'hostid': host.backend_id,
-            'start_timestamp': start_timestamp,
-            'end_timestamp': end_timestamp,
-            'method': method,
-        }
+        items_ids = self._get_items_ids(hosts, items)
+        items_keys = {item.key: item for item in items}
+
+        db_data = {}
         # XXX: We need to get values from table "trends" if end_timestamp < item.history.
-        if int_items:
-            cursor = self._get_aggregated_values(
-                item_keys=[item.key for item in int_items],
-                table='history_uint',
-                **default_kwargs
-            )
-            db_data += cursor.fetchall()
-        if float_items:
-            cursor = self._get_aggregated_values(
-                item_keys=[item.key for item in float_items],
-                table='history',
-                **default_kwargs
-            )
-            db_data += cursor.fetchall()
+        for value_type, table in ((models.Item.ValueTypes.INTEGER, 'history_uint'),
+                                  (models.Item.ValueTypes.FLOAT, 'history')):
+            table_ids = {item_id: key for key, item_id in items_ids.items()
+                         if items_keys[key].value_type == value_type}
+            db_data.update(self._read_history(
+                'get_aggregated_values', table, table_ids, start_timestamp, end_timestamp, method))
 
         # Prepare data - convert B to MB if needed
-        items_keys = {item.key: item for item in items}
         aggregated_values = {}
-        for key, value in db_data:
+        for key, value in db_data.items():
             item = items_keys[key]
             aggregated_values[key] = self.b2mb(value) if item.is_byte() else value
         return aggregated_values
@@ -686,84 +686,29 @@ class ZabbixBackend(ServiceBackend):
     def b2mb(self, value):
         return value / 1024 / 1024
 
-    def _get_history(self, item_key, hostid, table, start_timestamp, end_timestamp):
-        """
-        Execute query to zabbix db to get item values from history
-        """
-        query = (
-            'SELECT clock time, %(value_path)s value '
-            'FROM %(table)s history, items '
-            'WHERE history.itemid = items.itemid '
-            'AND items.key_ = "%(item_key)s" '
-            'AND items.hostid = %(hostid)s '
-            'AND clock > %(start_timestamp)s '
-            'AND clock < %(end_timestamp)s '
-            'ORDER BY clock DESC'
-        )
-        parameters = {
-            'table': table,
-            'item_key': item_key,
-            'hostid': hostid,
-            'start_timestamp': start_timestamp,
-            'end_timestamp': end_timestamp,
-            'value_path': table.startswith('history') and 'value' or 'value_avg'
-        }
-        query = query % parameters
-
-        return self._execute_query(query)
-
-    def _get_aggregated_values(self, hostid, item_keys, start_timestamp, end_timestamp, table, method='MAX'):
-        """
-        Execute query to zabbix DB to get item aggregated historical value.
-        """
-        # XXX: This query is really slow with a lot of item_keys, need to speed up it with index.
-        query = (
-            'SELECT items.key_, %(method)s(value) '
-            'FROM hosts, items, %(table)s history '
-            'WHERE items.hostid = %(hostid)s AND hosts.hostid = %(hostid)s AND history.itemid = items.itemid '
-            'AND items.key_ IN (%(item_keys)s) '
-            'AND clock >= %(start_timestamp)s '
-            'AND clock <= %(end_timestamp)s '
-            'GROUP BY items.key_'
-        )
-
-        parameters = {
-            'method': method,
-            'table': table,
-            'hostid': hostid,
-            'item_keys': ', '.join(['"%s"' % key for key in item_keys]),
-            'start_timestamp': start_timestamp,
-            'end_timestamp': end_timestamp,
-        }
+    @property
+    def history(self):
+        if not hasattr(self, '_history'):
+            self._history = ZabbixHistoryReader(self.database_parameters)
+        return self._history
+
+    def _get_history_tables(self, value_type, item):
+        if value_type == models.Item.ValueTypes.FLOAT:
+            return 'history', 'trends'
+        elif value_type == models.Item.ValueTypes.INTEGER:
+            return 'history_uint', 'trends_uint'
+        else:
+            raise ZabbixBackendError('Cannot get statistics for non-numerical item %s' % item.key)
 
-        query = query % parameters
-        return self._execute_query(query)
-
-    def _get_db_connection(self, force=False):
-        host = self.database_parameters['host']
-        port = self.database_parameters['port']
-        name = self.database_parameters['name']
-        user = self.database_parameters['user']
-        password = self.database_parameters['password']
-
-        key = '/'.join([name, host, port])
-        if key not in connections.databases or force:
-            connections.databases[key] = {
-                'ENGINE': 'django.db.backends.mysql',
-                'NAME': name,
-                'HOST': host,
-                'PORT': port,
-                'USER': user,
-                'PASSWORD': password
-            }
-        return connections[key]
+    def _get_items_ids(self, hosts, items):
+        """ Map Zabbix items IDs of all hosts to items keys. """
+        hostids = [host.backend_id for host in hosts]
+        items_ids = self._read_history('get_item_ids', hostids, [item.key for item in items])
+        return {item_id: key for (hostid, key), item_id in items_ids.items()}
 
-    def _execute_query(self, query, *args, **kwargs):
-        logger.debug('Executing query %s to Zabbix' % query)
+    def _read_history(self, method, *args):
         try:
-            cursor = self._get_db_connection().cursor()
-            cursor.execute(query, *args, **kwargs)
-            return cursor
+            return getattr(self.history, method)(*args)
         except DatabaseError as e:
             logger.exception('Can not execute query the Zabbix DB.')
             raise ZabbixBackendError(e)
@@ -22,7 +22,13 @@ class ZabbixExtension(WaldurExtension):
                 ('comments', 'comments', 'ReadOnlyField'),
                 ('error', 'error', 'ReadOnlyField'),
                 ('value', 'value', 'IntegerField'),
-            )
+            ),
+            # Maximum number of idle connections to Zabbix database kept for reuse.
+            'DATABASE_POOL_SIZE': 5,
+            # IDs of hosts items are cached for given number of seconds.
+            'ITEM_IDS_CACHE_TIMEOUT': 60 * 60,
+            # SLA of IT services of the same Zabbix server is updated in batches of given size.
+            'SLA_BATCH_SIZE': 100,
         }
 
     @staticmethod
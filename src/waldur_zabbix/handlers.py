@@ -2,7 +2,7 @@ import logging
 
 from waldur_core.structure.models import NewResource as Resource
 
-from . import executors
+from . import executors, history
 from .models import Host
 
 
@@ -27,4 +27,7 @@ def delete_hosts_on_scope_deletion(sender, instance, name, source, target, **kwa
 
 def refresh_database_connection(sender, instance, created=False, **kwargs):
     if not created and instance.type == 'Zabbix' and instance.tracker.has_changed('options'):
-        instance.get_backend()._get_db_connection(force=True)
+        previous_options = instance.tracker.previous('options') or {}
+        if 'database_parameters' in previous_options:
+            history.reset_connection_pool(previous_options['database_parameters'])
+        history.reset_connection_pool(instance.get_backend().database_parameters)
@@ -0,0 +1,230 @@
+""" Access to Zabbix history database using pooled connections and bound query parameters. """
+
+from collections import defaultdict
+from contextlib import contextmanager
+import logging
+import queue
+import threading
+
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.db.utils import load_backend
+
+logger = logging.getLogger(__name__)
+
+ITEM_IDS_CACHE_KEY = 'waldur_zabbix.item_ids.%s.%s'
+
+AGGREGATE_METHODS = ('MIN', 'MAX', 'AVG')
+
+
+def get_option(name, default):
+    return getattr(django_settings, 'WALDUR_ZABBIX', {}).get(name, default)
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of Zabbix database connections.
+    Connections are not registered in django.db.connections, so they are not shared with application database.
+    """
+
+    def __init__(self, database_parameters, size):
+        self.settings_dict = {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': database_parameters['name'],
+            'HOST': database_parameters['host'],
+            'PORT': database_parameters['port'],
+            'USER': database_parameters['user'],
+            'PASSWORD': database_parameters['password'],
+            'ATOMIC_REQUESTS': False,
+            'AUTOCOMMIT': True,
+            'CONN_MAX_AGE': None,
+            'OPTIONS': {},
+            'TIME_ZONE': None,
+            'TEST': {},
+        }
+        self.idle = queue.LifoQueue(maxsize=size)
+        self.closed = False
+
+    def _create(self):
+        backend = load_backend(self.settings_dict['ENGINE'])
+        wrapper = backend.DatabaseWrapper(self.settings_dict)
+        # Connection is returned to the pool and can be reused by another thread.
+        wrapper.inc_thread_sharing()
+        return wrapper
+
+    @contextmanager
+    def connection(self):
+        try:
+            wrapper = self.idle.get_nowait()
+        except queue.Empty:
+            wrapper = self._create()
+        else:
+            if wrapper.connection is not None and not wrapper.is_usable():
+                wrapper.close()
+        try:
+            yield wrapper
+        except DatabaseError:
+            wrapper.close()
+            raise
+        finally:
+            if self.closed:
+                wrapper.close()
+            else:
+                try:
+                    self.idle.put_nowait(wrapper)
+                except queue.Full:
+                    wrapper.close()
+
+    def close(self):
+        """ Close idle connections, connections which are in use are closed when they are released. """
+        self.closed = True
+        while True:
+            try:
+                wrapper = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            wrapper.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_database_key(database_parameters):
+    return '/'.join([database_parameters['name'], database_parameters['host'], str(database_parameters['port'])])
+
+
+def get_pool_key(database_parameters):
+    # Credentials are part of the key, so connections are not reused after they have been changed.
+    return (
+        get_database_key(database_parameters),
+        database_parameters['user'],
+        database_parameters['password'],
+    )
+
+
+def get_connection_pool(database_parameters):
+    key = get_pool_key(database_parameters)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(database_parameters, get_option('DATABASE_POOL_SIZE', 5))
+        return _pools[key]
+
+
+def reset_connection_pool(database_parameters):
+    """ Close pools of all connections to given database regardless of credentials they have been opened with. """
+    database_key = get_database_key(database_parameters)
+    with _pools_lock:
+        keys = [key for key in _pools if key[0] == database_key]
+        pools = [_pools.pop(key) for key in keys]
+    for pool in pools:
+        pool.close()
+
+
+def get_placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+class ZabbixHistoryReader:
+    """
+    Read items values from Zabbix database.
+    Items IDs are resolved once per host and cached, values are aggregated
+    in database for several hosts at once.
+    """
+
+    def __init__(self, database_parameters):
+        self.database_key = get_database_key(database_parameters)
+        self.pool = get_connection_pool(database_parameters)
+
+    def execute(self, query, params=None):
+        logger.debug('Executing query %s to Zabbix', query)
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+
+    def get_item_ids(self, hostids, item_keys):
+        """
+        Get Zabbix IDs of items of given hosts.
+        Return dictionary where key is (hostid, item key) and value is item ID.
+        """
+        hostids = [str(hostid) for hostid in hostids]
+        cache_keys = {hostid: ITEM_IDS_CACHE_KEY % (self.database_key, hostid) for hostid in hostids}
+        cached = cache.get_many(cache_keys.values())
+        host_items = {hostid: dict(cached.get(cache_keys[hostid], {})) for hostid in hostids}
+
+        missing_hosts = [hostid for hostid in hostids if not set(item_keys) <= set(host_items[hostid])]
+        if missing_hosts and item_keys:
+            query = 'SELECT hostid, key_, itemid FROM items WHERE hostid IN (%s) AND key_ IN (%s)' % (
+                get_placeholders(missing_hosts), get_placeholders(item_keys))
+            for hostid, key, itemid in self.execute(query, list(missing_hosts) + list(item_keys)):
+                host_items[str(hostid)][key] = itemid
+            # Items which are absent in Zabbix are cached as well, so they are not requested again.
+            for hostid in missing_hosts:
+                for key in item_keys:
+                    host_items[hostid].setdefault(key, None)
+            cache.set_many(
+                {cache_keys[hostid]: host_items[hostid] for hostid in missing_hosts},
+                get_option('ITEM_IDS_CACHE_TIMEOUT', 60 * 60),
+            )
+
+        return {
+            (hostid, key): itemid
+            for hostid, items in host_items.items()
+            for key, itemid in items.items()
+            if key in item_keys and itemid is not None
+        }
+
+    def get_aggregated_values(self, table, item_ids, start_timestamp, end_timestamp, method='MAX'):
+        """
+        Aggregate values of each item over period and sum them up by item key.
+        Argument item_ids is dictionary where key is Zabbix item ID and value is item key.
+        """
+        if method not in AGGREGATE_METHODS:
+            raise ValueError('Aggregate method %s is not supported.' % method)
+        if not item_ids:
+            return {}
+
+        query = (
+            'SELECT itemid, {method}(value) FROM {table} '
+            'WHERE itemid IN ({items}) AND clock >= %s AND clock <= %s '
+            'GROUP BY itemid'
+        ).format(method=method, table=table, items=get_placeholders(item_ids))
+        rows = self.execute(query, list(item_ids) + [start_timestamp, end_timestamp])
+
+        values = defaultdict(lambda: 0)
+        for itemid, value in rows:
+            values[item_ids[itemid]] += value
+        return dict(values)
+
+    def get_bucketed_values(self, table, item_ids, buckets, method='AVG'):
+        """
+        Aggregate values of each item within each time bucket and sum them up by item key.
+        Buckets are list of (start, end) timestamps, where start is excluded and end is included.
+        Trends tables store hourly aggregates, so corresponding aggregate column is used for them.
+        Return dictionary where key is (bucket index, item key) and value is sum of aggregated values.
+        """
+        if method not in AGGREGATE_METHODS:
+            raise ValueError('Aggregate method %s is not supported.' % method)
+        if not item_ids or not buckets:
+            return {}
+
+        column = 'value' if table.startswith('history') else 'value_%s' % method.lower()
+        bucket_query = 'SELECT %s AS bucket_index, %s AS bucket_start, %s AS bucket_end'
+        buckets_query = ' UNION ALL '.join([bucket_query] * len(buckets))
+        query = (
+            'SELECT bucket.bucket_index, history.itemid, {method}(history.{column}) '
+            'FROM ({buckets}) bucket '
+            'JOIN {table} history ON history.clock > bucket.bucket_start AND history.clock <= bucket.bucket_end '
+            'WHERE history.itemid IN ({items}) '
+            'GROUP BY bucket.bucket_index, history.itemid'
+        ).format(method=method, column=column, buckets=buckets_query, table=table,
+                 items=get_placeholders(item_ids))
+        params = [param for index, (start, end) in enumerate(buckets) for param in (index, start, end)]
+        rows = self.execute(query, params + list(item_ids))
+
+        values = defaultdict(lambda: 0)
+        for index, itemid, value in rows:
+            values[index, item_ids[itemid]] += value
+        return dict(values)
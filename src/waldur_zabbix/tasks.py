@@ -1,9 +1,11 @@
+from collections import defaultdict
 import datetime
 from decimal import Decimal
 import logging
 
 from celery import shared_task
 from dateutil.relativedelta import relativedelta
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.mail import send_mail
 
@@ -12,7 +14,7 @@ from waldur_core.monitoring.models import ResourceItem, ResourceSla, ResourceSla
 from waldur_core.monitoring.utils import format_period
 
 from .backend import ZabbixBackendError
-from .models import Host, ITService, Item, SlaHistory
+from .models import Host, ITService, Item, SlaHistory, SlaHistoryEvent
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +22,8 @@ logger = logging.getLogger(__name__)
 @shared_task(name='waldur_core.zabbix.pull_sla')
 def pull_sla(host_uuid):
     """
-    Pull SLAs for given Zabbix host for all time of its existence in Zabbix
+    Pull SLAs for given Zabbix host for all time of its existence in Zabbix.
+    SLA values of all months are fetched using single API call.
     """
     try:
         host = Host.objects.get(uuid=host_uuid)
@@ -45,18 +48,39 @@ def pull_sla(host_uuid):
 
     # Shift date to beginning of the month
     current_point = min_dt.replace(day=1)
+    intervals = []
     while current_point <= max_dt:
         period = format_period(current_point)
         start_time = core_utils.datetime_to_timestamp(current_point)
         current_point += relativedelta(months=+1)
         end_time = core_utils.datetime_to_timestamp(min(max_dt, current_point))
-        update_itservice_sla.delay(itservice.pk, period, start_time, end_time)
+        intervals.append((period, start_time, end_time))
+
+    if not intervals:
+        return
+
+    try:
+        slas = backend.get_slas([itservice.backend_id], [interval[1:] for interval in intervals])
+        events = _get_events(backend, [itservice], intervals[0][1], intervals[-1][2])
+    except ZabbixBackendError as e:
+        logger.warning('Unable to pull SLA for host with UUID %s. Reason: %s', host_uuid, e)
+        return
+
+    records = [
+        (itservice, period, sla, _filter_events(events.get(itservice.backend_trigger_id, []), start_time, end_time))
+        for (period, start_time, end_time), sla in zip(intervals, slas[itservice.backend_id])
+    ]
+    _save_slas(records)
 
     logger.debug('Successfully pulled SLA for host with with UUID %s', host_uuid)
 
 
 @shared_task(name='waldur_core.zabbix.update_sla')
 def update_sla(sla_type):
+    """
+    Schedule SLA update for IT services in batches.
+    Each batch contains IT services of the same Zabbix server.
+    """
     if sla_type not in ('yearly', 'monthly'):
         logger.error('Requested unknown SLA type: %s' % sla_type)
         return
@@ -73,62 +97,200 @@ def update_sla(sla_type):
 
     end_time = int(dt.strftime("%s"))
 
-    for itservice in ITService.objects.all():
-        update_itservice_sla.delay(itservice.pk, period, start_time, end_time)
+    itservices = defaultdict(list)
+    for itservice_pk, settings_pk in ITService.objects.values_list(
+            'pk', 'service_project_link__service__settings_id').order_by('pk'):
+        itservices[settings_pk].append(itservice_pk)
+
+    batch_size = settings.WALDUR_ZABBIX['SLA_BATCH_SIZE']
+    for settings_itservices in itservices.values():
+        for chunk in core_utils.chunks(settings_itservices, batch_size):
+            update_itservices_sla.delay(chunk, period, start_time, end_time)
 
 
 @shared_task
 def update_itservice_sla(itservice_pk, period, start_time, end_time):
-    logger.debug('Updating SLAs for IT Service with PK %s. Period: %s, start_time: %s, end_time: %s',
-                 itservice_pk, period, start_time, end_time)
+    update_itservices_sla([itservice_pk], period, start_time, end_time)
 
-    try:
-        itservice = ITService.objects.get(pk=itservice_pk)
-    except ITService.DoesNotExist:
-        logger.warning('Unable to update SLA for IT Service with PK %s, because it is gone', itservice_pk)
+
+@shared_task(name='waldur_core.zabbix.update_itservices_sla')
+def update_itservices_sla(itservice_pks, period, start_time, end_time):
+    """
+    Update SLAs of IT services of the same Zabbix server using single SLA API call.
+    SLA is recomputed only if it has not been computed for the period yet,
+    if trigger events of IT service have changed or if IT service is down.
+    """
+    logger.debug('Updating SLAs for IT Services with PKs %s. Period: %s, start_time: %s, end_time: %s',
+                 itservice_pks, period, start_time, end_time)
+
+    itservices = list(ITService.objects.filter(pk__in=itservice_pks)
+                      .select_related('host', 'service_project_link__service__settings')
+                      .prefetch_related('host__scope'))
+    if not itservices:
+        logger.warning('Unable to update SLA for IT Services with PKs %s, because they are gone', itservice_pks)
         return
 
-    backend = itservice.host.get_backend()
+    backend = itservices[0].get_backend()
+    period = str(period)
 
     try:
-        current_sla = backend.get_sla(itservice.backend_id, start_time, end_time)
-        entry, _ = SlaHistory.objects.get_or_create(itservice=itservice, period=period)
-        entry.value = Decimal(current_sla)
-        entry.save()
-
-        # Save SLA if IT service is marked as main for host
-        if itservice.host and itservice.host.scope and itservice.is_main:
-            ResourceSla.objects.update_or_create(
-                object_id=itservice.host.scope.id,
-                content_type=ContentType.objects.get_for_model(itservice.host.scope),
-                period=period,
-                defaults={
-                    'value': current_sla,
-                    'agreed_value': itservice.agreed_sla
-                }
-            )
-
-        if itservice.backend_trigger_id:
-            # update connected events
-            events = backend.get_trigger_events(itservice.backend_trigger_id, start_time, end_time)
-            for event in events:
-                event_state = 'U' if int(event['value']) == 0 else 'D'
-                entry.events.get_or_create(
-                    timestamp=int(event['timestamp']),
-                    state=event_state
-                )
-
-                if itservice.host and itservice.host.scope and itservice.is_main:
-                    ResourceSlaStateTransition.objects.get_or_create(
-                        scope=itservice.host.scope,
-                        period=period,
-                        timestamp=int(event['timestamp']),
-                        state=int(event['value']) == 0
-                    )
+        events = _get_events(backend, itservices, start_time, end_time)
+        problem_triggers = _get_problem_triggers(backend, itservices)
+        changed_itservices = _get_changed_itservices(itservices, period, events, problem_triggers)
+        if not changed_itservices:
+            return
+        slas = backend.get_slas([itservice.backend_id for itservice in changed_itservices], [(start_time, end_time)])
     except ZabbixBackendError as e:
-        logger.warning(
-            'Unable to update SLA for IT Service %s (ID: %s). Reason: %s', itservice.name, itservice.backend_id, e)
-    logger.debug('Successfully updated SLA for IT Service %s (ID: %s)', itservice.name, itservice.backend_id)
+        logger.warning('Unable to update SLA for IT Services with PKs %s. Reason: %s', itservice_pks, e)
+        return
+
+    _save_slas([
+        (itservice, period, slas[itservice.backend_id][0], events.get(itservice.backend_trigger_id, []))
+        for itservice in changed_itservices
+    ])
+    logger.debug('Successfully updated SLA for IT Services with PKs %s',
+                 [itservice.pk for itservice in changed_itservices])
+
+
+def _get_event_state(event):
+    return 'U' if int(event['value']) == 0 else 'D'
+
+
+def _get_events(backend, itservices, start_time, end_time):
+    trigger_ids = [itservice.backend_trigger_id for itservice in itservices if itservice.backend_trigger_id]
+    if not trigger_ids:
+        return {}
+    return backend.get_triggers_events(trigger_ids, start_time, end_time)
+
+
+def _get_problem_triggers(backend, itservices):
+    trigger_ids = [itservice.backend_trigger_id for itservice in itservices if itservice.backend_trigger_id]
+    if not trigger_ids:
+        return set()
+    values = backend.get_triggers_values(trigger_ids)
+    return {trigger_id for trigger_id, value in values.items() if value == 1}
+
+
+def _filter_events(events, start_time, end_time):
+    return [event for event in events if start_time <= int(event['timestamp']) <= end_time]
+
+
+def _get_changed_itservices(itservices, period, events, problem_triggers):
+    """
+    IT service SLA is changed if it has not been stored for the period yet,
+    if its trigger events differ from stored ones or if service has been down during the period.
+    Uptime ratio of service with downtime changes as period goes on, even if it is up now.
+    Service has been down if its trigger is in problem state now, if there is problem event
+    or if the first event is recovery, because in this case problem has started before the period.
+    Service which is down since before the period has no events, so trigger state is checked as well.
+    IT services without trigger are always considered changed.
+    """
+    stored_histories = set(SlaHistory.objects.filter(
+        itservice__in=itservices, period=period).values_list('itservice_id', flat=True))
+    stored_events = defaultdict(set)
+    for itservice_id, timestamp, state in SlaHistoryEvent.objects.filter(
+            history__itservice__in=itservices, history__period=period).values_list(
+            'history__itservice_id', 'timestamp', 'state'):
+        stored_events[itservice_id].add((timestamp, state))
+
+    changed = []
+    for itservice in itservices:
+        if itservice.pk not in stored_histories or not itservice.backend_trigger_id:
+            changed.append(itservice)
+            continue
+        trigger_events = events.get(itservice.backend_trigger_id, [])
+        actual_events = {(int(event['timestamp']), _get_event_state(event)) for event in trigger_events}
+        has_downtime = itservice.backend_trigger_id in problem_triggers or bool(trigger_events) and (
+            _get_event_state(trigger_events[0]) == 'U' or
+            any(_get_event_state(event) == 'D' for event in trigger_events)
+        )
+        if actual_events != stored_events[itservice.pk] or has_downtime:
+            changed.append(itservice)
+    return changed
+
+
+def _get_sla_scope(itservice):
+    """ SLA is stored for resource if IT service is marked as main for host. """
+    if itservice.host and itservice.host.scope and itservice.is_main:
+        return itservice.host.scope
+
+
+def _save_slas(records):
+    """
+    Store SLA values and events of IT services using bulk queries.
+    Records are tuples of (IT service, period, SLA value, trigger events).
+    """
+    if not records:
+        return
+    itservices = {itservice for itservice, _, _, _ in records}
+    periods = {period for _, period, _, _ in records}
+
+    # Step 1. Store SLA history of IT services.
+    histories = {
+        (history.itservice_id, history.period): history
+        for history in SlaHistory.objects.filter(itservice__in=itservices, period__in=periods)
+    }
+    new_histories = []
+    changed_histories = []
+    for itservice, period, value, _ in records:
+        history = histories.get((itservice.pk, period))
+        if history is None:
+            history = SlaHistory(itservice=itservice, period=period)
+            histories[itservice.pk, period] = history
+            new_histories.append(history)
+        else:
+            changed_histories.append(history)
+        history.value = Decimal(value)
+    SlaHistory.objects.bulk_create(new_histories)
+    SlaHistory.objects.bulk_update(changed_histories, ['value'])
+
+    stored_events = set(SlaHistoryEvent.objects.filter(
+        history__in=histories.values()).values_list('history_id', 'timestamp', 'state'))
+    new_events = []
+    for itservice, period, _, events in records:
+        history = histories[itservice.pk, period]
+        for event in events:
+            key = (history.pk, int(event['timestamp']), _get_event_state(event))
+            if key not in stored_events:
+                stored_events.add(key)
+                new_events.append(SlaHistoryEvent(history=history, timestamp=key[1], state=key[2]))
+    SlaHistoryEvent.objects.bulk_create(new_events)
+
+    # Step 2. Store SLA of resources.
+    resource_slas = {}
+    transitions = []
+    for itservice, period, value, events in records:
+        scope = _get_sla_scope(itservice)
+        if scope is None:
+            continue
+        content_type = ContentType.objects.get_for_model(scope)
+        resource_slas[period, content_type.id, scope.id] = (Decimal(value), itservice.agreed_sla)
+        for event in events:
+            transitions.append(ResourceSlaStateTransition(
+                content_type=content_type,
+                object_id=scope.id,
+                period=period,
+                timestamp=int(event['timestamp']),
+                state=int(event['value']) == 0,
+            ))
+    if not resource_slas:
+        return
+
+    existing_slas = ResourceSla.objects.filter(
+        period__in=periods, object_id__in={key[2] for key in resource_slas})
+    changed_slas = []
+    for resource_sla in existing_slas:
+        key = (resource_sla.period, resource_sla.content_type_id, resource_sla.object_id)
+        if key in resource_slas:
+            resource_sla.value, resource_sla.agreed_value = resource_slas.pop(key)
+            changed_slas.append(resource_sla)
+    ResourceSla.objects.bulk_update(changed_slas, ['value', 'agreed_value'])
+    ResourceSla.objects.bulk_create([
+        ResourceSla(period=period, content_type_id=content_type_id, object_id=object_id,
+                    value=value, agreed_value=agreed_value)
+        for (period, content_type_id, object_id), (value, agreed_value) in resource_slas.items()
+    ])
+    ResourceSlaStateTransition.objects.bulk_create(transitions, ignore_conflicts=True)
 
 
 @shared_task(name='waldur_core.zabbix.update_monitoring_items')
@@ -0,0 +1,156 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from waldur_core.core.utils import datetime_to_timestamp
+from waldur_core.structure.models import ServiceSettings
+
+from .. import history, models
+from ..apps import ZabbixConfig
+from ..backend import ZabbixBackend
+from ..history import ZabbixHistoryReader
+from . import factories
+
+
+class ZabbixHistoryReaderTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = ZabbixHistoryReader({
+            'host': 'localhost',
+            'port': '3306',
+            'name': 'zabbix',
+            'user': 'admin',
+            'password': '',
+        })
+        self.execute = mock.patch.object(self.reader, 'execute').start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def test_item_ids_are_resolved_for_all_hosts_using_single_query(self):
+        self.execute.return_value = [(1, 'cpu', 10), (2, 'cpu', 20)]
+
+        item_ids = self.reader.get_item_ids(['1', '2'], ['cpu'])
+
+        self.assertEqual(item_ids, {('1', 'cpu'): 10, ('2', 'cpu'): 20})
+        self.assertEqual(self.execute.call_count, 1)
+        self.assertEqual(self.execute.call_args[0][1], ['1', '2', 'cpu'])
+
+    def test_item_ids_are_cached(self):
+        self.execute.return_value = [(1, 'cpu', 10)]
+        self.reader.get_item_ids(['1'], ['cpu', 'ram'])
+
+        item_ids = self.reader.get_item_ids(['1'], ['cpu', 'ram'])
+
+        self.assertEqual(item_ids, {('1', 'cpu'): 10})
+        self.assertEqual(self.execute.call_count, 1)
+
+    def test_aggregated_values_are_summed_by_item_key(self):
+        self.execute.return_value = [(10, 2), (20, 3)]
+
+        values = self.reader.get_aggregated_values('history', {10: 'cpu', 20: 'cpu'}, 100, 200, 'MAX')
+
+        self.assertEqual(values, {'cpu': 5})
+        query, params = self.execute.call_args[0]
+        self.assertIn('MAX(value)', query)
+        self.assertEqual(params, [10, 20, 100, 200])
+
+    def test_bucketed_values_are_summed_by_bucket_and_item_key(self):
+        self.execute.return_value = [(0, 10, 1), (0, 20, 2), (1, 10, 4)]
+
+        values = self.reader.get_bucketed_values('trends', {10: 'cpu', 20: 'cpu'}, [(0, 100), (100, 200)])
+
+        self.assertEqual(values, {(0, 'cpu'): 3, (1, 'cpu'): 4})
+        query, params = self.execute.call_args[0]
+        self.assertIn('AVG(history.value_avg)', query)
+        self.assertEqual(params, [0, 0, 100, 1, 100, 200, 10, 20])
+
+    def test_unsupported_aggregate_method_is_rejected(self):
+        self.assertRaises(ValueError, self.reader.get_aggregated_values, 'history', {10: 'cpu'}, 0, 1, 'SUM; --')
+
+
+class ItemsStatsTest(TestCase):
+    def setUp(self):
+        mock.patch('pyzabbix.ZabbixAPI').start()
+        self.reader = mock.Mock()
+        mock.patch.object(ZabbixBackend, 'history', new_callable=mock.PropertyMock, return_value=self.reader).start()
+        settings = ServiceSettings(
+            type=ZabbixConfig.service_name,
+            backend_url='http://example.com',
+            username='admin',
+            password='admin'
+        )
+        self.backend = settings.get_backend()
+        self.host = mock.Mock(backend_id='1')
+        self.item = models.Item(key='cpu', value_type=models.Item.ValueTypes.FLOAT, units='%', history=7, delay=60)
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def test_value_is_none_for_points_without_data(self):
+        now = datetime_to_timestamp(timezone.now())
+        points = [now - 120, now - 60, now]
+        self.reader.get_item_ids.return_value = {('1', 'cpu'): 10}
+        self.reader.get_bucketed_values.side_effect = lambda table, item_ids, buckets: (
+            {(1, 'cpu'): 5} if table == 'history' else {})
+
+        stats = self.backend.get_items_stats([self.host], [self.item], points)
+
+        self.assertEqual(stats, {'cpu': [None, 5, None]})
+
+
+class ConnectionPoolResetTest(TestCase):
+    def setUp(self):
+        self.database_parameters = {
+            'host': 'zabbix.example.com',
+            'port': '3306',
+            'name': 'zabbix',
+            'user': 'admin',
+            'password': 'secret',
+        }
+
+    def tearDown(self):
+        history.reset_connection_pool(self.database_parameters)
+
+    def test_pool_is_not_reused_when_credentials_are_changed(self):
+        pool = history.get_connection_pool(self.database_parameters)
+
+        new_parameters = dict(self.database_parameters, password='new_secret')
+
+        self.assertIsNot(history.get_connection_pool(new_parameters), pool)
+        self.assertEqual(history.get_connection_pool(new_parameters).settings_dict['PASSWORD'], 'new_secret')
+
+    def test_idle_connections_are_closed_on_reset(self):
+        pool = history.get_connection_pool(self.database_parameters)
+        wrapper = mock.Mock()
+        pool.idle.put_nowait(wrapper)
+
+        history.reset_connection_pool(self.database_parameters)
+
+        wrapper.close.assert_called_once_with()
+        self.assertIsNot(history.get_connection_pool(self.database_parameters), pool)
+
+    def test_connection_released_after_reset_is_closed(self):
+        pool = history.get_connection_pool(self.database_parameters)
+        wrapper = mock.Mock()
+
+        with mock.patch.object(pool, '_create', return_value=wrapper):
+            with pool.connection():
+                history.reset_connection_pool(self.database_parameters)
+
+        wrapper.close.assert_called_once_with()
+        self.assertTrue(pool.idle.empty())
+
+    def test_pool_is_reset_when_settings_options_are_updated(self):
+        service_settings = factories.ServiceSettingsFactory(
+            options={'database_parameters': self.database_parameters})
+        pool = history.get_connection_pool(self.database_parameters)
+
+        new_parameters = dict(self.database_parameters, password='new_secret')
+        service_settings.options = {'database_parameters': new_parameters}
+        service_settings.save()
+
+        self.assertTrue(pool.closed)
+        self.assertEqual(history.get_connection_pool(new_parameters).settings_dict['PASSWORD'], 'new_secret')
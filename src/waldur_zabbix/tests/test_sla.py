@@ -1,4 +1,6 @@
 import datetime
+from decimal import Decimal
+
 from dateutil.relativedelta import relativedelta
 from unittest import mock
 
@@ -7,6 +9,7 @@ from rest_framework import status, test
 from waldur_core.core.utils import datetime_to_timestamp
 from waldur_core.monitoring.utils import format_period
 from waldur_core.structure.tests import factories as structure_factories
+from waldur_zabbix import tasks
 from waldur_zabbix.tasks import pull_sla
 
 from . import factories
@@ -55,14 +58,14 @@ class SlaViewTest(test.APITransactionTestCase):
 class SlaPullTest(test.APITransactionTestCase):
 
     @mock.patch('waldur_core.structure.models.ServiceProjectLink.get_backend')
-    @mock.patch('waldur_zabbix.tasks.update_itservice_sla')
-    def test_task_calls_backend(self, mock_task, mock_backend):
+    def test_task_calls_backend(self, mock_backend):
         # Given
         itservice = factories.ITServiceFactory(is_main=True, backend_id='VALID')
 
         min_dt = datetime.date.today().replace(day=10) - relativedelta(months=2)
         max_dt = datetime.date.today().replace(day=10) - relativedelta(months=1)
         mock_backend().get_sla_range.return_value = min_dt, max_dt
+        mock_backend().get_slas.return_value = {'VALID': ['99.5', '100']}
 
         # When
         pull_sla(itservice.host.uuid)
@@ -71,13 +74,95 @@ class SlaPullTest(test.APITransactionTestCase):
         mock_backend().get_sla_range.assert_called_once_with(itservice.backend_id)
         month1_beginning = min_dt.replace(day=1)
         month2_beginning = min_dt.replace(day=1) + relativedelta(months=+1)
-        mock_task.delay.assert_has_calls([
-            mock.call(itservice.pk,
-                      format_period(min_dt),
-                      datetime_to_timestamp(month1_beginning),
-                      datetime_to_timestamp(month2_beginning)),
-            mock.call(itservice.pk,
-                      format_period(max_dt),
-                      datetime_to_timestamp(month2_beginning),
-                      datetime_to_timestamp(max_dt))
+        mock_backend().get_slas.assert_called_once_with([itservice.backend_id], [
+            (datetime_to_timestamp(month1_beginning), datetime_to_timestamp(month2_beginning)),
+            (datetime_to_timestamp(month2_beginning), datetime_to_timestamp(max_dt)),
         ])
+        self.assertEqual(models.SlaHistory.objects.get(itservice=itservice, period=format_period(min_dt)).value,
+                         Decimal('99.5'))
+        self.assertEqual(models.SlaHistory.objects.get(itservice=itservice, period=format_period(max_dt)).value,
+                         Decimal('100'))
+
+
+@mock.patch('waldur_core.structure.models.ServiceProjectLink.get_backend')
+class SlaUpdateTest(test.APITransactionTestCase):
+    def setUp(self):
+        self.spl = factories.ZabbixServiceProjectLinkFactory()
+        self.itservices = factories.ITServiceFactory.create_batch(
+            2, service_project_link=self.spl, backend_trigger_id=None)
+        self.period = format_period(datetime.date.today())
+
+    def update_sla(self):
+        tasks.update_itservices_sla([itservice.pk for itservice in self.itservices], self.period, 0, 100)
+
+    def test_sla_of_batch_is_fetched_using_single_call(self, mock_backend):
+        mock_backend().get_slas.return_value = {itservice.backend_id: ['99'] for itservice in self.itservices}
+
+        self.update_sla()
+
+        self.assertEqual(mock_backend().get_slas.call_count, 1)
+        self.assertEqual(models.SlaHistory.objects.filter(period=self.period, value=99).count(), 2)
+
+    def test_sla_is_not_recomputed_if_service_is_up_and_has_no_events(self, mock_backend):
+        for itservice in self.itservices:
+            itservice.backend_trigger_id = 'trigger-%s' % itservice.pk
+            itservice.save()
+            models.SlaHistory.objects.create(itservice=itservice, period=self.period, value=100)
+        mock_backend().get_triggers_events.return_value = {}
+        mock_backend().get_triggers_values.return_value = {
+            itservice.backend_trigger_id: 0 for itservice in self.itservices
+        }
+
+        self.update_sla()
+
+        mock_backend().get_slas.assert_not_called()
+
+    def test_sla_is_recomputed_if_service_is_down_since_before_period(self, mock_backend):
+        itservice = self.itservices[0]
+        itservice.backend_trigger_id = 'trigger'
+        itservice.save()
+        history = models.SlaHistory.objects.create(itservice=itservice, period=self.period, value=50)
+        mock_backend().get_triggers_events.return_value = {}
+        mock_backend().get_triggers_values.return_value = {'trigger': 1}
+        mock_backend().get_slas.return_value = {itservice.backend_id: ['40']}
+        self.itservices = [itservice]
+
+        self.update_sla()
+
+        history.refresh_from_db()
+        self.assertEqual(history.value, 40)
+
+    def test_sla_is_recomputed_if_service_has_recovered_during_period(self, mock_backend):
+        itservice = self.itservices[0]
+        itservice.backend_trigger_id = 'trigger'
+        itservice.save()
+        history = models.SlaHistory.objects.create(itservice=itservice, period=self.period, value=95)
+        history.events.create(timestamp=10, state='D')
+        history.events.create(timestamp=20, state='U')
+        mock_backend().get_triggers_events.return_value = {
+            'trigger': [{'timestamp': '10', 'value': '1'}, {'timestamp': '20', 'value': '0'}]
+        }
+        mock_backend().get_triggers_values.return_value = {'trigger': 0}
+        mock_backend().get_slas.return_value = {itservice.backend_id: ['96']}
+        self.itservices = [itservice]
+
+        self.update_sla()
+
+        history.refresh_from_db()
+        self.assertEqual(history.value, 96)
+
+    def test_sla_is_recomputed_if_new_event_is_found(self, mock_backend):
+        itservice = self.itservices[0]
+        itservice.backend_trigger_id = 'trigger'
+        itservice.save()
+        models.SlaHistory.objects.create(itservice=itservice, period=self.period, value=100)
+        mock_backend().get_triggers_events.return_value = {'trigger': [{'timestamp': '20', 'value': '1'}]}
+        mock_backend().get_triggers_values.return_value = {'trigger': 1}
+        mock_backend().get_slas.return_value = {itservice.backend_id: ['90']}
+        self.itservices = [itservice]
+
+        self.update_sla()
+
+        history = models.SlaHistory.objects.get(itservice=itservice, period=self.period)
+        self.assertEqual(history.value, 90)
+        self.assertEqual(list(history.events.values_list('timestamp', 'state')), [(20, 'D')])
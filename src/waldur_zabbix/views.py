@@ -153,11 +153,10 @@ class HostViewSet(structure_views.ResourceViewSet):
         items = self._get_items(request, hosts)
 
         aggregated_data = defaultdict(lambda: 0)
-        for host in hosts:
-            backend = host.get_backend()
-            host_aggregated_values = backend.get_items_aggregated_values(
-                host, items, filter_data['start'], filter_data['end'], filter_data['method'])
-            for key, value in host_aggregated_values.items():
+        for backend, backend_hosts in self._get_backends(hosts):
+            backend_aggregated_values = backend.get_items_aggregated_values(
+                backend_hosts, items, filter_data['start'], filter_data['end'], filter_data['method'])
+            for key, value in backend_aggregated_values.items():
                 aggregated_data[key] += value
         return Response(aggregated_data, status=status.HTTP_200_OK)
 
@@ -173,15 +172,23 @@ class HostViewSet(structure_views.ResourceViewSet):
 
         backend = host.get_backend()
         host_aggregated_values = backend.get_items_aggregated_values(
-            host, items, filter_data['start'], filter_data['end'], filter_data['method'])
+            [host], items, filter_data['start'], filter_data['end'], filter_data['method'])
         return Response(host_aggregated_values, status=status.HTTP_200_OK)
 
     def _get_hosts(self):
         hosts = filter_active(self.filter_queryset(self.get_queryset()))
+        hosts = hosts.select_related('service_project_link__service__settings')
         if not hosts:
             raise NoHostsException()
         return hosts
 
+    def _get_backends(self, hosts):
+        """ Group hosts by service settings so that each Zabbix server is queried once. """
+        hosts_by_settings = defaultdict(list)
+        for host in hosts:
+            hosts_by_settings[host.service_project_link.service.settings].append(host)
+        return [(settings.get_backend(), settings_hosts) for settings, settings_hosts in hosts_by_settings.items()]
+
     def _get_items(self, request, hosts):
         items = request.query_params.getlist('item')
         items = models.Item.objects.filter(template__hosts__in=hosts, key__in=items).distinct()
@@ -202,12 +209,14 @@ class HostViewSet(structure_views.ResourceViewSet):
                 'Cannot show historical data for non-numeric items: %s' % ', '.join(non_numeric_items))
         points = self._get_points(request)
 
+        items_rows = defaultdict(list)
+        for backend, backend_hosts in self._get_backends(hosts):
+            for key, values in backend.get_items_stats(backend_hosts, items, points).items():
+                items_rows[key].append(values)
+
         stats = []
         for item in items:
-            values = self._sum_rows([
-                host.get_backend().get_item_stats(host.backend_id, item, points)
-                for host in hosts
-            ])
+            values = self._sum_rows(items_rows[item.key])
 
             for point, value in zip(points, values):
                 stats.append({
@@ -227,7 +236,7 @@ class HostViewSet(structure_views.ResourceViewSet):
         }
         serializer = HistorySerializer(data={k: v for k, v in mapped.items() if v})
         serializer.is_valid(raise_exception=True)
-        points = map(datetime_to_timestamp, serializer.get_filter_data())
+        points = list(map(datetime_to_timestamp, serializer.get_filter_data()))
         return points
 
     def _sum_rows(self, rows):